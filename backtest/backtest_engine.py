@@ -3,8 +3,10 @@
 """
 Realistic Backtest Engine for Testing Trading Strategies
 - Includes slippage, fees, realistic execution
+- Optional depth-aware slippage from recorded order-book snapshots (utils.depth_book)
 - Position sizing and risk management
 - Market condition simulation
+- Indicators computed once per candle and shared by all strategies (utils.indicator_store)
 - Prevents overfitting
 - Uses improved strategies
 """
@@ -12,7 +14,10 @@ Realistic Backtest Engine for Testing Trading Strategies
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from utils.data_fetcher import get_klines_df
+from utils.data_fetcher import get_klines_range
+from utils.feature_view import FeatureView
+from utils.indicator_store import IndicatorFrame
+from utils.intervals import interval_to_ms
 from strategies.ema_vwap_rsi import ema_vwap_rsi_strategy as strategy_ema_vwap
 from strategies.supertrend_rsi import supertrend_rsi_strategy as strategy_supertrend_atr
 from strategies.trend_momentum_volume import trend_momentum_volume_strategy as strategy_trend_momentum
@@ -31,7 +36,8 @@ STRATEGIES = {
 
 class RealisticBacktestEngine:
     def __init__(self, initial_balance=1000, max_risk_per_trade=0.02, 
-                 slippage_pct=0.001, fee_pct=0.001, min_confidence=0.5):  # Reduced from 0.6
+                 slippage_pct=0.001, fee_pct=0.001, min_confidence=0.5,  # Reduced from 0.6
+                 depth_store=None):
         """
         Initialize realistic backtest engine
         
@@ -41,12 +47,16 @@ class RealisticBacktestEngine:
             slippage_pct: Slippage percentage (0.1% default)
             fee_pct: Trading fee percentage (0.1% default)
             min_confidence: Minimum confidence threshold (reduced to 0.5)
+            depth_store: DepthStore with recorded order-book snapshots; when set, fills walk the
+                         book for the actual position size (flat slippage is the fallback)
         """
         self.initial_balance = initial_balance
         self.max_risk_per_trade = max_risk_per_trade
         self.slippage_pct = slippage_pct
         self.fee_pct = fee_pct
         self.min_confidence = min_confidence
+        self.depth_store = depth_store
+        self.depth = None  # DepthCurves of the symbol being backtested
         
         # Market condition simulation
         self.volatility_regimes = {
@@ -56,12 +66,12 @@ class RealisticBacktestEngine:
             'EXTREME': {'slippage_mult': 2.0, 'execution_prob': 0.7}
         }
     
-    def calculate_volatility(self, df, window=20):
+    def calculate_volatility(self, df, window=20, ind=None):
         """Calculate market volatility"""
         try:
-            from ta.volatility import AverageTrueRange
-            atr = AverageTrueRange(df['high'], df['low'], df['close'], window=window)
-            current_atr = atr.average_true_range().iloc[-1]
+            if ind is None:
+                ind = IndicatorFrame(df)
+            current_atr = ind.atr(window).iloc[-1]
             current_price = df['close'].iloc[-1]
             
             # Volatility as percentage of price
@@ -95,13 +105,23 @@ class RealisticBacktestEngine:
         position_size = risk_amount / risk_per_share
         return position_size
     
-    def simulate_execution(self, side, entry, current_price, volatility_regime):
-        """Simulate realistic trade execution with slippage and execution probability"""
+    def simulate_execution(self, side, entry, current_price, volatility_regime,
+                           position_size=None, timestamp_ms=None):
+        """
+        Simulate realistic trade execution with slippage and execution probability
+        With order-book snapshots loaded, the fill price is the average price of walking the book
+        for position_size at timestamp_ms
+        """
         regime_config = self.volatility_regimes[volatility_regime]
         
         # Check if trade executes (market conditions)
         if np.random.random() > regime_config['execution_prob']:
             return None, "EXECUTION_FAILED"
+
+        if self.depth is not None and position_size is not None and timestamp_ms is not None:
+            executed_price = self.depth.fill_price(side, position_size, timestamp_ms, price=entry)
+            if executed_price is not None:
+                return executed_price, "EXECUTED"
         
         # Calculate slippage
         slippage_mult = regime_config['slippage_mult']
@@ -158,24 +178,40 @@ class RealisticBacktestEngine:
         
         return profit, outcome
     
-    def run_backtest(self, symbol="DOGEUSDT", interval="5m", days=90):
-        """Run realistic backtest"""
+    def run_backtest(self, symbol="DOGEUSDT", interval="5m", days=90, bars=None):
+        """
+        Run realistic backtest
+        bars: optional OHLCV DataFrame of activity bars (see get_trade_bars) used instead of time candles
+        """
         print(f"📊 Đang chạy realistic backtest cho {symbol} ({interval}) trong {days} ngày qua...")
         print(f"⚙️ Cấu hình: Risk/trade: {self.max_risk_per_trade*100}%, Slippage: {self.slippage_pct*100}%, Fee: {self.fee_pct*100}%")
         print(f"🎯 Sử dụng chiến lược cải thiện với tham số linh hoạt")
 
-        # Get data
-        df = get_klines_df(symbol, interval, limit=10000)
+        # Get data (closed candles from the local kline store)
+        end_time = datetime.now()
+        start_time = end_time - timedelta(days=days)
+        if bars is not None:
+            df = bars.copy()
+        else:
+            df = get_klines_range(symbol, interval, int(start_time.timestamp() * 1000))
         if df is None or len(df) < 100:
             print("❌ Không đủ dữ liệu")
             return None
 
-        # Filter by time
-        end_time = datetime.now()
-        start_time = end_time - timedelta(days=days)
+        # Fills happen at the candle close: time candles close one interval after they open,
+        # activity bars close when the next bar opens
+        open_ms = df['timestamp'].to_numpy(dtype=np.int64, copy=True)
+        if bars is None:
+            close_ms = open_ms + interval_to_ms(interval)
+        else:
+            close_ms = np.append(open_ms[1:], open_ms[-1])
+
+        self.depth = None
+        if self.depth_store is not None:
+            self.depth = self.depth_store.load(symbol, int(open_ms[0]), int(close_ms[-1]) + 1)
+            print(f"📚 Trượt giá theo sổ lệnh: {0 if self.depth is None else len(self.depth)} snapshot")
+
         df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        df = df[df['timestamp'] >= start_time].copy()
-        df = df.reset_index(drop=True)
 
         results = []
         balance = self.initial_balance
@@ -186,18 +222,26 @@ class RealisticBacktestEngine:
         winning_trades = 0
         total_fees = 0
 
+        # State kept across candles (e.g. the S/R pivot index only confirms the newest candle)
+        persistent = {}
+
         # Run through each candle
         for i in range(50, len(df)):
-            current_df = df.iloc[:i].copy().reset_index(drop=True)
+            # Strategies read through a FeatureView and never write columns, so no defensive copy
+            current_df = df.iloc[:i].reset_index(drop=True)
             current_price = current_df['close'].iloc[-1]
             current_time = current_df['timestamp'].iloc[-1]
             
+            # Indicators shared by volatility, market conditions and every strategy on this candle
+            ind = IndicatorFrame(current_df, persistent)
+            view = FeatureView(current_df, ind)
+            
             # Calculate current volatility
-            volatility = self.calculate_volatility(current_df)
+            volatility = self.calculate_volatility(current_df, ind=ind)
             volatility_regime = self.get_volatility_regime(volatility)
             
             # Analyze market conditions for strategy adaptation
-            market_conditions = self.analyze_market_conditions(current_df)
+            market_conditions = self.analyze_market_conditions(current_df, ind)
             
             # Check open positions first
             for position in open_positions[:]:
@@ -239,9 +283,9 @@ class RealisticBacktestEngine:
                 for strat_name in STRATEGIES:
                     # Use improved strategy with market conditions
                     if strat_name == "EMA_VWAP":
-                        result = STRATEGIES[strat_name](current_df, None, market_conditions)
+                        result = STRATEGIES[strat_name](view, None, market_conditions, ind=ind)
                     else:
-                        result = STRATEGIES[strat_name](current_df, None)
+                        result = STRATEGIES[strat_name](view, None, ind=ind)
                     
                     if result and result[5] >= self.min_confidence:  # Check confidence
                         side, entry, sl, tp, qty, confidence = result
@@ -252,7 +296,8 @@ class RealisticBacktestEngine:
                         if position_size > 0:
                             # Simulate execution
                             executed_price, execution_status = self.simulate_execution(
-                                side, entry, current_price, volatility_regime
+                                side, entry, current_price, volatility_regime,
+                                position_size, int(close_ms[i - 1])
                             )
                             
                             if execution_status == "EXECUTED":
@@ -326,16 +371,18 @@ class RealisticBacktestEngine:
             print("❌ Không có tín hiệu nào trong backtest")
             return None
     
-    def analyze_market_conditions(self, df):
+    def analyze_market_conditions(self, df, ind=None):
         """Analyze current market conditions for strategy adaptation"""
         try:
+            if ind is None:
+                ind = IndicatorFrame(df)
+            
             # Calculate volatility
-            returns = df['close'].pct_change()
-            volatility = returns.rolling(20).std().iloc[-1]
+            volatility = ind.returns_volatility(20).iloc[-1]
             
             # Calculate trend strength
-            sma_20 = df['close'].rolling(20).mean()
-            sma_50 = df['close'].rolling(50).mean()
+            sma_20 = ind.sma(20)
+            sma_50 = ind.sma(50)
             current_price = df['close'].iloc[-1]
             
             trend_strength = 0
@@ -353,7 +400,7 @@ class RealisticBacktestEngine:
                 trend_strength = 0.01
             
             # Volume analysis
-            volume_sma = df['volume'].rolling(20).mean()
+            volume_sma = ind.sma(20, 'volume')
             volume_ratio = df['volume'].iloc[-1] / volume_sma.iloc[-1] if volume_sma.iloc[-1] > 0 else 1.0
             
             return {
@@ -375,14 +422,16 @@ class RealisticBacktestEngine:
         # For simplicity, assume average duration based on volatility
         return 5  # Average 5 periods per trade
 
-def run_backtest(symbol="DOGEUSDT", interval="5m", days=90, initial_balance=1000):
+def run_backtest(symbol="DOGEUSDT", interval="5m", days=90, initial_balance=1000, bars=None,
+                 depth_store=None):
     """Run realistic backtest with proper configuration"""
     engine = RealisticBacktestEngine(
         initial_balance=initial_balance,
         max_risk_per_trade=0.02,  # 2% risk per trade
         slippage_pct=0.001,       # 0.1% slippage
         fee_pct=0.001,            # 0.1% trading fee
-        min_confidence=0.5         # Reduced to 50% confidence
+        min_confidence=0.5,        # Reduced to 50% confidence
+        depth_store=depth_store    # Order-book snapshots for size-aware slippage (optional)
     )
     
-    return engine.run_backtest(symbol, interval, days)
\ No newline at end of file
+    return engine.run_backtest(symbol, interval, days, bars)
\ No newline at end of file
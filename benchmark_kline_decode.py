@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Kline Decode Benchmark
+- Compares the legacy string DataFrame + pd.to_numeric path with decode_klines
+- Reports decode time and memory per 10k candles
+- Runs offline on synthetic Binance-shaped payloads
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from utils.kline_store import OHLCV_COLUMNS, columns_to_df, decode_klines
+
+LEGACY_COLUMNS = [
+    'timestamp', 'open', 'high', 'low', 'close', 'volume',
+    'close_time', 'quote_asset_volume', 'number_of_trades',
+    'taker_buy_base', 'taker_buy_quote', 'ignore'
+]
+
+
+def make_klines(count, start_ms=1_600_000_000_000, step_ms=60_000, seed=42):
+    """Synthetic raw klines in the exact shape returned by /api/v3/klines"""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.5, count))
+    klines = []
+    for i in range(count):
+        open_time = start_ms + i * step_ms
+        c = close[i]
+        klines.append([
+            open_time, f"{c - 0.1:.8f}", f"{c + 0.5:.8f}", f"{c - 0.5:.8f}", f"{c:.8f}",
+            f"{rng.uniform(10, 1000):.8f}", open_time + step_ms - 1, f"{rng.uniform(1e3, 1e5):.8f}",
+            int(rng.integers(10, 500)), f"{rng.uniform(5, 500):.8f}", f"{rng.uniform(5e2, 5e4):.8f}", "0"
+        ])
+    return klines
+
+
+def legacy_decode(klines):
+    """The original get_klines_df conversion"""
+    df = pd.DataFrame(klines, columns=LEGACY_COLUMNS)
+    for col in ['close', 'high', 'low', 'volume', 'open']:
+        df[col] = pd.to_numeric(df[col])
+    return df
+
+
+def direct_decode(klines, float_dtype=np.float64):
+    return columns_to_df(decode_klines(klines, OHLCV_COLUMNS, float_dtype))
+
+
+def measure(func, klines, repeat):
+    """Best-of-N wall time and tracemalloc peak for one decode"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(klines)
+        best = min(best, time.perf_counter() - started)
+
+    tracemalloc.start()
+    result = func(klines)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, int(result.memory_usage(deep=True).sum())
+
+
+def run_benchmark(count=10_000, repeat=5):
+    klines = make_klines(count)
+    scale = 10_000 / count
+    cases = [
+        ('legacy strings + to_numeric', legacy_decode),
+        ('decode_klines float64', direct_decode),
+        ('decode_klines float32', lambda k: direct_decode(k, np.float32)),
+    ]
+
+    print(f"📊 KLINE DECODE BENCHMARK ({count:,} candles, per 10k)")
+    print("=" * 72)
+    print(f"{'Method':<30}{'Time (ms)':>12}{'Peak alloc (KB)':>17}{'Result (KB)':>13}")
+    print("-" * 72)
+    for name, func in cases:
+        seconds, peak, size = measure(func, klines, repeat)
+        print(f"{name:<30}{seconds * 1000 * scale:>12.2f}{peak / 1024 * scale:>17.0f}"
+              f"{size / 1024 * scale:>13.0f}")
+
+    # Sanity check: the fast path must produce the same values as the legacy path
+    legacy = legacy_decode(klines)
+    direct = direct_decode(klines)
+    for col in OHLCV_COLUMNS[1:]:
+        assert np.array_equal(legacy[col].to_numpy(), direct[col].to_numpy()), col
+    assert np.array_equal(legacy['timestamp'].to_numpy(dtype=np.int64), direct['timestamp'].to_numpy())
+    print("✅ Decoded values match the legacy conversion")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark kline decoding")
+    parser.add_argument('--candles', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run_benchmark(args.candles, args.repeat)
@@ -23,11 +23,20 @@ except FileNotFoundError:
 
 # Import utilities
 from utils.telegram import send_telegram
-from utils.data_fetcher import get_klines_df
+from utils.data_fetcher import (get_klines_df, get_klines_batch, get_klines_range, store, cache, client,
+                                 async_fetcher, refresher)
+from utils.rate_limiter import backoff_delay
+from utils.kline_stream import KlineStream, BINANCE_WS_URL
+from utils.scheduler import CandleCloseScheduler
+from utils.intervals import candle_open_time, interval_to_ms, now_ms
+from utils.resampler import OHLCVResampler
+from utils.ohlcv_panel import OHLCVPanel
 from utils.chart import create_chart
 from utils.signal_manager import SignalManager
 from utils.risk_manager import RiskManager
 from utils.adaptive_system import AdaptiveSystem
+from utils.feature_view import FeatureView
+from utils.indicator_store import IndicatorStore
 from dashboard.app import bot_status, log, emit_update, socketio
 
 # Import strategies
@@ -37,6 +46,9 @@ from strategies.trend_momentum_volume import trend_momentum_volume_strategy as s
 from strategies.breakout_volume_sr import breakout_volume_sr_strategy as strategy_breakout_volume
 from strategies.multi_timeframe import multi_timeframe_strategy as strategy_multi_timeframe
 
+# Thời gian hoãn tối đa một cặp chỉ có dữ liệu cũ trước khi thử lại trong chu kỳ chính
+STALE_RETRY_MS = 30_000
+
 print(f"🚀 Bot Tín Hiệu Binance Futures (Quản Lý Rủi Ro Nâng Cao) khởi động lúc {datetime.now()}")
 
 class TradingBot:
@@ -45,10 +57,27 @@ class TradingBot:
         self.signal_manager = SignalManager()
         self.risk_manager = RiskManager()
         self.adaptive_system = AdaptiveSystem()
-        self.data_cache = {}
-        self.last_cache_update = {}
+        # Chỉ báo tính một lần mỗi (symbol, interval, nến cuối), dùng chung cho chiến lược và adaptive system
+        self.indicator_store = IndicatorStore()
+        # Cache nến dùng chung với data_fetcher (hết hạn khi có nến mới đóng)
+        self.data_cache = cache
+        self.data_cache.max_bytes = config['performance'].get('cache_max_mb', 64) * 1024 * 1024
+        self.kline_stream = None
+        self.resamplers = {}  # {symbol: OHLCVResampler} dựng khung lớn từ khung chính
+        # Nến đã đóng của mọi symbol trên cùng lưới thời gian (tính tương quan cho RiskManager)
+        self.panel = OHLCVPanel(config['symbols'], config['interval'], capacity=200)
         self.update_dashboard_config()
         self._update_managers_config()
+        stream_mode = config['performance'].get('data_source', 'rest') == 'stream'
+        self.scheduler = CandleCloseScheduler(
+            config['symbols'], self._intervals(),
+            delay_ms=config['performance'].get('close_delay_ms', 300),
+            confirm_closes=stream_mode
+        )
+        # Làm mới nền xong thì chạy lại cặp đang bị hoãn ngay
+        refresher.add_listener(lambda pair: self.scheduler.release(*pair))
+        if stream_mode:
+            self._start_kline_stream()
         # Khởi động dashboard trong thread riêng
         Thread(target=self.run_dashboard, daemon=True).start()
 
@@ -70,9 +99,36 @@ class TradingBot:
         self.risk_manager.max_drawdown = risk_config.get('max_drawdown', -15.0)
         self.risk_manager.max_daily_loss = risk_config.get('max_daily_loss', -3.0)
         self.risk_manager.max_consecutive_losses = risk_config.get('max_consecutive_losses', 5)
+        self.risk_manager.correlation_threshold = risk_config.get('correlation_threshold', 0.7)
         
         print("✅ Đã cập nhật cấu hình quản lý rủi ro")
 
+    def _intervals(self):
+        """Các khung cần tải từ sàn (khung lớn được dựng tại chỗ từ khung chính)"""
+        return [config['interval']]
+
+    def _start_kline_stream(self):
+        """
+        Chế độ streaming: nạp cửa sổ ban đầu qua REST rồi cập nhật bằng WebSocket
+        """
+        intervals = self._intervals()
+        self.kline_stream = KlineStream(
+            config['symbols'], intervals, window=200,
+            base_url=config['performance'].get('stream_url', BINANCE_WS_URL),
+            store=store, on_close=self._on_candle_close, backfill=get_klines_range
+        )
+        for symbol in config['symbols']:
+            for stream_interval in intervals:
+                df = get_klines_df(symbol, stream_interval, 200)
+                if df is not None:
+                    self.kline_stream.seed(symbol, stream_interval, df)
+        self.kline_stream.start()
+        print(f"✅ Đã bật kline stream cho {len(config['symbols'])} cặp tiền ({', '.join(intervals)})")
+
+    def _on_candle_close(self, symbol, interval, row):
+        """Báo cho scheduler khi sàn chốt nến (row[0] là thời điểm mở nến)"""
+        self.scheduler.notify_close(symbol, interval, row[0])
+
     def run_dashboard(self):
         """
         Khởi động Flask-SocketIO server
@@ -103,21 +159,59 @@ class TradingBot:
         emit_update()
 
     def get_cached_data(self, symbol, interval, limit=200):
-        """Cache dữ liệu để tránh gọi API liên tục"""
-        cache_key = f"{symbol}_{interval}"
-        now = datetime.now()
-        if (cache_key in self.data_cache and 
-            cache_key in self.last_cache_update and
-            (now - self.last_cache_update[cache_key]).seconds < config['performance']['data_cache_minutes'] * 60):
-            return self.data_cache[cache_key]
-        df = get_klines_df(symbol, interval, limit)
-        if df is not None:
-            self.data_cache[cache_key] = df
-            self.last_cache_update[cache_key] = now
-        return df
-
-    def execute_strategy(self, strategy_name, df, df_higher=None):
-        """Thực thi một chiến lược với xác nhận multi-timeframe"""
+        """Cache dữ liệu để tránh gọi API liên tục (tải lại khi có nến mới đóng)"""
+        if self.kline_stream is not None:
+            if self.kline_stream.is_ready(symbol, interval):
+                return self.kline_stream.get_df(symbol, interval).tail(limit).reset_index(drop=True)
+            # Cửa sổ stream chưa có hoặc còn lỗ hổng sau khi mất kết nối: lấy qua REST và nạp lại
+            df = get_klines_df(symbol, interval, max(limit, self.kline_stream.window))
+            if df is not None:
+                self.kline_stream.seed(symbol, interval, df)
+                df = df.tail(limit).reset_index(drop=True)
+            return df
+        return get_klines_df(symbol, interval, limit)
+
+    def get_higher_timeframe(self, symbol, df_main, higher_interval, limit=100):
+        """
+        Nến khung lớn dựng từ nến khung chính (không gọi thêm API)
+        Lần đầu nạp lịch sử đã đóng từ kho, sau đó mỗi nến chính mới cập nhật O(1)
+        """
+        main_ms, higher_ms = interval_to_ms(config['interval']), interval_to_ms(higher_interval)
+        if higher_ms <= main_ms or higher_ms % main_ms:
+            return self.get_cached_data(symbol, higher_interval, limit)
+
+        resampler = self.resamplers.get(symbol)
+        stale = (resampler is not None and resampler.last_closed_base is not None and
+                 df_main['timestamp'].iloc[0] > resampler.last_closed_base + main_ms)
+        if resampler is None or resampler.target_interval != higher_interval or stale:
+            resampler = OHLCVResampler(config['interval'], higher_interval, capacity=limit)
+            start_ms = candle_open_time(now_ms(), higher_interval) - (limit - 1) * higher_ms
+            history = get_klines_range(symbol, config['interval'], start_ms)
+            if history is not None:
+                resampler.update(history)
+            self.resamplers[symbol] = resampler
+        resampler.update(df_main)
+        return resampler.to_df(limit)
+
+    def update_panel(self, symbols, interval):
+        """Nạp nến đã đóng của các symbol vào bảng chung rồi cập nhật tương quan cho RiskManager"""
+        closed_before = now_ms() - interval_to_ms(interval)
+        for symbol in symbols:
+            df = self.get_cached_data(symbol, interval, 200)
+            if df is not None:
+                self.panel.extend(symbol, df[df['timestamp'] <= closed_before])
+        if config['risk_management'].get('enable_correlation_check', True):
+            self.risk_manager.update_correlations(self.panel)
+
+    def prefetch_data(self, pairs):
+        """Tải đồng thời dữ liệu của mọi (symbol, interval) chưa có trong cache"""
+        get_klines_batch(pairs)
+
+    def execute_strategy(self, strategy_name, df, df_higher=None, ind=None, ind_higher=None):
+        """
+        Thực thi một chiến lược với xác nhận multi-timeframe
+        df, df_higher: FeatureView chỉ đọc (hoặc DataFrame); ind: chỉ báo dùng chung của chu kỳ
+        """
         # Strategy mapping
         strategy_map = {
             "EMA_VWAP": strategy_ema_vwap,
@@ -133,7 +227,7 @@ class TradingBot:
             
         try:
             strategy_func = strategy_map[strategy_name]
-            signal = strategy_func(df, df_higher)
+            signal = strategy_func(df, df_higher, ind=ind, ind_higher=ind_higher)
             
             if signal:
                 signal['strategy'] = strategy_name
@@ -144,15 +238,15 @@ class TradingBot:
             
         return None
 
-    def analyze_market_conditions(self, df):
+    def analyze_market_conditions(self, df, ind=None):
         """Phân tích điều kiện thị trường với hệ thống adaptive"""
         try:
             # Sử dụng adaptive system để phân tích
-            market_conditions = self.adaptive_system.detect_market_regime(df)
+            market_conditions = self.adaptive_system.detect_market_regime(df, ind)
             
             # Thêm thông tin bổ sung
             market_conditions['current_price'] = df['close'].iloc[-1]
-            market_conditions['atr'] = self.adaptive_system.calculate_volatility(df) * df['close'].iloc[-1]
+            market_conditions['atr'] = self.adaptive_system.calculate_volatility(df, ind=ind) * df['close'].iloc[-1]
             
             return market_conditions
         except Exception as e:
@@ -225,27 +319,58 @@ class TradingBot:
         signals.sort(key=lambda x: x['final_confidence'], reverse=True)
         return [s for s in signals if s['final_confidence'] >= 0.6]
 
-    def run_analysis_cycle(self):
-        """Một chu kỳ phân tích hoàn chỉnh cho tất cả các cặp tiền"""
+    def run_analysis_cycle(self, due=None):
+        """
+        Một chu kỳ phân tích
+        due: các (symbol, interval) có nến vừa đóng (từ scheduler), None = tất cả các cặp
+        Trả về các cặp chưa phân tích được vì sàn lỗi (chỉ có dữ liệu cũ hoặc không có dữ liệu)
+        """
         interval = config['interval']
+        higher_interval = "15m" if interval == "5m" else "1h"
+        enable_multi_timeframe = config['risk_management']['enable_multi_timeframe']
+        if due is None:
+            due = {(symbol, iv): None for symbol in config['symbols'] for iv in self._intervals()}
 
-        for symbol in config['symbols']:
+        # Tải lại song song dữ liệu của các cặp vừa đóng nến trước khi phân tích
+        pairs = {(symbol, iv): 200 for symbol, iv in due if iv == interval}
+        try:
+            if self.kline_stream is None:
+                self.prefetch_data(pairs)
+        except Exception as e:
+            print(f"⚠️ Lỗi tải dữ liệu song song: {e}")
+
+        # Chỉ phân tích các symbol có nến khung chính vừa đóng
+        symbols = [symbol for symbol in config['symbols'] if (symbol, interval) in due]
+        self.update_panel(symbols, interval)
+        stale = set()
+        for symbol in symbols:
             print(f"\n🔍 Đang phân tích {symbol}...")
 
             try:
                 # Lấy dữ liệu
                 df_main = self.get_cached_data(symbol, interval, 200)
-                df_higher = None
-                if config['risk_management']['enable_multi_timeframe']:
-                    higher_interval = "15m" if interval == "5m" else "1h"
-                    df_higher = self.get_cached_data(symbol, higher_interval, 100)
-
-                if df_main is None or len(df_main) < 50:
+                if df_main is None or df_main.attrs.get('stale'):
+                    # Chưa có nến vừa đóng: chờ refresher tải lại rồi phân tích sau
+                    print(f"⏳ {symbol}: Chờ làm mới dữ liệu, hoãn phân tích")
+                    stale.add((symbol, interval))
+                    continue
+                if len(df_main) < 50:
                     print(f"❌ {symbol}: Không đủ dữ liệu")
                     continue
 
+                # Chiến lược chạy song song chỉ đọc dữ liệu qua FeatureView, không ghi cột vào df trong cache
+                view_higher = None
+                ind_higher = None
+                if enable_multi_timeframe:
+                    df_higher = self.get_higher_timeframe(symbol, df_main, higher_interval, 100)
+                    if df_higher is not None and len(df_higher):
+                        ind_higher = self.indicator_store.frame(symbol, higher_interval, df_higher)
+                        view_higher = FeatureView(df_higher, ind_higher)
+                ind = self.indicator_store.frame(symbol, interval, df_main)
+                view = FeatureView(df_main, ind)
+
                 # Phân tích điều kiện thị trường với adaptive system
-                market_conditions = self.analyze_market_conditions(df_main)
+                market_conditions = self.analyze_market_conditions(df_main, ind)
                 print(f"📊 {symbol}: {market_conditions.get('regime', 'UNKNOWN')}, Vol: {market_conditions.get('volatility', 0):.3f}, VolRatio: {market_conditions.get('volume_ratio', 1.0):.2f}")
 
                 # Lấy adaptive strategies
@@ -259,7 +384,7 @@ class TradingBot:
                 if config['performance']['parallel_strategy_execution']:
                     with ThreadPoolExecutor(max_workers=max_workers) as executor:
                         futures = [
-                            executor.submit(self.execute_strategy, strategy, df_main, df_higher)
+                            executor.submit(self.execute_strategy, strategy, view, view_higher, ind, ind_higher)
                             for strategy in adaptive_strategies
                         ]
                         for future in futures:
@@ -268,7 +393,7 @@ class TradingBot:
                                 signals.append(result)
                 else:
                     for strategy in adaptive_strategies:
-                        result = self.execute_strategy(strategy, df_main, df_higher)
+                        result = self.execute_strategy(strategy, view, view_higher, ind, ind_higher)
                         if result:
                             signals.append(result)
 
@@ -311,6 +436,7 @@ class TradingBot:
                 error_msg = f"🔴 Lỗi phân tích {symbol}: {str(e)}"
                 print(error_msg)
                 send_telegram(error_msg)
+        return stale
 
     def _update_dashboard_stats(self):
         """
@@ -323,6 +449,9 @@ class TradingBot:
             
             bot_status['signal_stats'] = signal_stats
             bot_status['risk_summary'] = risk_summary
+            bot_status['cache_stats'] = self.data_cache.stats()
+            bot_status['api_stats'] = client.stats()
+            bot_status['api_stats']['hedged'] += async_fetcher.hedged
             bot_status['last_update'] = datetime.now().isoformat()
             
             emit_update()
@@ -425,13 +554,6 @@ class TradingBot:
             print(error_msg)
             send_telegram(error_msg)
 
-    def responsive_sleep(self, total_seconds):
-        """Ngủ thông minh với khả năng dừng"""
-        interval = 5  # Kiểm tra mỗi 5 giây
-        for _ in range(total_seconds // interval):
-            time.sleep(interval)
-        time.sleep(total_seconds % interval)
-
     def run_bot(self):
         """Chạy bot chính"""
         print("🚀 Bot đang chạy...")
@@ -440,10 +562,20 @@ class TradingBot:
         print(f"🎯 Chiến lược: {', '.join(config['active_strategies'])}")
         print(f"🛡️ Quản lý rủi ro: {config['risk_management']['max_signals_per_hour']} tín hiệu/giờ")
         
+        failures = 0
         while True:
             try:
-                self.run_analysis_cycle()
-                self.responsive_sleep(300)  # 5 phút
+                # Chờ tới ngay sau lần đóng nến kế tiếp
+                due = self.scheduler.wait()
+                started = now_ms()
+                stale = self.run_analysis_cycle(due)
+                self.scheduler.mark_done({pair: t for pair, t in due.items() if pair not in stale})
+                if stale:
+                    self.scheduler.defer(stale, STALE_RETRY_MS)
+                self._update_dashboard_stats()
+                failures = 0
+                next_wake = datetime.fromtimestamp(self.scheduler.next_wake_ms() / 1000)
+                print(f"⏱️ Chu kỳ xong trong {(now_ms() - started) / 1000:.1f}s - lần chạy tiếp: {next_wake:%H:%M:%S}")
             except KeyboardInterrupt:
                 print("\n🛑 Bot đã dừng bởi người dùng")
                 break
@@ -451,7 +583,9 @@ class TradingBot:
                 error_msg = f"❌ Lỗi chính: {str(e)}"
                 print(error_msg)
                 send_telegram(error_msg)
-                time.sleep(60)  # Chờ 1 phút trước khi thử lại
+                # Backoff theo số lần lỗi liên tiếp (tối đa 1 phút) trước khi thử lại
+                time.sleep(backoff_delay(failures, 1.0, 60.0))
+                failures += 1
 
 if __name__ == "__main__":
     bot = TradingBot()
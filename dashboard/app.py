@@ -20,6 +20,8 @@ bot_status = {
         "interval": "5m",
         "active_strategies": ["EMA_VWAP", "RSI_DIVERGENCE", "SUPERTREND_ATR"]
     },
+    "cache_stats": {"entries": 0, "bytes": 0, "hits": 0, "misses": 0, "evictions": 0, "hit_rate": 0.0},
+    "api_stats": {"requests": 0, "used_weight": 0, "weight_per_minute": 1200, "retries": 0, "rate_limited": 0, "banned": 0, "open_circuits": [], "hedged": 0, "latency": {}},
     "log": []
 }
 
@@ -40,6 +40,29 @@ document.addEventListener('DOMContentLoaded', function () {
             configText.textContent = `${status.config.symbol} | ${status.config.interval}`;
         }
 
+        if (status.cache_stats) {
+            const c = status.cache_stats;
+            document.getElementById('cacheHitRate').textContent = `${(c.hit_rate * 100).toFixed(1)}%`;
+            document.getElementById('cacheHits').textContent = c.hits;
+            document.getElementById('cacheMisses').textContent = c.misses;
+            document.getElementById('cacheSize').textContent = `${(c.bytes / 1048576).toFixed(2)} MB`;
+            document.getElementById('cacheEntries').textContent = c.entries;
+            document.getElementById('cacheEvictions').textContent = c.evictions;
+        }
+
+        if (status.api_stats) {
+            const a = status.api_stats;
+            document.getElementById('apiRequests').textContent = a.requests;
+            document.getElementById('apiWeight').textContent = `${a.used_weight}/${a.weight_per_minute}`;
+            document.getElementById('apiRetries').textContent = a.retries;
+            document.getElementById('apiLimited').textContent = a.rate_limited + a.banned;
+            document.getElementById('apiCircuits').textContent =
+                (a.open_circuits && a.open_circuits.length) ? a.open_circuits.join(', ') : 'không';
+            const k = a.latency && a.latency.klines;
+            document.getElementById('apiLatency').textContent = k ? `${k.p50_ms}/${k.p95_ms}/${k.p99_ms}` : '-';
+            document.getElementById('apiHedged').textContent = a.hedged || 0;
+        }
+
         if (status.last_signal) {
             const s = status.last_signal;
             lastSignalDiv.innerHTML = `
@@ -11,6 +11,7 @@ Realistic Backtest Runner
 from backtest.backtest_engine import run_backtest
 from backtest.performance_report import generate_report
 from backtest.chart import plot_backtest_results
+from utils.depth_book import DepthStore
 import pandas as pd
 from datetime import datetime
 
@@ -61,7 +62,8 @@ def run_realistic_backtest():
             max_risk_per_trade=scenario['risk_per_trade'],
             slippage_pct=scenario['slippage'],
             fee_pct=scenario['fee'],
-            min_confidence=scenario['min_confidence']
+            min_confidence=scenario['min_confidence'],
+            depth_store=DepthStore()  # Recorded order books (python -m utils.depth_book), flat slippage if none
         )
         
         results = engine.run_backtest(
@@ -1,87 +1,145 @@
-import pandas as pd
-import ta
-import numpy as np
+from utils.feature_view import as_view
+from utils.rule_engine import Condition, Feature as F, RuleSet
 
-def breakout_volume_sr_strategy(df, df_higher=None):
+# BUY Signal: Resistance Breakout - scoring system, need at least 10 conditions
+BUY_RULES = RuleSet([
+    # Core breakout
+    Condition('breakout', F('close') > F('resistance')),  # Above resistance
+    Condition('fresh_breakout', F('close', 1) <= F('resistance') * 1.001),  # Previous candle was below/at resistance
+    
+    # Breakout strength
+    Condition('breakout_strength', (F('close') - F('resistance')) / F('close') >= 0.002),  # At least 0.2% breakout
+    Condition('new_high', F('close') > F('high', 1)),  # New high
+    
+    # Volume confirmation
+    Condition('volume', F('volume_ratio') >= 1.3),  # 30% above average volume
+    Condition('volume_increasing', F('volume') > F('volume', 1)),  # Increasing volume
+    Condition('volume_trend', F('volume_trend') > 1.05),  # Volume trend improving
+    
+    # Institutional flow
+    Condition('obv', F('obv') > F('obv_ema')),  # OBV bullish
+    Condition('ad_line', F('ad_line') > F('ad_line', 1)),  # Accumulation
+    
+    # Price action
+    Condition('vwap', F('close') > F('vwap')),  # Above VWAP
+    Condition('candle', F('close') > F('open')),  # Green candle
+    
+    # Momentum confirmation
+    Condition('rsi', F('rsi').between(50, 80)),  # Bullish but not overbought
+    Condition('macd', F('macd') > F('macd_signal')),  # MACD bullish
+    
+    # Multi-timeframe
+    Condition('higher_trend', F('higher_trend_bullish')),  # Higher TF bullish
+    
+    # Volatility
+    Condition('bb_expanding', F('bb_width') > F('bb_width_sma')),  # Expanding volatility
+], threshold=10)
+
+# SELL Signal: Support Breakdown - need at least 10 conditions
+SELL_RULES = RuleSet([
+    # Core breakout
+    Condition('breakdown', F('close') < F('support')),  # Below support
+    Condition('fresh_breakdown', F('close', 1) >= F('support') * 0.999),  # Previous candle was above/at support
+    
+    # Breakout strength
+    Condition('breakdown_strength', (F('support') - F('close')) / F('close') >= 0.002),  # At least 0.2% breakdown
+    Condition('new_low', F('close') < F('low', 1)),  # New low
+    
+    # Volume confirmation
+    Condition('volume', F('volume_ratio') >= 1.3),  # 30% above average volume
+    Condition('volume_increasing', F('volume') > F('volume', 1)),  # Increasing volume
+    Condition('volume_trend', F('volume_trend') > 1.05),  # Volume trend confirming
+    
+    # Institutional flow
+    Condition('obv', F('obv') < F('obv_ema')),  # OBV bearish
+    Condition('ad_line', F('ad_line') < F('ad_line', 1)),  # Distribution
+    
+    # Price action
+    Condition('vwap', F('close') < F('vwap')),  # Below VWAP
+    Condition('candle', F('close') < F('open')),  # Red candle
+    
+    # Momentum confirmation
+    Condition('rsi', F('rsi').between(20, 50)),  # Bearish but not oversold
+    Condition('macd', F('macd') < F('macd_signal')),  # MACD bearish
+    
+    # Multi-timeframe
+    Condition('higher_trend', ~F('higher_trend_bullish')),  # Higher TF bearish
+    
+    # Volatility
+    Condition('bb_expanding', F('bb_width') > F('bb_width_sma')),  # Expanding volatility
+], threshold=10)
+
+def breakout_volume_sr_strategy(df, df_higher=None, ind=None, ind_higher=None):
     """
     Chiến lược kết hợp Breakout + Volume + Support/Resistance - PHIÊN BẢN CẢI TIẾN
     Winrate kỳ vọng: 65-70%, R:R improved to 1:4-6
+    df, df_higher: DataFrame hoặc FeatureView chỉ đọc (chiến lược không ghi cột vào df)
+    ind, ind_higher: IndicatorFrame dùng chung của chu kỳ (None thì tự tạo)
     """
     if len(df) < 50:
         return None
+    df = as_view(df, ind)
+    ind = df.ind
+    features = df.features()  # Giá trị trung gian cục bộ, không ghi vào df dùng chung
     
     # 1. Advanced Support/Resistance Detection
-    def find_pivots(df, window=10):
-        """Find pivot highs and lows"""
-        df['pivot_high'] = df['high'].rolling(window*2+1, center=True).max() == df['high']
-        df['pivot_low'] = df['low'].rolling(window*2+1, center=True).min() == df['low']
-        return df
-    
-    df = find_pivots(df, 8)
-    
-    # Get recent pivot levels
-    recent_pivots = 20
-    pivot_highs = df[df['pivot_high']]['high'].tail(recent_pivots).values
-    pivot_lows = df[df['pivot_low']]['low'].tail(recent_pivots).values
+    # Pivots (8 candles each side, 20 most recent per side) are confirmed incrementally by the
+    # shared S/R index instead of a centered rolling max/min over the whole frame
+    sr_index = ind.sr_levels(window=8, max_pivots=20)
     
     # Dynamic S/R levels based on price clustering
     current_price = df['close'].iloc[-1]
     
-    # Find resistance levels (within 0.5% to 3% above current price)
-    resistance_levels = []
-    for high in pivot_highs:
-        if current_price < high <= current_price * 1.03:
-            resistance_levels.append(high)
+    # Find resistance levels (up to 3% above current price)
+    resistance_levels = sr_index.resistance_levels(current_price, 0.03)
     
-    # Find support levels (within 0.5% to 3% below current price)
-    support_levels = []
-    for low in pivot_lows:
-        if current_price * 0.97 <= low < current_price:
-            support_levels.append(low)
+    # Find support levels (up to 3% below current price)
+    support_levels = sr_index.support_levels(current_price, 0.03)
     
     # Get strongest levels (most recent and clustered)
-    resistance = max(resistance_levels) if resistance_levels else df['high'].rolling(20).max().iloc[-1]
-    support = min(support_levels) if support_levels else df['low'].rolling(20).min().iloc[-1]
+    resistance = max(resistance_levels) if resistance_levels else ind.rolling_max(20).iloc[-1]
+    support = min(support_levels) if support_levels else ind.rolling_min(20).iloc[-1]
     
     # 2. Enhanced Volume Analysis
-    df['volume_sma_short'] = df['volume'].rolling(10).mean()
-    df['volume_sma_long'] = df['volume'].rolling(30).mean()
-    df['volume_ratio'] = df['volume'] / df['volume_sma_long']
-    df['volume_trend'] = df['volume_sma_short'] / df['volume_sma_long']
+    features['volume_sma_short'] = ind.sma(10, 'volume')
+    features['volume_sma_long'] = ind.sma(30, 'volume')
+    features['volume_ratio'] = df['volume'] / features['volume_sma_long']
+    features['volume_trend'] = features['volume_sma_short'] / features['volume_sma_long']
     
     # Volume-weighted average price for more context
-    df['vwap'] = (df['close'] * df['volume']).rolling(20).sum() / df['volume'].rolling(20).sum()
+    features['vwap'] = (df['close'] * df['volume']).rolling(20).sum() / df['volume'].rolling(20).sum()
     
     # On-Balance Volume for institutional flow
-    df['obv'] = ta.volume.OnBalanceVolumeIndicator(df['close'], df['volume']).on_balance_volume()
-    df['obv_ema'] = ta.trend.EMAIndicator(df['obv'], 10).ema_indicator()
+    features['obv'] = ind.obv()
+    features['obv_ema'] = ind.ema(10, ('obv',))
     
     # Accumulation/Distribution Line
-    df['ad_line'] = ta.volume.AccDistIndexIndicator(df['high'], df['low'], df['close'], df['volume']).acc_dist_index()
+    features['ad_line'] = ind.adi()
     
     # 3. Breakout Confirmation Indicators
-    df['atr'] = ta.volatility.AverageTrueRange(df['high'], df['low'], df['close'], 14).average_true_range()
-    df['bb_upper'] = ta.volatility.BollingerBands(df['close'], 20, 2).bollinger_hband()
-    df['bb_lower'] = ta.volatility.BollingerBands(df['close'], 20, 2).bollinger_lband()
-    df['bb_width'] = (df['bb_upper'] - df['bb_lower']) / df['close']
+    features['atr'] = ind.atr(14)
+    features['bb_upper'] = ind.bollinger(20, 2)['upper']
+    features['bb_lower'] = ind.bollinger(20, 2)['lower']
+    features['bb_width'] = (features['bb_upper'] - features['bb_lower']) / df['close']
+    features['bb_width_sma'] = features['bb_width'].rolling(20).mean()
     
     # RSI for momentum confirmation
-    df['rsi'] = ta.momentum.RSIIndicator(df['close'], 14).rsi()
+    features['rsi'] = ind.rsi(14)
     
     # MACD for trend momentum
-    macd = ta.trend.MACD(df['close'])
-    df['macd'] = macd.macd()
-    df['macd_signal'] = macd.macd_signal()
+    macd = ind.macd()
+    features['macd'] = macd['macd']
+    features['macd_signal'] = macd['signal']
     
-    current = df.iloc[-1]
-    prev = df.iloc[-2]
-    prev2 = df.iloc[-3]
+    current = features.row(-1)
     
     # 4. Multi-timeframe trend filter
     higher_trend_bullish = True
     if df_higher is not None and len(df_higher) >= 20:
-        df_higher['ema'] = ta.trend.EMAIndicator(df_higher['close'], 20).ema_indicator()
-        higher_trend_bullish = df_higher['close'].iloc[-1] > df_higher['ema'].iloc[-1]
+        df_higher = as_view(df_higher, ind_higher)
+        ind_higher = df_higher.ind
+        higher_ema = ind_higher.ema(20)
+        higher_trend_bullish = df_higher['close'].iloc[-1] > higher_ema.iloc[-1]
     
     # 5. Enhanced Breakout Detection
     
@@ -89,80 +147,12 @@ def breakout_volume_sr_strategy(df, df_higher=None):
     resistance_distance = (resistance - current['close']) / current['close']
     support_distance = (current['close'] - support) / current['close']
     
-    # BUY Signal: Resistance Breakout
-    buy_breakout_conditions = [
-        # Core breakout
-        current['close'] > resistance,  # Above resistance
-        prev['close'] <= resistance * 1.001,  # Previous candle was below/at resistance
-        
-        # Breakout strength
-        (current['close'] - resistance) / current['close'] >= 0.002,  # At least 0.2% breakout
-        current['close'] > prev['high'],  # New high
-        
-        # Volume confirmation
-        current['volume_ratio'] >= 1.3,  # 30% above average volume
-        current['volume'] > prev['volume'],  # Increasing volume
-        current['volume_trend'] > 1.05,  # Volume trend improving
-        
-        # Institutional flow
-        current['obv'] > current['obv_ema'],  # OBV bullish
-        current['ad_line'] > prev['ad_line'],  # Accumulation
-        
-        # Price action
-        current['close'] > current['vwap'],  # Above VWAP
-        current['close'] > current['open'],  # Green candle
-        
-        # Momentum confirmation
-        current['rsi'] > 50 and current['rsi'] < 80,  # Bullish but not overbought
-        current['macd'] > current['macd_signal'],  # MACD bullish
-        
-        # Multi-timeframe
-        higher_trend_bullish,  # Higher TF bullish
-        
-        # Volatility
-        current['bb_width'] > df['bb_width'].rolling(20).mean().iloc[-1],  # Expanding volatility
-    ]
-    
-    # SELL Signal: Support Breakdown
-    sell_breakout_conditions = [
-        # Core breakout
-        current['close'] < support,  # Below support
-        prev['close'] >= support * 0.999,  # Previous candle was above/at support
-        
-        # Breakout strength
-        (support - current['close']) / current['close'] >= 0.002,  # At least 0.2% breakdown
-        current['close'] < prev['low'],  # New low
-        
-        # Volume confirmation
-        current['volume_ratio'] >= 1.3,  # 30% above average volume
-        current['volume'] > prev['volume'],  # Increasing volume
-        current['volume_trend'] > 1.05,  # Volume trend confirming
-        
-        # Institutional flow
-        current['obv'] < current['obv_ema'],  # OBV bearish
-        current['ad_line'] < prev['ad_line'],  # Distribution
-        
-        # Price action
-        current['close'] < current['vwap'],  # Below VWAP
-        current['close'] < current['open'],  # Red candle
-        
-        # Momentum confirmation
-        current['rsi'] < 50 and current['rsi'] > 20,  # Bearish but not oversold
-        current['macd'] < current['macd_signal'],  # MACD bearish
-        
-        # Multi-timeframe
-        not higher_trend_bullish,  # Higher TF bearish
-        
-        # Volatility
-        current['bb_width'] > df['bb_width'].rolling(20).mean().iloc[-1],  # Expanding volatility
-    ]
-    
-    # Scoring system - need at least 10/14 conditions
-    buy_score = sum(buy_breakout_conditions)
-    sell_score = sum(sell_breakout_conditions)
+    levels = {'resistance': resistance, 'support': support, 'higher_trend_bullish': higher_trend_bullish}
+    buy_score = BUY_RULES.score(features, **levels)
+    sell_score = SELL_RULES.score(features, **levels)
     
-    buy_signal = buy_score >= 10
-    sell_signal = sell_score >= 10
+    buy_signal = buy_score >= BUY_RULES.threshold
+    sell_signal = sell_score >= SELL_RULES.threshold
     
     # 6. ADVANCED SL/TP System
     if buy_signal or sell_signal:
@@ -185,7 +175,7 @@ def breakout_volume_sr_strategy(df, df_higher=None):
             sl_atr = entry_price - (final_multiplier * atr_value)
             
             # SL 3: Previous swing low
-            sl_swing = df['low'].rolling(15).min().iloc[-1] * 0.997
+            sl_swing = ind.rolling_min(15).iloc[-1] * 0.997
             
             # SL 4: VWAP support
             sl_vwap = current['vwap'] * 0.998
@@ -227,7 +217,7 @@ def breakout_volume_sr_strategy(df, df_higher=None):
             sl_atr = entry_price + (final_multiplier * atr_value)
             
             # SL 3: Previous swing high
-            sl_swing = df['high'].rolling(15).max().iloc[-1] * 1.003
+            sl_swing = ind.rolling_max(15).iloc[-1] * 1.003
             
             # SL 4: VWAP resistance
             sl_vwap = current['vwap'] * 1.002
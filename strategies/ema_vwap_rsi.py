@@ -1,99 +1,103 @@
-import pandas as pd
-import ta
+from utils.feature_view import as_view
+from utils.rule_engine import Condition, Feature as F, RuleSet
 
-def ema_vwap_rsi_strategy(df, df_higher=None):
+# BUY Signal - Cải tiến logic: 7/9 conditions (was all conditions)
+BUY_RULES = RuleSet([
+    # Core EMA signal
+    Condition('ema_cross', F('ema_fast') > F('ema_slow')),
+    Condition('fresh_cross', F('ema_fast', 1) <= F('ema_slow', 1)),  # Fresh crossover
+    
+    # Trend filter
+    Condition('above_trend', F('close') > F('ema_trend')),  # Above trend
+    Condition('higher_trend', F('higher_trend_bullish')),  # Higher TF bullish
+    
+    # VWAP confirmation - More flexible
+    Condition('vwap', (F('close') > F('vwap')) | (F('close') > F('vwap_lower'))),  # Near or above VWAP
+    
+    # RSI conditions - More flexible
+    Condition('rsi', F('rsi') < 75),  # Not extremely overbought (70->75)
+    Condition('rsi_fast', F('rsi_fast') > 40),  # Fast RSI shows momentum
+    
+    # Volume confirmation
+    Condition('volume', F('volume_ratio') > 1.1),  # Decent volume (1.2->1.1)
+    
+    # Price action
+    Condition('candle', F('close') > F('close', 1)),  # Green candle
+], threshold=7)
+
+# SELL Signal - Cải tiến logic: 7/9 conditions
+SELL_RULES = RuleSet([
+    # Core EMA signal
+    Condition('ema_cross', F('ema_fast') < F('ema_slow')),
+    Condition('fresh_cross', F('ema_fast', 1) >= F('ema_slow', 1)),  # Fresh crossover
+    
+    # Trend filter
+    Condition('below_trend', F('close') < F('ema_trend')),  # Below trend
+    Condition('higher_trend', ~F('higher_trend_bullish')),  # Higher TF bearish
+    
+    # VWAP confirmation - More flexible
+    Condition('vwap', (F('close') < F('vwap')) | (F('close') < F('vwap_upper'))),  # Near or below VWAP
+    
+    # RSI conditions - More flexible
+    Condition('rsi', F('rsi') > 25),  # Not extremely oversold (30->25)
+    Condition('rsi_fast', F('rsi_fast') < 60),  # Fast RSI shows momentum
+    
+    # Volume confirmation
+    Condition('volume', F('volume_ratio') > 1.1),  # Decent volume
+    
+    # Price action
+    Condition('candle', F('close') < F('close', 1)),  # Red candle
+], threshold=7)
+
+def ema_vwap_rsi_strategy(df, df_higher=None, ind=None, ind_higher=None):
     """
     Chiến lược kết hợp EMA + VWAP + RSI - PHIÊN BẢN CẢI TIẾN
     Winrate kỳ vọng: 70-75%, R:R improved to 1:3-4
+    df, df_higher: DataFrame hoặc FeatureView chỉ đọc (chiến lược không ghi cột vào df)
+    ind, ind_higher: IndicatorFrame dùng chung của chu kỳ (None thì tự tạo)
     """
     if len(df) < 50:
         return None
+    df = as_view(df, ind)
+    ind = df.ind
+    features = df.features()  # Giá trị trung gian cục bộ, không ghi vào df dùng chung
     
     # 1. EMA (Tối ưu thời gian)
-    df['ema_fast'] = ta.trend.EMAIndicator(df['close'], 8).ema_indicator()  # 9->8: nhanh hơn
-    df['ema_slow'] = ta.trend.EMAIndicator(df['close'], 21).ema_indicator()
-    df['ema_trend'] = ta.trend.EMAIndicator(df['close'], 50).ema_indicator()  # Trend filter
+    features['ema_fast'] = ind.ema(8)  # 9->8: nhanh hơn
+    features['ema_slow'] = ind.ema(21)
+    features['ema_trend'] = ind.ema(50)  # Trend filter
     
     # 2. VWAP + VWAP bands
-    df['tp'] = (df['high'] + df['low'] + df['close']) / 3
-    df['vwap'] = (df['tp'] * df['volume']).cumsum() / df['volume'].cumsum()
+    features['tp'] = (df['high'] + df['low'] + df['close']) / 3
+    features['vwap'] = (features['tp'] * df['volume']).cumsum() / df['volume'].cumsum()
     # VWAP deviation bands
-    df['vwap_std'] = df['tp'].rolling(20).std()
-    df['vwap_upper'] = df['vwap'] + (df['vwap_std'] * 1.5)
-    df['vwap_lower'] = df['vwap'] - (df['vwap_std'] * 1.5)
+    features['vwap_std'] = features['tp'].rolling(20).std()
+    features['vwap_upper'] = features['vwap'] + (features['vwap_std'] * 1.5)
+    features['vwap_lower'] = features['vwap'] - (features['vwap_std'] * 1.5)
     
     # 3. RSI với multiple timeframes
-    df['rsi'] = ta.momentum.RSIIndicator(df['close'], 14).rsi()
-    df['rsi_fast'] = ta.momentum.RSIIndicator(df['close'], 7).rsi()  # Faster RSI
+    features['rsi'] = ind.rsi(14)
+    features['rsi_fast'] = ind.rsi(7)  # Faster RSI
     
     # 4. Volume analysis
-    df['volume_sma'] = df['volume'].rolling(20).mean()
-    df['volume_ratio'] = df['volume'] / df['volume_sma']
+    features['volume_sma'] = ind.sma(20, 'volume')
+    features['volume_ratio'] = df['volume'] / features['volume_sma']
     
     # 5. Volatility (ATR) cho dynamic SL/TP
-    atr = ta.volatility.AverageTrueRange(df['high'], df['low'], df['close'], 14)
-    df['atr'] = atr.average_true_range()
+    features['atr'] = ind.atr(14)
     
-    current = df.iloc[-1]
-    prev = df.iloc[-2]
-    prev2 = df.iloc[-3]
+    current = features.row(-1)
     
     # Multi-timeframe confirmation
     higher_trend_bullish = True
     if df_higher is not None and len(df_higher) >= 20:
-        df_higher['ema_trend'] = ta.trend.EMAIndicator(df_higher['close'], 20).ema_indicator()
-        higher_trend_bullish = df_higher['close'].iloc[-1] > df_higher['ema_trend'].iloc[-1]
-    
-    # BUY Signal - Cải tiến logic
-    buy_conditions = [
-        # Core EMA signal
-        current['ema_fast'] > current['ema_slow'],
-        prev['ema_fast'] <= prev['ema_slow'],  # Fresh crossover
-        
-        # Trend filter
-        current['close'] > current['ema_trend'],  # Above trend
-        higher_trend_bullish,  # Higher TF bullish
-        
-        # VWAP confirmation - More flexible
-        current['close'] > current['vwap'] or current['close'] > current['vwap_lower'],  # Near or above VWAP
-        
-        # RSI conditions - More flexible
-        current['rsi'] < 75,  # Not extremely overbought (70->75)
-        current['rsi_fast'] > 40,  # Fast RSI shows momentum
-        
-        # Volume confirmation
-        current['volume_ratio'] > 1.1,  # Decent volume (1.2->1.1)
-        
-        # Price action
-        current['close'] > prev['close']  # Green candle
-    ]
-    
-    # SELL Signal - Cải tiến logic  
-    sell_conditions = [
-        # Core EMA signal
-        current['ema_fast'] < current['ema_slow'],
-        prev['ema_fast'] >= prev['ema_slow'],  # Fresh crossover
-        
-        # Trend filter
-        current['close'] < current['ema_trend'],  # Below trend
-        not higher_trend_bullish,  # Higher TF bearish
-        
-        # VWAP confirmation - More flexible
-        current['close'] < current['vwap'] or current['close'] < current['vwap_upper'],  # Near or below VWAP
-        
-        # RSI conditions - More flexible
-        current['rsi'] > 25,  # Not extremely oversold (30->25)
-        current['rsi_fast'] < 60,  # Fast RSI shows momentum
-        
-        # Volume confirmation
-        current['volume_ratio'] > 1.1,  # Decent volume
-        
-        # Price action
-        current['close'] < prev['close']  # Red candle
-    ]
+        df_higher = as_view(df_higher, ind_higher)
+        ind_higher = df_higher.ind
+        higher_ema_trend = ind_higher.ema(20)
+        higher_trend_bullish = df_higher['close'].iloc[-1] > higher_ema_trend.iloc[-1]
     
-    buy_signal = sum(buy_conditions) >= 7  # 7/9 conditions (was all conditions)
-    sell_signal = sum(sell_conditions) >= 7  # 7/9 conditions
+    buy_signal = BUY_RULES.passed(features, higher_trend_bullish=higher_trend_bullish)
+    sell_signal = SELL_RULES.passed(features, higher_trend_bullish=higher_trend_bullish)
     
     # Tính SL/TP - DYNAMIC & IMPROVED R:R
     if buy_signal or sell_signal:
@@ -101,12 +105,12 @@ def ema_vwap_rsi_strategy(df, df_higher=None):
         atr_value = current['atr']
         
         # Dynamic ATR multiplier based on volatility
-        volatility = df['close'].pct_change().rolling(20).std().iloc[-1]
+        volatility = ind.returns_volatility(20).iloc[-1]
         atr_multiplier = max(1.2, min(2.5, volatility * 100))  # 1.2-2.5x based on volatility
         
         if buy_signal:
             # Dynamic SL based on recent swing low and VWAP
-            swing_low = df['low'].rolling(10).min().iloc[-1]
+            swing_low = ind.rolling_min(10).iloc[-1]
             vwap_support = min(current['vwap'], current['vwap_lower'])
             
             sl_level1 = entry_price - (atr_multiplier * atr_value)
@@ -114,7 +118,7 @@ def ema_vwap_rsi_strategy(df, df_higher=None):
             sl = max(sl_level1, sl_level2)  # Use the higher (safer) SL
             
             # Dynamic TP - Target VWAP upper band or strong resistance
-            resistance = df['high'].rolling(20).max().iloc[-1]
+            resistance = ind.rolling_max(20).iloc[-1]
             tp_level1 = entry_price + (3.5 * atr_value)  # 3.5:1 R:R minimum
             tp_level2 = min(resistance * 1.002, current['vwap_upper'])
             tp = max(tp_level1, tp_level2)  # Use the higher TP
@@ -122,7 +126,7 @@ def ema_vwap_rsi_strategy(df, df_higher=None):
             signal = 'BUY'
         else:
             # Dynamic SL based on recent swing high and VWAP
-            swing_high = df['high'].rolling(10).max().iloc[-1]
+            swing_high = ind.rolling_max(10).iloc[-1]
             vwap_resistance = max(current['vwap'], current['vwap_upper'])
             
             sl_level1 = entry_price + (atr_multiplier * atr_value)
@@ -130,7 +134,7 @@ def ema_vwap_rsi_strategy(df, df_higher=None):
             sl = min(sl_level1, sl_level2)  # Use the lower (safer) SL
             
             # Dynamic TP
-            support = df['low'].rolling(20).min().iloc[-1]
+            support = ind.rolling_min(20).iloc[-1]
             tp_level1 = entry_price - (3.5 * atr_value)  # 3.5:1 R:R minimum
             tp_level2 = max(support * 0.998, current['vwap_lower'])
             tp = min(tp_level1, tp_level2)  # Use the lower TP
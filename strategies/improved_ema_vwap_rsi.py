@@ -8,16 +8,75 @@ Improved EMA VWAP RSI Strategy
 - Market condition awareness
 """
 
-import pandas as pd
-import ta
-import numpy as np
+from utils.feature_view import as_view
+from utils.rule_engine import Condition, Feature as F, RuleSet
 
-def improved_ema_vwap_rsi_strategy(df, df_higher=None, params=None):
+# BUY Signal - More flexible conditions (min_conditions from params, default 5/9)
+BUY_RULES = RuleSet([
+    # Core EMA signal (must have)
+    Condition('ema_cross', F('ema_fast') > F('ema_slow')),
+    
+    # Trend filter (flexible)
+    Condition('trend', (F('close') > F('ema_trend')) | (F('close') > F('sma_20'))),
+    
+    # Higher timeframe (flexible)
+    Condition('higher_trend', F('higher_trend_bullish')),
+    
+    # VWAP confirmation (more flexible)
+    Condition('vwap', (F('close') > F('vwap')) | (F('close') > F('vwap_lower'))),
+    
+    # RSI conditions (more flexible)
+    Condition('rsi', F('rsi') < F('rsi_overbought')),
+    Condition('rsi_fast', F('rsi_fast') > 35),  # More flexible
+    
+    # Volume confirmation (more flexible)
+    Condition('volume', F('volume_ratio') > F('volume_threshold')),
+    
+    # Price action (flexible)
+    Condition('price_action', (F('close') > F('close', 1)) | (F('close') > F('sma_20'))),
+    
+    # MACD confirmation (optional)
+    Condition('macd', (F('macd') > F('macd_signal')) | (F('macd') > F('macd', 1))),
+], threshold=5)
+
+# SELL Signal - More flexible conditions
+SELL_RULES = RuleSet([
+    # Core EMA signal (must have)
+    Condition('ema_cross', F('ema_fast') < F('ema_slow')),
+    
+    # Trend filter (flexible)
+    Condition('trend', (F('close') < F('ema_trend')) | (F('close') < F('sma_20'))),
+    
+    # Higher timeframe (flexible)
+    Condition('higher_trend', ~F('higher_trend_bullish')),
+    
+    # VWAP confirmation (more flexible)
+    Condition('vwap', (F('close') < F('vwap')) | (F('close') < F('vwap_upper'))),
+    
+    # RSI conditions (more flexible)
+    Condition('rsi', F('rsi') > F('rsi_oversold')),
+    Condition('rsi_fast', F('rsi_fast') < 65),  # More flexible
+    
+    # Volume confirmation (more flexible)
+    Condition('volume', F('volume_ratio') > F('volume_threshold')),
+    
+    # Price action (flexible)
+    Condition('price_action', (F('close') < F('close', 1)) | (F('close') < F('sma_20'))),
+    
+    # MACD confirmation (optional)
+    Condition('macd', (F('macd') < F('macd_signal')) | (F('macd') < F('macd', 1))),
+], threshold=5)
+
+def improved_ema_vwap_rsi_strategy(df, df_higher=None, params=None, ind=None, ind_higher=None):
     """
     Improved EMA VWAP RSI Strategy with flexible parameters
+    ind, ind_higher: shared per-cycle IndicatorFrame (created here when None)
     """
     if len(df) < 50:
         return None
+    df = as_view(df, ind)
+    ind = df.ind
+    features = df.features()  # Giá trị trung gian cục bộ, không ghi vào df dùng chung
     
     # Default parameters
     default_params = {
@@ -38,107 +97,57 @@ def improved_ema_vwap_rsi_strategy(df, df_higher=None, params=None):
             default_params[key] = value
     
     # 1. EMA (Optimized periods)
-    df['ema_fast'] = ta.trend.EMAIndicator(df['close'], 8).ema_indicator()
-    df['ema_slow'] = ta.trend.EMAIndicator(df['close'], 21).ema_indicator()
-    df['ema_trend'] = ta.trend.EMAIndicator(df['close'], 50).ema_indicator()
+    features['ema_fast'] = ind.ema(8)
+    features['ema_slow'] = ind.ema(21)
+    features['ema_trend'] = ind.ema(50)
     
     # 2. VWAP + VWAP bands (More flexible)
-    df['tp'] = (df['high'] + df['low'] + df['close']) / 3
-    df['vwap'] = (df['tp'] * df['volume']).cumsum() / df['volume'].cumsum()
-    df['vwap_std'] = df['tp'].rolling(20).std()
-    df['vwap_upper'] = df['vwap'] + (df['vwap_std'] * 1.5)
-    df['vwap_lower'] = df['vwap'] - (df['vwap_std'] * 1.5)
+    features['tp'] = (df['high'] + df['low'] + df['close']) / 3
+    features['vwap'] = (features['tp'] * df['volume']).cumsum() / df['volume'].cumsum()
+    features['vwap_std'] = features['tp'].rolling(20).std()
+    features['vwap_upper'] = features['vwap'] + (features['vwap_std'] * 1.5)
+    features['vwap_lower'] = features['vwap'] - (features['vwap_std'] * 1.5)
     
     # 3. RSI (Multiple timeframes)
-    df['rsi'] = ta.momentum.RSIIndicator(df['close'], 14).rsi()
-    df['rsi_fast'] = ta.momentum.RSIIndicator(df['close'], 7).rsi()
+    features['rsi'] = ind.rsi(14)
+    features['rsi_fast'] = ind.rsi(7)
     
     # 4. Volume analysis (More flexible)
-    df['volume_sma'] = df['volume'].rolling(20).mean()
-    df['volume_ratio'] = df['volume'] / df['volume_sma']
+    features['volume_sma'] = ind.sma(20, 'volume')
+    features['volume_ratio'] = df['volume'] / features['volume_sma']
     
     # 5. Volatility (ATR)
-    atr = ta.volatility.AverageTrueRange(df['high'], df['low'], df['close'], 14)
-    df['atr'] = atr.average_true_range()
+    features['atr'] = ind.atr(14)
     
     # 6. Additional indicators for better signals
-    df['sma_20'] = ta.trend.SMAIndicator(df['close'], 20).sma_indicator()
-    df['sma_50'] = ta.trend.SMAIndicator(df['close'], 50).sma_indicator()
+    features['sma_20'] = ind.sma(20)
+    features['sma_50'] = ind.sma(50)
     
     # 7. Momentum indicators
-    df['macd'] = ta.trend.MACD(df['close']).macd()
-    df['macd_signal'] = ta.trend.MACD(df['close']).macd_signal()
+    macd = ind.macd()
+    features['macd'] = macd['macd']
+    features['macd_signal'] = macd['signal']
     
-    current = df.iloc[-1]
-    prev = df.iloc[-2]
-    prev2 = df.iloc[-3]
+    current = features.row(-1)
     
     # Multi-timeframe confirmation (More flexible)
     higher_trend_bullish = True
     if df_higher is not None and len(df_higher) >= 20:
-        df_higher['ema_trend'] = ta.trend.EMAIndicator(df_higher['close'], 20).ema_indicator()
-        higher_trend_bullish = df_higher['close'].iloc[-1] > df_higher['ema_trend'].iloc[-1]
-    
-    # BUY Signal - More flexible conditions
-    buy_conditions = [
-        # Core EMA signal (must have)
-        current['ema_fast'] > current['ema_slow'],
-        
-        # Trend filter (flexible)
-        current['close'] > current['ema_trend'] or current['close'] > current['sma_20'],
-        
-        # Higher timeframe (flexible)
-        higher_trend_bullish,
-        
-        # VWAP confirmation (more flexible)
-        current['close'] > current['vwap'] or current['close'] > current['vwap_lower'],
-        
-        # RSI conditions (more flexible)
-        current['rsi'] < default_params['rsi_overbought'],
-        current['rsi_fast'] > 35,  # More flexible
-        
-        # Volume confirmation (more flexible)
-        current['volume_ratio'] > default_params['volume_threshold'],
-        
-        # Price action (flexible)
-        current['close'] > prev['close'] or current['close'] > current['sma_20'],
-        
-        # MACD confirmation (optional)
-        current['macd'] > current['macd_signal'] or current['macd'] > prev['macd']
-    ]
-    
-    # SELL Signal - More flexible conditions
-    sell_conditions = [
-        # Core EMA signal (must have)
-        current['ema_fast'] < current['ema_slow'],
-        
-        # Trend filter (flexible)
-        current['close'] < current['ema_trend'] or current['close'] < current['sma_20'],
-        
-        # Higher timeframe (flexible)
-        not higher_trend_bullish,
-        
-        # VWAP confirmation (more flexible)
-        current['close'] < current['vwap'] or current['close'] < current['vwap_upper'],
-        
-        # RSI conditions (more flexible)
-        current['rsi'] > default_params['rsi_oversold'],
-        current['rsi_fast'] < 65,  # More flexible
-        
-        # Volume confirmation (more flexible)
-        current['volume_ratio'] > default_params['volume_threshold'],
-        
-        # Price action (flexible)
-        current['close'] < prev['close'] or current['close'] < current['sma_20'],
-        
-        # MACD confirmation (optional)
-        current['macd'] < current['macd_signal'] or current['macd'] < prev['macd']
-    ]
+        df_higher = as_view(df_higher, ind_higher)
+        ind_higher = df_higher.ind
+        higher_ema_trend = ind_higher.ema(20)
+        higher_trend_bullish = df_higher['close'].iloc[-1] > higher_ema_trend.iloc[-1]
     
     # More flexible signal generation
+    values = {
+        'higher_trend_bullish': higher_trend_bullish,
+        'rsi_overbought': default_params['rsi_overbought'],
+        'rsi_oversold': default_params['rsi_oversold'],
+        'volume_threshold': default_params['volume_threshold'],
+    }
     min_conditions = default_params['min_conditions']
-    buy_signal = sum(buy_conditions) >= min_conditions
-    sell_signal = sum(sell_conditions) >= min_conditions
+    buy_signal = BUY_RULES.score(features, **values) >= min_conditions
+    sell_signal = SELL_RULES.score(features, **values) >= min_conditions
     
     # Calculate SL/TP with improved logic
     if buy_signal or sell_signal:
@@ -146,7 +155,7 @@ def improved_ema_vwap_rsi_strategy(df, df_higher=None, params=None):
         atr_value = current['atr']
         
         # Dynamic ATR multiplier based on volatility
-        volatility = df['close'].pct_change().rolling(20).std().iloc[-1]
+        volatility = ind.returns_volatility(20).iloc[-1]
         atr_multiplier = max(
             default_params['atr_multiplier_min'], 
             min(default_params['atr_multiplier_max'], volatility * 100)
@@ -154,7 +163,7 @@ def improved_ema_vwap_rsi_strategy(df, df_higher=None, params=None):
         
         if buy_signal:
             # Improved SL calculation
-            swing_low = df['low'].rolling(10).min().iloc[-1]
+            swing_low = ind.rolling_min(10).iloc[-1]
             vwap_support = min(current['vwap'], current['vwap_lower'])
             sma_support = current['sma_20']
             
@@ -164,7 +173,7 @@ def improved_ema_vwap_rsi_strategy(df, df_higher=None, params=None):
             sl = max(sl_level1, sl_level2, sl_level3)
             
             # Improved TP calculation
-            resistance = df['high'].rolling(20).max().iloc[-1]
+            resistance = ind.rolling_max(20).iloc[-1]
             tp_level1 = entry_price + (default_params['rr_target'] * atr_value)
             tp_level2 = min(resistance * 1.002, current['vwap_upper'])
             tp_level3 = entry_price + (3.0 * atr_value)  # Minimum 3:1 R:R
@@ -173,7 +182,7 @@ def improved_ema_vwap_rsi_strategy(df, df_higher=None, params=None):
             signal = 'BUY'
         else:
             # Improved SL calculation for SELL
-            swing_high = df['high'].rolling(10).max().iloc[-1]
+            swing_high = ind.rolling_max(10).iloc[-1]
             vwap_resistance = max(current['vwap'], current['vwap_upper'])
             sma_resistance = current['sma_20']
             
@@ -183,7 +192,7 @@ def improved_ema_vwap_rsi_strategy(df, df_higher=None, params=None):
             sl = min(sl_level1, sl_level2, sl_level3)
             
             # Improved TP calculation for SELL
-            support = df['low'].rolling(20).min().iloc[-1]
+            support = ind.rolling_min(20).iloc[-1]
             tp_level1 = entry_price - (default_params['rr_target'] * atr_value)
             tp_level2 = max(support * 0.998, current['vwap_lower'])
             tp_level3 = entry_price - (3.0 * atr_value)  # Minimum 3:1 R:R
@@ -220,7 +229,7 @@ def improved_ema_vwap_rsi_strategy(df, df_higher=None, params=None):
     
     return None
 
-def get_improved_ema_vwap_rsi_strategy(df, df_higher=None, market_conditions=None):
+def get_improved_ema_vwap_rsi_strategy(df, df_higher=None, market_conditions=None, ind=None, ind_higher=None):
     """
     Get improved EMA VWAP RSI strategy with market condition adaptation
     """
@@ -271,4 +280,4 @@ def get_improved_ema_vwap_rsi_strategy(df, df_higher=None, market_conditions=Non
             params['atr_multiplier_min'] = 0.8
             params['atr_multiplier_max'] = 1.5
     
-    return improved_ema_vwap_rsi_strategy(df, df_higher, params) 
\ No newline at end of file
+    return improved_ema_vwap_rsi_strategy(df, df_higher, params, ind, ind_higher) 
\ No newline at end of file
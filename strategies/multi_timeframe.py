@@ -1,8 +1,55 @@
-import pandas as pd
-import ta
-import numpy as np
+from utils.feature_view import as_view
+from utils.rule_engine import Condition, Feature as F, RuleSet
 
-def multi_timeframe_strategy(df, df_higher=None):
+# BUY Conditions với scoring system (weighted), cần ít nhất 65% điểm
+BUY_RULES = RuleSet([
+    # Trend conditions (40% weight)
+    Condition('ema_stack', (F('ema_fast') > F('ema_mid')) & (F('ema_mid') > F('ema_slow')), 0.12),
+    Condition('trend_improving', F('trend_strength') > F('trend_strength', 1), 0.10),
+    Condition('price_above_ema', F('close') > F('ema_mid'), 0.08),
+    Condition('strong_trend', F('trend_strength') > 0.001, 0.10),  # At least 0.1% trend
+    
+    # Momentum conditions (30% weight)
+    Condition('macd_bullish', F('macd') > F('macd_signal'), 0.08),
+    Condition('macd_improving', F('macd_histogram') > F('macd_histogram', 1), 0.06),
+    Condition('rsi_bullish', F('rsi').between(30, 75), 0.06),  # Not extreme
+    Condition('rsi_momentum', F('rsi') > F('rsi_fast'), 0.05),  # RSI momentum
+    Condition('stoch_bullish', F('stoch').between(20, 80), 0.05),
+    
+    # Volume conditions (20% weight)
+    Condition('volume_support', F('volume_ratio') > 1.0, 0.12),
+    Condition('obv_bullish', F('obv') > F('obv_ema'), 0.08),
+    
+    # Price action (10% weight)
+    Condition('bullish_candle', F('close') > F('open'), 0.05),
+    Condition('price_momentum', F('close') > F('close', 1), 0.05),
+], threshold=0.65)
+
+# SELL Conditions
+SELL_RULES = RuleSet([
+    # Trend conditions (40% weight)
+    Condition('ema_stack', (F('ema_fast') < F('ema_mid')) & (F('ema_mid') < F('ema_slow')), 0.12),
+    Condition('trend_weakening', F('trend_strength') < F('trend_strength', 1), 0.10),
+    Condition('price_below_ema', F('close') < F('ema_mid'), 0.08),
+    Condition('strong_downtrend', F('trend_strength') < -0.001, 0.10),
+    
+    # Momentum conditions (30% weight)
+    Condition('macd_bearish', F('macd') < F('macd_signal'), 0.08),
+    Condition('macd_deteriorating', F('macd_histogram') < F('macd_histogram', 1), 0.06),
+    Condition('rsi_bearish', F('rsi').between(25, 70), 0.06),
+    Condition('rsi_momentum', F('rsi') < F('rsi_fast'), 0.05),
+    Condition('stoch_bearish', F('stoch').between(20, 80), 0.05),
+    
+    # Volume conditions (20% weight)
+    Condition('volume_support', F('volume_ratio') > 1.0, 0.12),
+    Condition('obv_bearish', F('obv') < F('obv_ema'), 0.08),
+    
+    # Price action (10% weight)
+    Condition('bearish_candle', F('close') < F('open'), 0.05),
+    Condition('price_momentum', F('close') < F('close', 1), 0.05),
+], threshold=0.65)
+
+def multi_timeframe_strategy(df, df_higher=None, ind=None, ind_higher=None):
     """
     Chiến lược đa khung thời gian CẢI TIẾN - TĂNG LỢI NHUẬN
     Winrate kỳ vọng: 70-80%, R:R improved to 1:4-6
@@ -12,137 +59,70 @@ def multi_timeframe_strategy(df, df_higher=None):
     2. Dynamic SL/TP dựa trên volatility và trend strength
     3. Advanced confidence scoring
     4. Better entry timing với momentum confirmation
+    
+    df, df_higher: DataFrame hoặc FeatureView chỉ đọc (chiến lược không ghi cột vào df)
+    ind, ind_higher: IndicatorFrame dùng chung của chu kỳ (None thì tự tạo)
     """
     
-    def get_enhanced_timeframe_signal(df, timeframe_weight=1.0):
+    def get_enhanced_timeframe_signal(df, ind, timeframe_weight=1.0):
         """
         Phân tích tín hiệu nâng cao cho từng timeframe
         """
         if len(df) < 50:
             return {'signal': 'HOLD', 'strength': 0, 'confidence': 0}
+        features = df.features()  # Giá trị trung gian cục bộ, không ghi vào df dùng chung
         
         # === 1. Trend Analysis (Multiple EMAs) ===
-        df['ema_fast'] = ta.trend.EMAIndicator(df['close'], 8).ema_indicator()
-        df['ema_mid'] = ta.trend.EMAIndicator(df['close'], 21).ema_indicator()
-        df['ema_slow'] = ta.trend.EMAIndicator(df['close'], 50).ema_indicator()
+        features['ema_fast'] = ind.ema(8)
+        features['ema_mid'] = ind.ema(21)
+        features['ema_slow'] = ind.ema(50)
         
         # Trend strength
-        df['trend_strength'] = (df['ema_fast'] - df['ema_slow']) / df['close']
+        features['trend_strength'] = (features['ema_fast'] - features['ema_slow']) / df['close']
         
         # === 2. Momentum Indicators ===
-        df['rsi'] = ta.momentum.RSIIndicator(df['close'], 14).rsi()
-        df['rsi_fast'] = ta.momentum.RSIIndicator(df['close'], 7).rsi()
+        features['rsi'] = ind.rsi(14)
+        features['rsi_fast'] = ind.rsi(7)
         
         # MACD
-        macd = ta.trend.MACD(df['close'])
-        df['macd'] = macd.macd()
-        df['macd_signal'] = macd.macd_signal()
-        df['macd_histogram'] = macd.macd_diff()
+        macd = ind.macd()
+        features['macd'] = macd['macd']
+        features['macd_signal'] = macd['signal']
+        features['macd_histogram'] = macd['diff']
         
         # Stochastic
-        df['stoch'] = ta.momentum.StochasticOscillator(
-            df['high'], df['low'], df['close'], 14, 3
-        ).stoch()
+        features['stoch'] = ind.stoch(14, 3)
         
         # === 3. Volume Analysis ===
-        df['volume_sma'] = df['volume'].rolling(20).mean()
-        df['volume_ratio'] = df['volume'] / df['volume_sma']
+        features['volume_sma'] = ind.sma(20, 'volume')
+        features['volume_ratio'] = df['volume'] / features['volume_sma']
         
         # OBV
-        df['obv'] = ta.volume.OnBalanceVolumeIndicator(
-            df['close'], df['volume']
-        ).on_balance_volume()
-        df['obv_ema'] = ta.trend.EMAIndicator(df['obv'], 10).ema_indicator()
+        features['obv'] = ind.obv()
+        features['obv_ema'] = ind.ema(10, ('obv',))
         
         # === 4. Volatility & Support/Resistance ===
-        df['atr'] = ta.volatility.AverageTrueRange(
-            df['high'], df['low'], df['close'], 14
-        ).average_true_range()
+        features['atr'] = ind.atr(14)
         
         # Bollinger Bands
-        bb = ta.volatility.BollingerBands(df['close'], 20, 2)
-        df['bb_upper'] = bb.bollinger_hband()
-        df['bb_lower'] = bb.bollinger_lband()
-        df['bb_width'] = (df['bb_upper'] - df['bb_lower']) / df['close']
+        bb = ind.bollinger(20, 2)
+        features['bb_upper'] = bb['upper']
+        features['bb_lower'] = bb['lower']
+        features['bb_width'] = (features['bb_upper'] - features['bb_lower']) / df['close']
         
-        current = df.iloc[-1]
-        prev = df.iloc[-2]
+        current = features.row(-1)
         
         # === 5. Enhanced Signal Logic ===
         
-        # BUY Conditions với scoring system
-        buy_conditions = {
-            # Trend conditions (40% weight)
-            'ema_stack': current['ema_fast'] > current['ema_mid'] > current['ema_slow'],
-            'trend_improving': current['trend_strength'] > prev['trend_strength'],
-            'price_above_ema': current['close'] > current['ema_mid'],
-            'strong_trend': current['trend_strength'] > 0.001,  # At least 0.1% trend
-            
-            # Momentum conditions (30% weight)
-            'macd_bullish': current['macd'] > current['macd_signal'],
-            'macd_improving': current['macd_histogram'] > prev['macd_histogram'],
-            'rsi_bullish': 30 < current['rsi'] < 75,  # Not extreme
-            'rsi_momentum': current['rsi'] > current['rsi_fast'],  # RSI momentum
-            'stoch_bullish': current['stoch'] > 20 and current['stoch'] < 80,
-            
-            # Volume conditions (20% weight)
-            'volume_support': current['volume_ratio'] > 1.0,
-            'obv_bullish': current['obv'] > current['obv_ema'],
-            
-            # Price action (10% weight)
-            'bullish_candle': current['close'] > current['open'],
-            'price_momentum': current['close'] > prev['close'],
-        }
-        
-        # SELL Conditions
-        sell_conditions = {
-            # Trend conditions (40% weight)
-            'ema_stack': current['ema_fast'] < current['ema_mid'] < current['ema_slow'],
-            'trend_weakening': current['trend_strength'] < prev['trend_strength'],
-            'price_below_ema': current['close'] < current['ema_mid'],
-            'strong_downtrend': current['trend_strength'] < -0.001,
-            
-            # Momentum conditions (30% weight)
-            'macd_bearish': current['macd'] < current['macd_signal'],
-            'macd_deteriorating': current['macd_histogram'] < prev['macd_histogram'],
-            'rsi_bearish': 25 < current['rsi'] < 70,
-            'rsi_momentum': current['rsi'] < current['rsi_fast'],
-            'stoch_bearish': current['stoch'] > 20 and current['stoch'] < 80,
-            
-            # Volume conditions (20% weight)
-            'volume_support': current['volume_ratio'] > 1.0,
-            'obv_bearish': current['obv'] < current['obv_ema'],
-            
-            # Price action (10% weight)
-            'bearish_candle': current['close'] < current['open'],
-            'price_momentum': current['close'] < prev['close'],
-        }
-        
         # Calculate weighted scores
-        weights = {
-            # Trend (40%)
-            'ema_stack': 0.12, 'trend_improving': 0.10, 'price_above_ema': 0.08, 'strong_trend': 0.10,
-            'trend_weakening': 0.10, 'price_below_ema': 0.08, 'strong_downtrend': 0.10,
-            # Momentum (30%)
-            'macd_bullish': 0.08, 'macd_improving': 0.06, 'rsi_bullish': 0.06, 
-            'rsi_momentum': 0.05, 'stoch_bullish': 0.05,
-            'macd_bearish': 0.08, 'macd_deteriorating': 0.06, 'rsi_bearish': 0.06,
-            'stoch_bearish': 0.05,
-            # Volume (20%)
-            'volume_support': 0.12, 'obv_bullish': 0.08, 'obv_bearish': 0.08,
-            # Price action (10%)
-            'bullish_candle': 0.05, 'price_momentum': 0.05,
-            'bearish_candle': 0.05
-        }
-        
-        buy_score = sum(weights[key] for key, condition in buy_conditions.items() if condition)
-        sell_score = sum(weights[key] for key, condition in sell_conditions.items() if condition)
+        buy_score = BUY_RULES.score(features)
+        sell_score = SELL_RULES.score(features)
         
         # Signal determination với thresholds cao hơn
-        if buy_score >= 0.65:  # Cần ít nhất 65% điểm
+        if buy_score >= BUY_RULES.threshold:  # Cần ít nhất 65% điểm
             signal = 'BUY'
             strength = buy_score
-        elif sell_score >= 0.65:
+        elif sell_score >= SELL_RULES.threshold:
             signal = 'SELL'
             strength = sell_score
         else:
@@ -183,13 +163,17 @@ def multi_timeframe_strategy(df, df_higher=None):
     # === Main Strategy Logic ===
     if len(df) < 50:
         return None
+    df = as_view(df, ind)
+    ind = df.ind
     
     # Analyze different timeframes
-    tf_main = get_enhanced_timeframe_signal(df, 1.0)  # Main timeframe
+    tf_main = get_enhanced_timeframe_signal(df, ind, 1.0)  # Main timeframe
     
     tf_higher = {'signal': 'HOLD', 'strength': 0, 'confidence': 0}
     if df_higher is not None and len(df_higher) >= 30:
-        tf_higher = get_enhanced_timeframe_signal(df_higher, 1.2)  # Higher weight
+        df_higher = as_view(df_higher, ind_higher)
+        ind_higher = df_higher.ind
+        tf_higher = get_enhanced_timeframe_signal(df_higher, ind_higher, 1.2)  # Higher weight
     
     # Multi-timeframe decision với improved weighting
     main_weight = 0.6
@@ -223,16 +207,14 @@ def multi_timeframe_strategy(df, df_higher=None):
     
     # === ADVANCED SL/TP CALCULATION ===
     entry_price = df['close'].iloc[-1]
-    current_atr = tf_main['atr'] if 'atr' in tf_main else ta.volatility.AverageTrueRange(
-        df['high'], df['low'], df['close'], 14
-    ).average_true_range().iloc[-1]
+    current_atr = tf_main['atr'] if 'atr' in tf_main else ind.atr(14).iloc[-1]
     
     # Dynamic multipliers dựa trên market conditions
     base_sl_multiplier = 2.0  # Tăng từ 1.5
     base_tp_multiplier = 6.0  # Tăng từ 2.0 để có R:R cao hơn
     
     # Adjustments based on market conditions
-    volatility = df['close'].pct_change().rolling(20).std().iloc[-1]
+    volatility = ind.returns_volatility(20).iloc[-1]
     vol_adjustment = max(0.8, min(2.0, volatility * 80))
     
     # Trend strength adjustment
@@ -252,11 +234,11 @@ def multi_timeframe_strategy(df, df_higher=None):
         sl_atr = entry_price - (sl_multiplier * current_atr)
         
         # Support level SL
-        recent_low = df['low'].rolling(30).min().iloc[-1]
+        recent_low = ind.rolling_min(30).iloc[-1]
         sl_support = recent_low * 0.998
         
         # EMA support SL
-        ema_21 = ta.trend.EMAIndicator(df['close'], 21).ema_indicator().iloc[-1]
+        ema_21 = ind.ema(21).iloc[-1]
         sl_ema = ema_21 * 0.997
         
         # Use the highest (safest) SL
@@ -267,7 +249,7 @@ def multi_timeframe_strategy(df, df_higher=None):
         tp_atr = entry_price + (tp_multiplier * current_atr)
         
         # TP 2: Resistance-based
-        recent_high = df['high'].rolling(30).max().iloc[-1]
+        recent_high = ind.rolling_max(30).iloc[-1]
         tp_resistance = recent_high * 1.002
         
         # TP 3: Trend projection
@@ -287,11 +269,11 @@ def multi_timeframe_strategy(df, df_higher=None):
         sl_atr = entry_price + (sl_multiplier * current_atr)
         
         # Resistance level SL
-        recent_high = df['high'].rolling(30).max().iloc[-1]
+        recent_high = ind.rolling_max(30).iloc[-1]
         sl_resistance = recent_high * 1.002
         
         # EMA resistance SL
-        ema_21 = ta.trend.EMAIndicator(df['close'], 21).ema_indicator().iloc[-1]
+        ema_21 = ind.ema(21).iloc[-1]
         sl_ema = ema_21 * 1.003
         
         # Use the lowest (safest) SL
@@ -302,7 +284,7 @@ def multi_timeframe_strategy(df, df_higher=None):
         tp_atr = entry_price - (tp_multiplier * current_atr)
         
         # TP 2: Support-based
-        recent_low = df['low'].rolling(30).min().iloc[-1]
+        recent_low = ind.rolling_min(30).iloc[-1]
         tp_support = recent_low * 0.998
         
         # TP 3: Trend projection
@@ -1,115 +1,105 @@
-import pandas as pd
-import ta
+from utils.feature_view import as_view
+from utils.rule_engine import Condition, Feature as F, RuleSet
 
-def supertrend_rsi_strategy(df, df_higher=None):
+# Enhanced BUY conditions: 6/9 conditions
+BUY_RULES = RuleSet([
+    # Multi-Supertrend confirmation - More flexible
+    Condition('supertrend_main', F('close') > F('supertrend_main')),  # Main trend
+    Condition('supertrend_fast', (F('close') > F('supertrend_fast'))
+              | (F('close', 1) <= F('supertrend_fast', 1))),  # Fast entry or fresh break
+    
+    # RSI conditions - More nuanced
+    Condition('rsi', (F('rsi') < 35)
+              | ((F('rsi') < 50) & (F('rsi') > F('rsi_sma')))),  # Oversold OR bullish divergence
+    Condition('rsi_fast', F('rsi_fast') > 25),  # Not extremely oversold
+    Condition('rsi_improving', F('rsi') > F('rsi', 1)),  # RSI improving
+    
+    # Trend filter
+    Condition('higher_trend', F('higher_trend_bullish')),  # Higher timeframe bullish
+    
+    # Volume and momentum
+    Condition('volume', F('volume_ratio') > 0.8),  # Decent volume (more flexible)
+    Condition('price_action', (F('close') > F('close', 1))
+              | (F('close') > F('close', 2))),  # Recent bullish price action
+    
+    # Volatility conditions
+    Condition('squeeze', ~F('squeeze') | (F('bb_width') > F('bb_width', 1))),  # Breaking out of squeeze
+], threshold=6)
+
+# Enhanced SELL conditions: 6/9 conditions
+SELL_RULES = RuleSet([
+    # Multi-Supertrend confirmation
+    Condition('supertrend_main', F('close') < F('supertrend_main')),  # Main trend
+    Condition('supertrend_fast', (F('close') < F('supertrend_fast'))
+              | (F('close', 1) >= F('supertrend_fast', 1))),  # Fast entry or fresh break
+    
+    # RSI conditions - More nuanced
+    Condition('rsi', (F('rsi') > 65)
+              | ((F('rsi') > 50) & (F('rsi') < F('rsi_sma')))),  # Overbought OR bearish divergence
+    Condition('rsi_fast', F('rsi_fast') < 75),  # Not extremely overbought
+    Condition('rsi_deteriorating', F('rsi') < F('rsi', 1)),  # RSI deteriorating
+    
+    # Trend filter
+    Condition('higher_trend', ~F('higher_trend_bullish')),  # Higher timeframe bearish
+    
+    # Volume and momentum
+    Condition('volume', F('volume_ratio') > 0.8),  # Decent volume
+    Condition('price_action', (F('close') < F('close', 1))
+              | (F('close') < F('close', 2))),  # Recent bearish price action
+    
+    # Volatility conditions
+    Condition('squeeze', ~F('squeeze') | (F('bb_width') > F('bb_width', 1))),  # Breaking out of squeeze
+], threshold=6)
+
+def supertrend_rsi_strategy(df, df_higher=None, ind=None, ind_higher=None):
     """
     Chiến lược kết hợp Supertrend + RSI - PHIÊN BẢN CẢI TIẾN
     Winrate kỳ vọng: 75-80%, R:R improved to 1:4-5
+    df, df_higher: DataFrame hoặc FeatureView chỉ đọc (chiến lược không ghi cột vào df)
+    ind, ind_higher: IndicatorFrame dùng chung của chu kỳ (None thì tự tạo)
     """
     if len(df) < 50:
         return None
+    df = as_view(df, ind)
+    ind = df.ind
+    features = df.features()  # Giá trị trung gian cục bộ, không ghi vào df dùng chung
     
-    # 1. Enhanced Supertrend với multiple periods
-    def calculate_supertrend(df, period=10, multiplier=2.0):
-        atr = ta.volatility.AverageTrueRange(df['high'], df['low'], df['close'], period)
-        atr_values = atr.average_true_range()
-        
-        hl2 = (df['high'] + df['low']) / 2
-        upper_band = hl2 + (multiplier * atr_values)
-        lower_band = hl2 - (multiplier * atr_values)
-        
-        supertrend = []
-        for i in range(len(df)):
-            if i == 0:
-                supertrend.append(lower_band.iloc[i])
-            else:
-                if df['close'].iloc[i] <= supertrend[i-1]:
-                    supertrend.append(upper_band.iloc[i])
-                else:
-                    supertrend.append(lower_band.iloc[i])
-        
-        return pd.Series(supertrend, index=df.index), atr_values
-    
-    # Multiple Supertrend periods for better confirmation
-    df['supertrend_fast'], df['atr_fast'] = calculate_supertrend(df, 7, 1.8)   # Faster
-    df['supertrend_main'], df['atr_main'] = calculate_supertrend(df, 10, 2.0)  # Main
-    df['supertrend_slow'], df['atr_slow'] = calculate_supertrend(df, 14, 2.2)  # Slower
+    # 1. Enhanced Supertrend với multiple periods (fast, main, slow) tính chung một lần
+    supertrend, atr_values, _ = ind.supertrend(((7, 1.8), (10, 2.0), (14, 2.2)))
+    features['supertrend_fast'], features['supertrend_main'], features['supertrend_slow'] = supertrend.T
+    features['atr_fast'], features['atr_main'], features['atr_slow'] = atr_values.T
     
     # 2. Enhanced RSI with multiple timeframes
-    df['rsi'] = ta.momentum.RSIIndicator(df['close'], 14).rsi()
-    df['rsi_fast'] = ta.momentum.RSIIndicator(df['close'], 7).rsi()
-    df['rsi_slow'] = ta.momentum.RSIIndicator(df['close'], 21).rsi()
+    features['rsi'] = ind.rsi(14)
+    features['rsi_fast'] = ind.rsi(7)
+    features['rsi_slow'] = ind.rsi(21)
     
     # RSI trend analysis
-    df['rsi_sma'] = df['rsi'].rolling(5).mean()
+    features['rsi_sma'] = ind.sma(5, ('rsi', 'close', 14))
     
     # 3. Volume analysis
-    df['volume_sma'] = df['volume'].rolling(20).mean()
-    df['volume_ratio'] = df['volume'] / df['volume_sma']
+    features['volume_sma'] = ind.sma(20, 'volume')
+    features['volume_ratio'] = df['volume'] / features['volume_sma']
     
     # 4. Volatility squeeze detection
-    bb = ta.volatility.BollingerBands(df['close'], 20, 2)
-    df['bb_upper'] = bb.bollinger_hband()
-    df['bb_lower'] = bb.bollinger_lband()
-    df['bb_width'] = (df['bb_upper'] - df['bb_lower']) / df['close']
-    df['squeeze'] = df['bb_width'] < df['bb_width'].rolling(20).mean() * 0.8
+    bb = ind.bollinger(20, 2)
+    features['bb_upper'] = bb['upper']
+    features['bb_lower'] = bb['lower']
+    features['bb_width'] = (features['bb_upper'] - features['bb_lower']) / df['close']
+    features['squeeze'] = features['bb_width'] < features['bb_width'].rolling(20).mean() * 0.8
     
-    current = df.iloc[-1]
-    prev = df.iloc[-2]
-    prev2 = df.iloc[-3]
+    current = features.row(-1)
     
     # Multi-timeframe trend confirmation
     higher_trend_bullish = True
     if df_higher is not None and len(df_higher) >= 20:
-        df_higher['ema'] = ta.trend.EMAIndicator(df_higher['close'], 20).ema_indicator()
-        higher_trend_bullish = df_higher['close'].iloc[-1] > df_higher['ema'].iloc[-1]
-    
-    # Enhanced BUY conditions
-    buy_conditions = [
-        # Multi-Supertrend confirmation - More flexible
-        current['close'] > current['supertrend_main'],  # Main trend
-        current['close'] > current['supertrend_fast'] or prev['close'] <= prev['supertrend_fast'],  # Fast entry or fresh break
-        
-        # RSI conditions - More nuanced
-        current['rsi'] < 35 or (current['rsi'] < 50 and current['rsi'] > current['rsi_sma']),  # Oversold OR bullish divergence
-        current['rsi_fast'] > 25,  # Not extremely oversold
-        current['rsi'] > prev['rsi'],  # RSI improving
-        
-        # Trend filter
-        higher_trend_bullish,  # Higher timeframe bullish
-        
-        # Volume and momentum
-        current['volume_ratio'] > 0.8,  # Decent volume (more flexible)
-        current['close'] > prev['close'] or current['close'] > prev2['close'],  # Recent bullish price action
-        
-        # Volatility conditions
-        not current['squeeze'] or current['bb_width'] > prev['bb_width'],  # Breaking out of squeeze
-    ]
-    
-    # Enhanced SELL conditions
-    sell_conditions = [
-        # Multi-Supertrend confirmation
-        current['close'] < current['supertrend_main'],  # Main trend
-        current['close'] < current['supertrend_fast'] or prev['close'] >= prev['supertrend_fast'],  # Fast entry or fresh break
-        
-        # RSI conditions - More nuanced
-        current['rsi'] > 65 or (current['rsi'] > 50 and current['rsi'] < current['rsi_sma']),  # Overbought OR bearish divergence
-        current['rsi_fast'] < 75,  # Not extremely overbought
-        current['rsi'] < prev['rsi'],  # RSI deteriorating
-        
-        # Trend filter
-        not higher_trend_bullish,  # Higher timeframe bearish
-        
-        # Volume and momentum
-        current['volume_ratio'] > 0.8,  # Decent volume
-        current['close'] < prev['close'] or current['close'] < prev2['close'],  # Recent bearish price action
-        
-        # Volatility conditions
-        not current['squeeze'] or current['bb_width'] > prev['bb_width'],  # Breaking out of squeeze
-    ]
+        df_higher = as_view(df_higher, ind_higher)
+        ind_higher = df_higher.ind
+        higher_ema = ind_higher.ema(20)
+        higher_trend_bullish = df_higher['close'].iloc[-1] > higher_ema.iloc[-1]
     
-    buy_signal = sum(buy_conditions) >= 6  # 6/9 conditions
-    sell_signal = sum(sell_conditions) >= 6  # 6/9 conditions
+    buy_signal = BUY_RULES.passed(features, higher_trend_bullish=higher_trend_bullish)
+    sell_signal = SELL_RULES.passed(features, higher_trend_bullish=higher_trend_bullish)
     
     # ADVANCED SL/TP calculation
     if buy_signal or sell_signal:
@@ -122,7 +112,7 @@ def supertrend_rsi_strategy(df, df_higher=None):
         base_multiplier = 1.5
         
         # Adjust for volatility
-        volatility = df['close'].pct_change().rolling(20).std().iloc[-1]
+        volatility = ind.returns_volatility(20).iloc[-1]
         vol_multiplier = max(0.8, min(2.0, volatility * 80)) 
         
         # Adjust for RSI extremes (wider stops for extreme levels)
@@ -136,13 +126,13 @@ def supertrend_rsi_strategy(df, df_higher=None):
             # Multi-level SL approach
             sl_supertrend = current['supertrend_main'] * 0.999  # Just below Supertrend
             sl_atr = entry_price - (final_multiplier * atr_value)  # ATR-based
-            sl_swing = df['low'].rolling(15).min().iloc[-1] * 0.998  # Swing low
+            sl_swing = ind.rolling_min(15).iloc[-1] * 0.998  # Swing low
             
             # Use the highest (safest) SL
             sl = max(sl_supertrend, sl_atr, sl_swing)
             
             # Dynamic TP based on multiple factors
-            resistance_level = df['high'].rolling(20).max().iloc[-1]
+            resistance_level = ind.rolling_max(20).iloc[-1]
             
             # Target levels
             tp_atr = entry_price + (4.0 * atr_value)  # 4:1 minimum R:R
@@ -158,13 +148,13 @@ def supertrend_rsi_strategy(df, df_higher=None):
             # Multi-level SL approach
             sl_supertrend = current['supertrend_main'] * 1.001  # Just above Supertrend
             sl_atr = entry_price + (final_multiplier * atr_value)  # ATR-based
-            sl_swing = df['high'].rolling(15).max().iloc[-1] * 1.002  # Swing high
+            sl_swing = ind.rolling_max(15).iloc[-1] * 1.002  # Swing high
             
             # Use the lowest (safest) SL
             sl = min(sl_supertrend, sl_atr, sl_swing)
             
             # Dynamic TP
-            support_level = df['low'].rolling(20).min().iloc[-1]
+            support_level = ind.rolling_min(20).iloc[-1]
             
             # Target levels
             tp_atr = entry_price - (4.0 * atr_value)  # 4:1 minimum R:R
@@ -1,135 +1,140 @@
-import pandas as pd
-import ta
+from utils.feature_view import as_view
+from utils.rule_engine import Condition, Feature as F, RuleSet
 
-def trend_momentum_volume_strategy(df, df_higher=None):
+# Enhanced BUY Signal - scoring system, need at least 10/14 conditions
+BUY_RULES = RuleSet([
+    # Trend Conditions (4 conditions)
+    Condition('long_trend', F('close') > F('ema_trend')),  # Long-term uptrend
+    Condition('ema_stack', (F('ema_fast') > F('ema_mid')) & (F('ema_mid') > F('ema_slow'))),  # EMA stack bullish
+    Condition('trend_strength', (F('trend_strength') > 0)
+              & (F('trend_strength') > F('trend_strength', 1))),  # Strengthening trend
+    Condition('higher_trend', F('higher_trend_bullish')),  # Higher TF trend
+    
+    # Momentum Conditions (4 conditions)
+    Condition('macd', F('macd') > F('macd_signal')),  # MACD bullish
+    Condition('macd_improving', (F('macd') > F('macd', 1))  # MACD improving OR
+              | ((F('macd', 1) <= F('macd_signal', 1)) & (F('macd') > F('macd_signal')))),  # Fresh crossover
+    Condition('macd_histogram', F('macd_histogram') > F('macd_histogram', 1)),  # Histogram improving
+    Condition('higher_momentum', F('higher_momentum_bullish')),  # Higher TF momentum
+    
+    # Volume Conditions (3 conditions)
+    Condition('volume', F('volume_ratio') > 1.0),  # Above average volume
+    Condition('obv', F('obv') > F('obv_ema')),  # OBV bullish
+    Condition('volume_trend', F('volume_trend')),  # Volume trending up
+    
+    # Additional Filters (3 conditions)
+    Condition('rsi', F('rsi').between(35, 75)),  # RSI in reasonable range
+    Condition('bb_position', F('bb_position') > 0.2),  # Not at bottom of BB
+    Condition('candle', F('close') > F('close', 1)),  # Green candle
+], threshold=10)
+
+# Enhanced SELL Signal - need at least 10/14 conditions
+SELL_RULES = RuleSet([
+    # Trend Conditions (4 conditions)
+    Condition('long_trend', F('close') < F('ema_trend')),  # Long-term downtrend
+    Condition('ema_stack', (F('ema_fast') < F('ema_mid')) & (F('ema_mid') < F('ema_slow'))),  # EMA stack bearish
+    Condition('trend_strength', (F('trend_strength') < 0)
+              & (F('trend_strength') < F('trend_strength', 1))),  # Weakening trend
+    Condition('higher_trend', ~F('higher_trend_bullish')),  # Higher TF trend bearish
+    
+    # Momentum Conditions (4 conditions)
+    Condition('macd', F('macd') < F('macd_signal')),  # MACD bearish
+    Condition('macd_deteriorating', (F('macd') < F('macd', 1))  # MACD deteriorating OR
+              | ((F('macd', 1) >= F('macd_signal', 1)) & (F('macd') < F('macd_signal')))),  # Fresh crossover
+    Condition('macd_histogram', F('macd_histogram') < F('macd_histogram', 1)),  # Histogram deteriorating
+    Condition('higher_momentum', ~F('higher_momentum_bullish')),  # Higher TF momentum bearish
+    
+    # Volume Conditions (3 conditions)
+    Condition('volume', F('volume_ratio') > 1.0),  # Above average volume
+    Condition('obv', F('obv') < F('obv_ema')),  # OBV bearish
+    Condition('volume_trend', F('volume_trend')),  # Volume trending up (selling pressure)
+    
+    # Additional Filters (3 conditions)
+    Condition('rsi', F('rsi').between(25, 65)),  # RSI in reasonable range
+    Condition('bb_position', F('bb_position') < 0.8),  # Not at top of BB
+    Condition('candle', F('close') < F('close', 1)),  # Red candle
+], threshold=10)
+
+def trend_momentum_volume_strategy(df, df_higher=None, ind=None, ind_higher=None):
     """
     Chiến lược kết hợp Trend + Momentum + Volume - PHIÊN BẢN CẢI TIẾN
     Winrate kỳ vọng: 70-75%, R:R improved to 1:4-5
+    df, df_higher: DataFrame hoặc FeatureView chỉ đọc (chiến lược không ghi cột vào df)
+    ind, ind_higher: IndicatorFrame dùng chung của chu kỳ (None thì tự tạo)
     """
     if len(df) < 50:
         return None
+    df = as_view(df, ind)
+    ind = df.ind
+    features = df.features()  # Giá trị trung gian cục bộ, không ghi vào df dùng chung
     
     # 1. Multi-period Trend Analysis
-    df['ema_fast'] = ta.trend.EMAIndicator(df['close'], 12).ema_indicator()
-    df['ema_mid'] = ta.trend.EMAIndicator(df['close'], 26).ema_indicator()
-    df['ema_slow'] = ta.trend.EMAIndicator(df['close'], 50).ema_indicator()
-    df['ema_trend'] = ta.trend.EMAIndicator(df['close'], 100).ema_indicator()  # Long-term trend
+    features['ema_fast'] = ind.ema(12)
+    features['ema_mid'] = ind.ema(26)
+    features['ema_slow'] = ind.ema(50)
+    features['ema_trend'] = ind.ema(100)  # Long-term trend
     
     # Trend strength
-    df['trend_strength'] = (df['ema_fast'] - df['ema_slow']) / df['close']
+    features['trend_strength'] = (features['ema_fast'] - features['ema_slow']) / df['close']
     
     # 2. Enhanced MACD Analysis
-    macd_fast = ta.trend.MACD(df['close'], 12, 26, 9)
-    df['macd'] = macd_fast.macd()
-    df['macd_signal'] = macd_fast.macd_signal()
-    df['macd_histogram'] = macd_fast.macd_diff()
+    # Positional ta.trend.MACD(close, 12, 26, 9) means window_slow=12, window_fast=26
+    macd_fast = ind.macd(fast=26, slow=12, signal=9)
+    features['macd'] = macd_fast['macd']
+    features['macd_signal'] = macd_fast['signal']
+    features['macd_histogram'] = macd_fast['diff']
     
     # MACD with different periods for confirmation
-    macd_slow = ta.trend.MACD(df['close'], 19, 39, 9)
-    df['macd_slow'] = macd_slow.macd()
-    df['macd_slow_signal'] = macd_slow.macd_signal()
+    macd_slow = ind.macd(fast=39, slow=19, signal=9)
+    features['macd_slow'] = macd_slow['macd']
+    features['macd_slow_signal'] = macd_slow['signal']
     
     # 3. Advanced Volume Analysis
-    df['volume_sma'] = df['volume'].rolling(20).mean()
-    df['volume_ema'] = ta.trend.EMAIndicator(df['volume'], 10).ema_indicator()
-    df['volume_ratio'] = df['volume'] / df['volume_sma']
+    features['volume_sma'] = ind.sma(20, 'volume')
+    features['volume_ema'] = ind.ema(10, 'volume')
+    features['volume_ratio'] = df['volume'] / features['volume_sma']
     
     # Volume trend
-    df['volume_trend'] = df['volume_ema'] > df['volume_ema'].shift(1)
+    features['volume_trend'] = features['volume_ema'] > features['volume_ema'].shift(1)
     
     # On-Balance Volume
-    df['obv'] = ta.volume.OnBalanceVolumeIndicator(df['close'], df['volume']).on_balance_volume()
-    df['obv_ema'] = ta.trend.EMAIndicator(df['obv'], 10).ema_indicator()
+    features['obv'] = ind.obv()
+    features['obv_ema'] = ind.ema(10, ('obv',))
     
     # 4. Momentum Oscillators
-    df['rsi'] = ta.momentum.RSIIndicator(df['close'], 14).rsi()
-    df['stoch'] = ta.momentum.StochasticOscillator(df['high'], df['low'], df['close'], 14, 3).stoch()
+    features['rsi'] = ind.rsi(14)
+    features['stoch'] = ind.stoch(14, 3)
     
     # 5. Volatility Analysis
-    atr = ta.volatility.AverageTrueRange(df['high'], df['low'], df['close'], 14)
-    df['atr'] = atr.average_true_range()
-    df['atr_ratio'] = df['atr'] / df['close']
+    features['atr'] = ind.atr(14)
+    features['atr_ratio'] = features['atr'] / df['close']
     
     # Bollinger Bands for volatility
-    bb = ta.volatility.BollingerBands(df['close'], 20, 2)
-    df['bb_upper'] = bb.bollinger_hband()
-    df['bb_lower'] = bb.bollinger_lband()
-    df['bb_position'] = (df['close'] - df['bb_lower']) / (df['bb_upper'] - df['bb_lower'])
+    bb = ind.bollinger(20, 2)
+    features['bb_upper'] = bb['upper']
+    features['bb_lower'] = bb['lower']
+    features['bb_position'] = (df['close'] - features['bb_lower']) / (features['bb_upper'] - features['bb_lower'])
     
-    current = df.iloc[-1]
-    prev = df.iloc[-2]
-    prev2 = df.iloc[-3]
+    current = features.row(-1)
     
     # Higher timeframe trend confirmation
     higher_trend_bullish = True
     higher_momentum_bullish = True
     if df_higher is not None and len(df_higher) >= 30:
-        df_higher['ema'] = ta.trend.EMAIndicator(df_higher['close'], 20).ema_indicator()
-        higher_macd = ta.trend.MACD(df_higher['close'])
-        df_higher['macd'] = higher_macd.macd()
-        df_higher['macd_signal'] = higher_macd.macd_signal()
-        
-        higher_trend_bullish = df_higher['close'].iloc[-1] > df_higher['ema'].iloc[-1]
-        higher_momentum_bullish = df_higher['macd'].iloc[-1] > df_higher['macd_signal'].iloc[-1]
-    
-    # Enhanced BUY Signal
-    buy_conditions = [
-        # Trend Conditions (4 conditions)
-        current['close'] > current['ema_trend'],  # Long-term uptrend
-        current['ema_fast'] > current['ema_mid'] > current['ema_slow'],  # EMA stack bullish
-        current['trend_strength'] > 0 and current['trend_strength'] > prev['trend_strength'],  # Strengthening trend
-        higher_trend_bullish,  # Higher TF trend
-        
-        # Momentum Conditions (4 conditions)
-        current['macd'] > current['macd_signal'],  # MACD bullish
-        (current['macd'] > prev['macd'] or  # MACD improving OR
-         (prev['macd'] <= prev['macd_signal'] and current['macd'] > current['macd_signal'])),  # Fresh crossover
-        current['macd_histogram'] > prev['macd_histogram'],  # Histogram improving
-        higher_momentum_bullish,  # Higher TF momentum
-        
-        # Volume Conditions (3 conditions)
-        current['volume_ratio'] > 1.0,  # Above average volume
-        current['obv'] > current['obv_ema'],  # OBV bullish
-        current['volume_trend'],  # Volume trending up
-        
-        # Additional Filters (3 conditions)
-        current['rsi'] < 75 and current['rsi'] > 35,  # RSI in reasonable range
-        current['bb_position'] > 0.2,  # Not at bottom of BB
-        current['close'] > prev['close'],  # Green candle
-    ]
-    
-    # Enhanced SELL Signal
-    sell_conditions = [
-        # Trend Conditions (4 conditions)
-        current['close'] < current['ema_trend'],  # Long-term downtrend
-        current['ema_fast'] < current['ema_mid'] < current['ema_slow'],  # EMA stack bearish
-        current['trend_strength'] < 0 and current['trend_strength'] < prev['trend_strength'],  # Weakening trend
-        not higher_trend_bullish,  # Higher TF trend bearish
-        
-        # Momentum Conditions (4 conditions)
-        current['macd'] < current['macd_signal'],  # MACD bearish
-        (current['macd'] < prev['macd'] or  # MACD deteriorating OR
-         (prev['macd'] >= prev['macd_signal'] and current['macd'] < current['macd_signal'])),  # Fresh crossover
-        current['macd_histogram'] < prev['macd_histogram'],  # Histogram deteriorating
-        not higher_momentum_bullish,  # Higher TF momentum bearish
-        
-        # Volume Conditions (3 conditions)
-        current['volume_ratio'] > 1.0,  # Above average volume
-        current['obv'] < current['obv_ema'],  # OBV bearish
-        current['volume_trend'],  # Volume trending up (selling pressure)
+        df_higher = as_view(df_higher, ind_higher)
+        ind_higher = df_higher.ind
+        higher_ema = ind_higher.ema(20)
+        higher_macd = ind_higher.macd()
         
-        # Additional Filters (3 conditions)
-        current['rsi'] > 25 and current['rsi'] < 65,  # RSI in reasonable range
-        current['bb_position'] < 0.8,  # Not at top of BB
-        current['close'] < prev['close'],  # Red candle
-    ]
+        higher_trend_bullish = df_higher['close'].iloc[-1] > higher_ema.iloc[-1]
+        higher_momentum_bullish = higher_macd['macd'].iloc[-1] > higher_macd['signal'].iloc[-1]
     
-    # Scoring system - need at least 10/14 conditions
-    buy_score = sum(buy_conditions)
-    sell_score = sum(sell_conditions)
+    higher = {'higher_trend_bullish': higher_trend_bullish, 'higher_momentum_bullish': higher_momentum_bullish}
+    buy_score = BUY_RULES.score(features, **higher)
+    sell_score = SELL_RULES.score(features, **higher)
     
-    buy_signal = buy_score >= 10
-    sell_signal = sell_score >= 10
+    buy_signal = buy_score >= BUY_RULES.threshold
+    sell_signal = sell_score >= SELL_RULES.threshold
     
     # ADVANCED SL/TP Calculation
     if buy_signal or sell_signal:
@@ -154,7 +159,7 @@ def trend_momentum_volume_strategy(df, df_higher=None):
             # Multi-level SL calculation
             sl_atr = entry_price - (final_atr_multiplier * atr_value)
             sl_ema = current['ema_mid'] * 0.998  # Below middle EMA
-            sl_swing = df['low'].rolling(20).min().iloc[-1] * 0.997  # Below swing low
+            sl_swing = ind.rolling_min(20).iloc[-1] * 0.997  # Below swing low
             sl_bb = current['bb_lower'] * 0.995  # Below BB lower
             
             # Use the highest (safest) SL but not too tight
@@ -167,7 +172,7 @@ def trend_momentum_volume_strategy(df, df_higher=None):
             tp1 = entry_price + (3.0 * risk_amount)
             
             # Target 2: Based on resistance levels
-            resistance = df['high'].rolling(30).max().iloc[-1]
+            resistance = ind.rolling_max(30).iloc[-1]
             tp2 = min(resistance * 0.999, entry_price + (4.0 * atr_value))
             
             # Target 3: Based on Bollinger Band projection
@@ -188,7 +193,7 @@ def trend_momentum_volume_strategy(df, df_higher=None):
             # Multi-level SL calculation
             sl_atr = entry_price + (final_atr_multiplier * atr_value)
             sl_ema = current['ema_mid'] * 1.002  # Above middle EMA
-            sl_swing = df['high'].rolling(20).max().iloc[-1] * 1.003  # Above swing high
+            sl_swing = ind.rolling_max(20).iloc[-1] * 1.003  # Above swing high
             sl_bb = current['bb_upper'] * 1.005  # Above BB upper
             
             # Use the lowest (safest) SL but not too tight
@@ -201,7 +206,7 @@ def trend_momentum_volume_strategy(df, df_higher=None):
             tp1 = entry_price - (3.0 * risk_amount)
             
             # Target 2: Based on support levels
-            support = df['low'].rolling(30).min().iloc[-1]
+            support = ind.rolling_min(30).iloc[-1]
             tp2 = max(support * 1.001, entry_price - (4.0 * atr_value))
             
             # Target 3: Based on Bollinger Band projection
@@ -14,6 +14,9 @@ from datetime import datetime, timedelta
 import json
 from typing import Dict, List, Tuple, Optional
 
+from utils import batch_indicators
+from utils.indicator_store import IndicatorFrame
+
 class AdaptiveSystem:
     def __init__(self):
         self.performance_history = []
@@ -26,13 +29,13 @@ class AdaptiveSystem:
             'EXTREME': {'min': 0.10, 'max': float('inf'), 'rr_ratio': 3.0, 'sl_multiplier': 2.0}
         }
         
-    def calculate_volatility(self, df: pd.DataFrame, window: int = 20) -> float:
-        """Tính toán volatility dựa trên ATR"""
+    def calculate_volatility(self, df: pd.DataFrame, window: int = 20,
+                             ind: Optional[IndicatorFrame] = None) -> float:
+        """Tính toán volatility dựa trên ATR (ind: IndicatorFrame dùng chung của chu kỳ)"""
         try:
-            from ta.volatility import AverageTrueRange
-            
-            atr = AverageTrueRange(df['high'], df['low'], df['close'], window=window)
-            current_atr = atr.average_true_range().iloc[-1]
+            if ind is None:
+                ind = IndicatorFrame(df)
+            current_atr = ind.atr(window).iloc[-1]
             current_price = df['close'].iloc[-1]
             
             # Volatility as percentage of price
@@ -42,29 +45,25 @@ class AdaptiveSystem:
             print(f"❌ Lỗi tính volatility: {e}")
             return 0.02  # Default medium volatility
     
-    def detect_market_regime(self, df: pd.DataFrame) -> Dict:
+    def detect_market_regime(self, df: pd.DataFrame, ind: Optional[IndicatorFrame] = None) -> Dict:
         """Phát hiện regime thị trường (Trending/Sideways/Volatile)"""
         try:
-            from ta.trend import SMAIndicator, EMAIndicator
-            from ta.momentum import RSIIndicator
-            from ta.volatility import BollingerBands
+            if ind is None:
+                ind = IndicatorFrame(df)
             
             # Tính các chỉ báo
-            sma_20 = SMAIndicator(df['close'], window=20).sma_indicator()
-            sma_50 = SMAIndicator(df['close'], window=50).sma_indicator()
-            ema_20 = EMAIndicator(df['close'], window=20).ema_indicator()
+            sma_20 = ind.sma(20)
+            sma_50 = ind.sma(50)
             
             # RSI
-            rsi = RSIIndicator(df['close']).rsi()
+            rsi = ind.rsi(14)
             
             # Bollinger Bands
-            bb = BollingerBands(df['close'])
-            bb_upper = bb.bollinger_hband()
-            bb_lower = bb.bollinger_lband()
-            bb_width = (bb_upper - bb_lower) / df['close']
+            bb = ind.bollinger(20, 2)
+            bb_width = (bb['upper'] - bb['lower']) / df['close']
             
             # Volume analysis
-            volume_sma = df['volume'].rolling(20).mean()
+            volume_sma = ind.sma(20, 'volume')
             volume_ratio = df['volume'].iloc[-1] / volume_sma.iloc[-1] if volume_sma.iloc[-1] > 0 else 1
             
             # Price position relative to moving averages
@@ -73,40 +72,81 @@ class AdaptiveSystem:
             price_vs_sma50 = (current_price - sma_50.iloc[-1]) / sma_50.iloc[-1]
             
             # Volatility
-            volatility = self.calculate_volatility(df)
+            volatility = self.calculate_volatility(df, ind=ind)
             
-            # Determine market regime
-            regime = "SIDEWAYS"
-            trend_strength = 0
+            return self._classify_regime(price_vs_sma20, price_vs_sma50, sma_20.iloc[-1], sma_50.iloc[-1],
+                                         volatility, volume_ratio, rsi.iloc[-1], bb_width.iloc[-1])
             
-            # Trending conditions
-            if (price_vs_sma20 > 0.01 and price_vs_sma50 > 0.01 and 
-                sma_20.iloc[-1] > sma_50.iloc[-1]):
-                regime = "BULLISH_TRENDING"
-                trend_strength = min(abs(price_vs_sma20) * 100, 1.0)
-            elif (price_vs_sma20 < -0.01 and price_vs_sma50 < -0.01 and 
-                  sma_20.iloc[-1] < sma_50.iloc[-1]):
-                regime = "BEARISH_TRENDING"
-                trend_strength = min(abs(price_vs_sma20) * 100, 1.0)
-            elif volatility > 0.05:
-                regime = "VOLATILE"
-            elif bb_width.iloc[-1] < 0.02:
-                regime = "CONSOLIDATION"
+        except Exception as e:
+            print(f"❌ Lỗi detect market regime: {e}")
+            return {'regime': 'UNKNOWN', 'volatility': 0.02, 'volume_ratio': 1.0}
+    
+    def _classify_regime(self, price_vs_sma20, price_vs_sma50, sma_20, sma_50,
+                         volatility, volume_ratio, rsi, bb_width) -> Dict:
+        """Xác định regime từ giá trị chỉ báo tại nến cuối"""
+        regime = "SIDEWAYS"
+        trend_strength = 0
+        
+        # Trending conditions
+        if (price_vs_sma20 > 0.01 and price_vs_sma50 > 0.01 and 
+            sma_20 > sma_50):
+            regime = "BULLISH_TRENDING"
+            trend_strength = min(abs(price_vs_sma20) * 100, 1.0)
+        elif (price_vs_sma20 < -0.01 and price_vs_sma50 < -0.01 and 
+              sma_20 < sma_50):
+            regime = "BEARISH_TRENDING"
+            trend_strength = min(abs(price_vs_sma20) * 100, 1.0)
+        elif volatility > 0.05:
+            regime = "VOLATILE"
+        elif bb_width < 0.02:
+            regime = "CONSOLIDATION"
+        
+        return {
+            'regime': regime,
+            'trend_strength': trend_strength,
+            'volatility': volatility,
+            'volume_ratio': volume_ratio,
+            'rsi': rsi,
+            'bb_width': bb_width,
+            'price_vs_sma20': price_vs_sma20,
+            'price_vs_sma50': price_vs_sma50
+        }
+    
+    def detect_market_regimes(self, panel, limit=None) -> Dict[str, Dict]:
+        """
+        Phát hiện regime cho mọi symbol của OHLCVPanel trong một lần tính theo lô
+        Cùng chỉ báo và ngưỡng với detect_market_regime, lấy tại nến có dữ liệu cuối của từng symbol
+        """
+        try:
+            high, low, close, volume = (panel.field(name, limit) for name in ('high', 'low', 'close', 'volume'))
+            valid = ~np.isnan(close)
+            
+            def last(values):
+                return batch_indicators.last_valid(values, valid)
+            
+            current_price = last(close)
+            sma_20 = last(batch_indicators.sma(close, 20))
+            sma_50 = last(batch_indicators.sma(close, 50))
+            rsi = last(batch_indicators.rsi(close, 14))
+            upper, lower, _ = batch_indicators.bollinger(close, 20, 2)
+            volume_sma = last(batch_indicators.sma(volume, 20))
+            atr = last(batch_indicators.atr(high, low, close, 20))
+            
+            with np.errstate(divide='ignore', invalid='ignore'):
+                bb_width = last((upper - lower) / close)
+                volume_ratio = np.where(volume_sma > 0, last(volume) / volume_sma, 1.0)
+                price_vs_sma20 = (current_price - sma_20) / sma_20
+                price_vs_sma50 = (current_price - sma_50) / sma_50
+                volatility = atr / current_price
             
             return {
-                'regime': regime,
-                'trend_strength': trend_strength,
-                'volatility': volatility,
-                'volume_ratio': volume_ratio,
-                'rsi': rsi.iloc[-1],
-                'bb_width': bb_width.iloc[-1],
-                'price_vs_sma20': price_vs_sma20,
-                'price_vs_sma50': price_vs_sma50
+                symbol: self._classify_regime(price_vs_sma20[i], price_vs_sma50[i], sma_20[i], sma_50[i],
+                                              volatility[i], volume_ratio[i], rsi[i], bb_width[i])
+                for i, symbol in enumerate(panel.symbols) if valid[i].any()
             }
-            
         except Exception as e:
-            print(f"❌ Lỗi detect market regime: {e}")
-            return {'regime': 'UNKNOWN', 'volatility': 0.02, 'volume_ratio': 1.0}
+            print(f"❌ Lỗi detect market regime theo lô: {e}")
+            return {}
     
     def get_volatility_regime(self, volatility: float) -> str:
         """Xác định volatility regime"""
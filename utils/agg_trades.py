@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nạp giao dịch gộp (aggTrades) của Binance theo từng khối cột NumPy
+- File đã ghi: CSV/ZIP của data.binance.vision hoặc JSONL do AggTradeStream ghi lại
+- REST: phân trang /api/v3/aggTrades theo fromId qua client có giới hạn weight
+- Realtime: AggTradeStream (WebSocket), phát lại offline bằng KlineReplayServer
+Mỗi khối là dict cột theo AGG_TRADE_COLUMNS, đưa thẳng vào utils.bar_builder
+
+Kiểm tra phân trang REST với client giả (giờ ít giao dịch, trang đầy, cắt end_ms):
+python -m utils.agg_trades
+"""
+
+import argparse
+import json
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from utils.kline_stream import BINANCE_WS_URL, KlineStream
+
+AGG_TRADE_FIELDS = [
+    ('agg_id', np.int64),
+    ('price', np.float64),
+    ('quantity', np.float64),
+    ('first_id', np.int64),
+    ('last_id', np.int64),
+    ('timestamp', np.int64),
+    ('is_buyer_maker', np.bool_),
+]
+AGG_TRADE_DTYPES = dict(AGG_TRADE_FIELDS)
+AGG_TRADE_COLUMNS = [name for name, _ in AGG_TRADE_FIELDS]
+# Khoá tương ứng trong payload REST/WebSocket
+AGG_TRADE_KEYS = {
+    'agg_id': 'a', 'price': 'p', 'quantity': 'q', 'first_id': 'f',
+    'last_id': 'l', 'timestamp': 'T', 'is_buyer_maker': 'm',
+}
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+# /aggTrades chỉ cho phép khoảng startTime-endTime tối đa 1 giờ
+MAX_AGG_TRADES_WINDOW_MS = 3_600_000
+MAX_AGG_TRADES_PER_REQUEST = 1000
+
+
+def agg_trade_stream_name(symbol):
+    return f"{symbol.lower()}@aggTrade"
+
+
+def decode_agg_trades(trades):
+    """Giải mã danh sách aggTrade (dict REST/WebSocket) thành dict cột NumPy"""
+    count = len(trades)
+    return {
+        name: np.fromiter((trade[AGG_TRADE_KEYS[name]] for trade in trades), dtype=dtype, count=count)
+        for name, dtype in AGG_TRADE_FIELDS
+    }
+
+
+def _normalize_timestamps(columns):
+    # File spot từ 2025 ghi thời gian theo micro giây
+    timestamps = columns['timestamp']
+    if len(timestamps) and timestamps[0] > 10 ** 14:
+        columns['timestamp'] = timestamps // 1000
+    return columns
+
+
+def _first_line(path):
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            with archive.open(archive.namelist()[0]) as f:
+                return f.readline().decode('utf-8')
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.readline()
+
+
+def _read_csv_chunks(path, chunk_rows):
+    # File mới có dòng tiêu đề, file cũ thì không
+    has_header = not _first_line(path).split(',')[0].strip().isdigit()
+    reader = pd.read_csv(path, header=0 if has_header else None, names=AGG_TRADE_COLUMNS,
+                         usecols=range(len(AGG_TRADE_COLUMNS)), dtype=AGG_TRADE_DTYPES,
+                         chunksize=chunk_rows)
+    for chunk in reader:
+        yield _normalize_timestamps({name: chunk[name].to_numpy() for name in AGG_TRADE_COLUMNS})
+
+
+def _read_jsonl_chunks(path, chunk_rows):
+    trades = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            message = json.loads(line)
+            data = message.get('data', message)
+            if data.get('e') == 'aggTrade':
+                trades.append(data)
+            if len(trades) >= chunk_rows:
+                yield decode_agg_trades(trades)
+                trades = []
+    if trades:
+        yield decode_agg_trades(trades)
+
+
+def read_agg_trade_file(path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Đọc file aggTrades đã ghi (.csv, .zip, .jsonl) theo từng khối `chunk_rows` giao dịch"""
+    if path.endswith('.jsonl'):
+        return _read_jsonl_chunks(path, chunk_rows)
+    return _read_csv_chunks(path, chunk_rows)
+
+
+def fetch_agg_trades(client, symbol, start_ms, end_ms, chunk_rows=100_000):
+    """
+    Tải aggTrades trong [start_ms, end_ms) qua REST theo từng khối
+    Tìm aggId đầu tiên theo cửa sổ 1 giờ, sau đó phân trang bằng fromId tới end_ms
+    (trang đầu ít hơn `limit` chỉ là giờ ít giao dịch; hết dữ liệu khi trang fromId thiếu hoặc đã qua end_ms)
+    """
+    trades = []
+    batch = []
+    window_start = start_ms
+    while not batch and window_start < end_ms:
+        window_end = min(window_start + MAX_AGG_TRADES_WINDOW_MS, end_ms) - 1
+        batch = client.get_aggregate_trades(symbol=symbol, startTime=window_start, endTime=window_end,
+                                            limit=MAX_AGG_TRADES_PER_REQUEST)
+        window_start = window_end + 1
+
+    paged = False
+    while batch:
+        in_range = [trade for trade in batch if trade['T'] < end_ms]
+        trades += in_range
+        if len(trades) >= chunk_rows:
+            yield decode_agg_trades(trades)
+            trades = []
+        if len(in_range) < len(batch) or (paged and len(batch) < MAX_AGG_TRADES_PER_REQUEST):
+            break
+        batch = client.get_aggregate_trades(symbol=symbol, fromId=batch[-1]['a'] + 1,
+                                            limit=MAX_AGG_TRADES_PER_REQUEST)
+        paged = True
+    if trades:
+        yield decode_agg_trades(trades)
+
+
+class AggTradeStream(KlineStream):
+    def __init__(self, symbols, on_trades, base_url=BINANCE_WS_URL, record_path=None,
+                 batch_size=1000, flush_ms=1000, max_streams_per_connection=200):
+        """
+        Args:
+            symbols: các symbol cần nhận aggTrade
+            on_trades: callback(symbol, columns) nhận từng khối giao dịch (dict cột)
+            batch_size, flush_ms: gom giao dịch tới khi đủ số lượng hoặc đủ khoảng thời gian
+        """
+        super().__init__(symbols, [], base_url=base_url, record_path=record_path,
+                         max_streams_per_connection=max_streams_per_connection)
+        self.symbols = [symbol.upper() for symbol in symbols]
+        self.on_trades = on_trades
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self._pending = {symbol: [] for symbol in self.symbols}
+
+    def _stream_groups(self):
+        names = [agg_trade_stream_name(symbol) for symbol in self.symbols]
+        size = self.max_streams_per_connection
+        return [names[i:i + size] for i in range(0, len(names), size)]
+
+    def handle_message(self, message):
+        """Xử lý một message aggTrade (combined stream hoặc payload trực tiếp)"""
+        if isinstance(message, (str, bytes)):
+            if self._record_file is not None:
+                self._record_file.write(message if isinstance(message, str) else message.decode())
+                self._record_file.write("\n")
+            message = json.loads(message)
+        data = message.get('data', message)
+        if data.get('e') != 'aggTrade':
+            return
+
+        symbol = data['s'].upper()
+        with self._lock:
+            pending = self._pending.get(symbol)
+            if pending is None:
+                return
+            pending.append(data)
+            if len(pending) < self.batch_size and data['T'] - pending[0]['T'] < self.flush_ms:
+                return
+            self._pending[symbol] = []
+        self.on_trades(symbol, decode_agg_trades(pending))
+
+    def flush(self):
+        """Đẩy các giao dịch còn đang gom cho callback"""
+        with self._lock:
+            pending, self._pending = self._pending, {symbol: [] for symbol in self.symbols}
+        for symbol, trades in pending.items():
+            if trades:
+                self.on_trades(symbol, decode_agg_trades(trades))
+
+
+class _StubAggTradeClient:
+    """Client giả trả /aggTrades từ danh sách giao dịch có sẵn (theo quy ước tham số của Binance)"""
+
+    def __init__(self, trades):
+        self.trades = trades
+        self.calls = 0
+
+    def get_aggregate_trades(self, symbol, fromId=None, startTime=None, endTime=None, limit=500):
+        self.calls += 1
+        if fromId is not None:
+            selected = [trade for trade in self.trades if trade['a'] >= fromId]
+        else:
+            selected = [trade for trade in self.trades if startTime <= trade['T'] <= endTime]
+        return selected[:limit]
+
+
+def _stub_trades(timestamps):
+    return [{'a': i, 'p': '100.0', 'q': '1.0', 'f': i, 'l': i, 'T': int(t), 'm': bool(i % 2)}
+            for i, t in enumerate(timestamps)]
+
+
+def validate_fetch():
+    """
+    Chạy fetch_agg_trades trên client giả, trả về {tên trường hợp: (số giao dịch nhận, số mong đợi)}
+    """
+    hour = MAX_AGG_TRADES_WINDOW_MS
+    start = 1_700_000_000_000 // hour * hour
+    cases = {
+        # 144 giao dịch trải đều một ngày (mỗi giờ chỉ 6 giao dịch)
+        'giờ ít giao dịch': (np.arange(144) * 600_000 + start, start, start + 24 * hour),
+        # 5000 giao dịch trong một giờ: nhiều trang đầy
+        'trang đầy': (np.arange(5000) * 700 + start, start, start + hour),
+        # Vài giờ đầu không có giao dịch, phần sau end_ms bị cắt
+        'giờ trống + cắt end_ms': (np.arange(3000) * 5_000 + start + 3 * hour, start, start + 3 * hour + 10_000_000),
+    }
+    results = {}
+    for name, (timestamps, start_ms, end_ms) in cases.items():
+        client = _StubAggTradeClient(_stub_trades(timestamps))
+        chunks = list(fetch_agg_trades(client, 'STUBUSDT', start_ms, end_ms, chunk_rows=1500))
+        got = np.concatenate([chunk['timestamp'] for chunk in chunks]) if chunks else np.empty(0, np.int64)
+        expected = timestamps[(timestamps >= start_ms) & (timestamps < end_ms)]
+        results[name] = (len(got), len(expected), np.array_equal(got, expected))
+    return results
+
+
+def main():
+    argparse.ArgumentParser(description='Kiểm tra phân trang aggTrades REST với client giả').parse_args()
+    ok = True
+    for name, (got, expected, same) in validate_fetch().items():
+        ok &= same
+        print(f"{'✅' if same else '❌'} {name}: {got}/{expected} giao dịch")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
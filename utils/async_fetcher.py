@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tải nến bất đồng bộ cho nhiều (symbol, interval) cùng lúc
+- Một aiohttp session với connection pool keep-alive dùng chung giữa các chu kỳ
+- Event loop riêng chạy nền để code đồng bộ (bot) gọi được
+- Timeout riêng cho từng request
+- Dùng chung WeightRateLimiter với client đồng bộ, thử lại khi gặp 429/418/5xx
+- Dùng chung bộ ngắt mạch theo endpoint và histogram độ trễ với client đồng bộ
+- Request chậm quá p95 của endpoint được gửi thêm một bản dự phòng (hedge), bản về trước thắng
+"""
+
+import asyncio
+import threading
+import time
+
+import aiohttp
+
+from utils.circuit_breaker import CircuitBreakers
+from utils.latency import LatencyRecorder
+from utils.rate_limiter import RATE_LIMIT_STATUSES, WeightRateLimiter, backoff_delay, retry_after_seconds
+
+BINANCE_API_URL = "https://api.binance.com/api/v3"
+MAX_KLINES_PER_REQUEST = 1000
+KLINES_WEIGHT = 2
+
+
+class AsyncKlineFetcher:
+    def __init__(self, base_url=BINANCE_API_URL, max_connections=50, timeout=10, limiter=None,
+                 max_retries=5, breakers=None, latency=None, hedge=True):
+        """
+        Args:
+            base_url: REST endpoint của sàn
+            max_connections: số kết nối tối đa trong pool
+            timeout: timeout (giây) cho mỗi request
+            limiter: WeightRateLimiter dùng chung (mặc định tạo riêng)
+            max_retries: số lần thử lại tối đa cho một request
+            breakers: CircuitBreakers dùng chung (mặc định tạo riêng)
+            latency: LatencyRecorder dùng chung (mặc định tạo riêng)
+            hedge: gửi request dự phòng khi request đầu chậm quá p95
+        """
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.limiter = limiter or WeightRateLimiter()
+        self.max_retries = max_retries
+        self.breakers = breakers or CircuitBreakers()
+        self.latency = latency or LatencyRecorder()
+        self.hedge = hedge
+        self.hedged = 0
+        self._session = None
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # --- Event loop nền ---
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+                self._thread.start()
+        return self._loop
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    def close(self):
+        """Đóng session và dừng event loop nền"""
+        if self._loop is None:
+            return
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = self._thread = self._session = None
+
+    # --- Request ---
+
+    async def _request(self, session, path, params):
+        """Một lần GET: (response, body JSON hoặc None), ghi độ trễ vào histogram (trừ khi bị huỷ do hedge)"""
+        started = time.monotonic()
+        cancelled = False
+        try:
+            async with session.get(f"{self.base_url}/{path}", params=params,
+                                   timeout=self.timeout) as response:
+                body = await response.json() if response.status < 300 else None
+                return response, body
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            if not cancelled:
+                self.latency.observe(path, time.monotonic() - started)
+
+    async def _hedged_request(self, session, path, params, weight):
+        """Như _request; quá p95 mà chưa có phản hồi thì gửi thêm một bản, lấy kết quả về trước"""
+        delay = self.latency.hedge_delay(path) if self.hedge else None
+        first = asyncio.ensure_future(self._request(session, path, params))
+        if delay is None:
+            return await first
+        done, pending = await asyncio.wait({first}, timeout=delay)
+        if not done:
+            await asyncio.sleep(self.limiter.reserve(weight))
+            self.hedged += 1
+            pending.add(asyncio.ensure_future(self._request(session, path, params)))
+        try:
+            while True:
+                for task in done:
+                    if task.exception() is None or not pending:
+                        return task.result()
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _get_json(self, session, path, params, weight):
+        """GET trong giới hạn weight, thử lại với backoff khi bị giới hạn hoặc lỗi tạm thời"""
+        breaker = self.breakers.get(path)
+        attempt = 0
+        while True:
+            breaker.check()
+            await asyncio.sleep(self.limiter.reserve(weight))
+            try:
+                response, body = await self._hedged_request(session, path, params, weight)
+                self.limiter.observe(response.headers)
+                if response.status < 500:
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+                if response.status in RATE_LIMIT_STATUSES:
+                    delay = retry_after_seconds(response.headers)
+                    if delay is None:
+                        delay = backoff_delay(attempt)
+                    self.limiter.pause(delay, response.status)
+                elif response.status >= 500:
+                    delay = backoff_delay(attempt)
+                else:
+                    response.raise_for_status()
+                    return body
+                error = aiohttp.ClientResponseError(response.request_info, response.history,
+                                                    status=response.status)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                breaker.record_failure()
+                delay, error = backoff_delay(attempt), e
+            if attempt >= self.max_retries:
+                raise error
+            attempt += 1
+            if not (isinstance(error, aiohttp.ClientResponseError) and error.status in RATE_LIMIT_STATUSES):
+                await asyncio.sleep(delay)
+
+    async def fetch_klines(self, symbol, interval, limit=500, start_ms=None):
+        """Tải kline thô cho một cặp; có start_ms thì tự phân trang tới hiện tại"""
+        session = await self._get_session()
+        params = {'symbol': symbol, 'interval': interval}
+        if start_ms is None:
+            params['limit'] = min(limit, MAX_KLINES_PER_REQUEST)
+        else:
+            params['startTime'] = start_ms
+            params['limit'] = MAX_KLINES_PER_REQUEST
+
+        klines = []
+        while True:
+            batch = await self._get_json(session, "klines", dict(params), KLINES_WEIGHT)
+            klines += batch
+            if start_ms is None or len(batch) < MAX_KLINES_PER_REQUEST:
+                return klines
+            params['startTime'] = batch[-1][6] + 1
+
+    async def fetch_many(self, requests):
+        """
+        Tải đồng thời nhiều cặp
+        requests: {(symbol, interval): {'limit': ..., 'start_ms': ...}}
+        Trả về {(symbol, interval): klines hoặc None nếu lỗi}
+        """
+        keys = list(requests)
+        results = await asyncio.gather(
+            *(self.fetch_klines(symbol, interval, **requests[(symbol, interval)])
+              for symbol, interval in keys),
+            return_exceptions=True
+        )
+        output = {}
+        for key, result in zip(keys, results):
+            if isinstance(result, Exception):
+                print(f"❌ Lỗi lấy dữ liệu {key[0]} ({key[1]}): {result}")
+                output[key] = None
+            else:
+                output[key] = result
+        return output
+
+    def fetch_all(self, requests):
+        """Phiên bản đồng bộ của fetch_many (chạy trên event loop nền)"""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self.fetch_many(requests), loop).result()
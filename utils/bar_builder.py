@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dựng thanh (bar) theo hoạt động giao dịch từ aggTrades
+- Volume bar: đóng thanh mỗi khi khối lượng cộng dồn vượt thêm một ngưỡng
+- Dollar bar: như volume bar nhưng tính theo giá trị giao dịch (giá x khối lượng)
+- Tick imbalance bar: đóng thanh khi mất cân bằng mua/bán (tick rule) vượt ngưỡng kỳ vọng
+- Xử lý theo từng khối giao dịch bằng NumPy, thanh đang dở được nối sang khối sau
+- Đầu ra cùng định dạng OHLCV với get_klines_df (timestamp = thời điểm giao dịch đầu tiên của thanh)
+"""
+
+import numpy as np
+
+from utils.kline_store import OHLCV_COLUMNS, columns_to_df
+from utils.ohlcv_buffer import OHLCVRingBuffer
+
+
+def _strictly_increasing(timestamps, last=None):
+    """
+    Dời timestamp để tăng ngặt (nhiều thanh có thể mở trong cùng một mili giây khi thị trường sôi động)
+    t'[i] = max(t[i], t'[i-1] + 1), tính vector hoá: i + cummax(t[j] - j)
+    """
+    index = np.arange(len(timestamps))
+    base = timestamps - index
+    if last is not None:
+        base = np.maximum(base, last + 1)
+    return index + np.maximum.accumulate(base)
+
+
+class _BarBuilder:
+    def __init__(self, capacity=1000):
+        """capacity: số thanh giữ lại"""
+        self.bars = OHLCVRingBuffer(capacity)
+        self._partial = None  # (timestamp, open, high, low, close, volume) của thanh đang dở
+        self.trades = 0
+
+    def _close_indices(self, price, quantity):
+        """Vị trí các giao dịch đóng thanh trong khối (lớp con cài đặt)"""
+        raise NotImplementedError
+
+    def update(self, trades):
+        """
+        Nạp một khối giao dịch (dict cột theo AGG_TRADE_COLUMNS, đã sắp theo thời gian)
+        Trả về số thanh mới đóng
+        """
+        price = np.asarray(trades['price'], dtype=np.float64)
+        quantity = np.asarray(trades['quantity'], dtype=np.float64)
+        timestamps = np.asarray(trades['timestamp'], dtype=np.int64)
+        count = len(price)
+        if count == 0:
+            return 0
+        self.trades += count
+
+        closes = np.asarray(self._close_indices(price, quantity), dtype=np.int64)
+        # Mỗi đoạn [start, stop) là một thanh; đoạn cuối (sau giao dịch đóng cuối cùng) còn dở
+        starts = np.concatenate(([0], closes + 1))
+        starts = starts[starts < count]
+        columns = {
+            'timestamp': timestamps[starts],
+            'open': price[starts],
+            'high': np.maximum.reduceat(price, starts),
+            'low': np.minimum.reduceat(price, starts),
+            'close': price[np.append(starts[1:], count) - 1],
+            'volume': np.add.reduceat(quantity, starts),
+        }
+        if self._partial is not None:
+            # Đoạn đầu là phần tiếp theo của thanh đang dở từ khối trước
+            first = self._merge(self._partial, [columns[name][0] for name in OHLCV_COLUMNS])
+            for name, value in zip(OHLCV_COLUMNS, first):
+                columns[name][0] = value
+        columns['timestamp'] = _strictly_increasing(columns['timestamp'], self.bars.last_timestamp)
+
+        closed = len(closes)
+        if closed:
+            self.bars.extend({name: values[:closed] for name, values in columns.items()})
+        self._partial = None
+        if len(starts) > closed:
+            self._partial = tuple(columns[name][-1] for name in OHLCV_COLUMNS)
+        return closed
+
+    @staticmethod
+    def _merge(partial, row):
+        return (partial[0], partial[1], max(partial[2], row[2]), min(partial[3], row[3]), row[4],
+                partial[5] + row[5])
+
+    def to_df(self, limit=None):
+        """Các thanh đã đóng + thanh đang dở ở cuối (giống nến đang chạy của dữ liệu REST)"""
+        if self._partial is None:
+            return self.closed_df(limit)
+        closed = self.bars.columns(None if limit is None else max(limit - 1, 0))
+        columns = {name: np.append(closed[name], self._partial[i]) for i, name in enumerate(OHLCV_COLUMNS)}
+        return columns_to_df(columns)
+
+    def closed_df(self, limit=None):
+        """Chỉ các thanh đã đóng"""
+        return self.bars.to_df(limit)
+
+
+class VolumeBarBuilder(_BarBuilder):
+    def __init__(self, threshold, capacity=1000):
+        """
+        Args:
+            threshold: khối lượng mỗi thanh
+        Ngưỡng tính trên khối lượng cộng dồn liên tục (phần vượt ngưỡng được tính cho thanh sau),
+        nhờ vậy cả khối giao dịch được chia thanh bằng một lần cumsum
+        """
+        super().__init__(capacity)
+        self.threshold = float(threshold)
+        self._carry = 0.0  # Phần khối lượng cộng dồn chưa đủ một ngưỡng
+
+    def _activity(self, price, quantity):
+        return quantity
+
+    def _close_indices(self, price, quantity):
+        cumulative = self._carry + np.cumsum(self._activity(price, quantity))
+        filled = np.floor(cumulative / self.threshold)
+        previous = np.concatenate(([0.0], filled[:-1]))
+        self._carry = cumulative[-1] - filled[-1] * self.threshold
+        return np.flatnonzero(filled > previous)
+
+
+class DollarBarBuilder(VolumeBarBuilder):
+    """Volume bar theo giá trị giao dịch (quote, vd: USDT)"""
+
+    def _activity(self, price, quantity):
+        return price * quantity
+
+
+class TickImbalanceBarBuilder(_BarBuilder):
+    def __init__(self, expected_ticks=1000, ewma_bars=20, expected_imbalance=None, capacity=1000):
+        """
+        Args:
+            expected_ticks: số giao dịch kỳ vọng mỗi thanh lúc khởi đầu
+            ewma_bars: độ dài EWMA (tính theo thanh) cho số giao dịch và mất cân bằng kỳ vọng
+            expected_imbalance: |2P(mua) - 1| lúc khởi đầu (mặc định ước lượng từ `expected_ticks`
+                giao dịch đầu tiên, không phụ thuộc cách chia khối; các giao dịch này thuộc thanh đầu tiên)
+        Ngưỡng = E[T] x |E[b]|, E[T] được giới hạn trong [expected_ticks / 10, expected_ticks x 10]
+        """
+        super().__init__(capacity)
+        self.alpha = 2.0 / (ewma_bars + 1)
+        self.min_ticks = max(expected_ticks / 10.0, 1.0)
+        self.max_ticks = expected_ticks * 10.0
+        self.expected_ticks = float(expected_ticks)
+        self.expected_imbalance = expected_imbalance
+        self._warmup = max(int(expected_ticks), 1)
+        self._warmup_sum = 0  # Tổng dấu tick của các giao dịch khởi đầu đã nhận
+        self._warmup_seen = 0
+        self._last_price = None
+        self._last_sign = 1
+        self._theta = 0   # Mất cân bằng cộng dồn của thanh đang dở
+        self._ticks = 0   # Số giao dịch của thanh đang dở
+
+    @property
+    def threshold(self):
+        return max(self.expected_ticks * abs(self.expected_imbalance or 0.0), 1.0)
+
+    def _tick_signs(self, price):
+        """Tick rule: +1 giá tăng, -1 giá giảm, giữ dấu trước đó khi giá không đổi"""
+        previous = price[0] if self._last_price is None else self._last_price
+        signs = np.sign(np.diff(price, prepend=previous)).astype(np.int64)
+        last_nonzero = np.maximum.accumulate(np.where(signs != 0, np.arange(len(signs)), -1))
+        signs = np.where(last_nonzero >= 0, signs[np.maximum(last_nonzero, 0)], self._last_sign)
+        self._last_price = price[-1]
+        self._last_sign = int(signs[-1])
+        return signs
+
+    def _close_indices(self, price, quantity):
+        signs = self._tick_signs(price)
+        count = len(signs)
+        pos = 0
+        if self.expected_imbalance is None:
+            # Gom đủ `_warmup` giao dịch (qua nhiều khối) rồi mới ước lượng mất cân bằng kỳ vọng
+            warmup = signs[:self._warmup - self._warmup_seen]
+            self._warmup_sum += int(warmup.sum())
+            self._warmup_seen += len(warmup)
+            if self._warmup_seen < self._warmup:
+                self._ticks += count
+                self._theta += int(warmup.sum())
+                return []
+            self.expected_imbalance = abs(self._warmup_sum / self._warmup) or 1.0 / self.expected_ticks
+            # Giao dịch khởi đầu thuộc thanh đang dở, chỉ xét đóng thanh từ giao dịch kế tiếp
+            pos = len(warmup)
+            self._ticks += pos
+        theta = self._theta + np.cumsum(signs)
+
+        closes = []
+        base = 0
+        while pos < count:
+            threshold = self.threshold
+            # Tìm giao dịch đầu tiên vượt ngưỡng trong cửa sổ cỡ vài thanh kỳ vọng, mở rộng nếu chưa thấy
+            width = max(64, int(4 * self.expected_ticks))
+            found = -1
+            stop = pos
+            while stop < count:
+                start, stop = stop, min(count, stop + width)
+                hits = np.flatnonzero(np.abs(theta[start:stop] - base) >= threshold)
+                if len(hits):
+                    found = start + int(hits[0])
+                    break
+                width *= 2
+            if found < 0:
+                break
+
+            ticks = self._ticks + found - pos + 1
+            imbalance = (theta[found] - base) / ticks
+            self.expected_ticks = min(max((1 - self.alpha) * self.expected_ticks + self.alpha * ticks,
+                                          self.min_ticks), self.max_ticks)
+            self.expected_imbalance = (1 - self.alpha) * abs(self.expected_imbalance) + self.alpha * abs(imbalance)
+            closes.append(found)
+            base = theta[found]
+            pos = found + 1
+            self._ticks = 0
+
+        self._ticks += count - pos
+        self._theta = int(theta[-1] - base)
+        return closes
+
+
+def build_bars(builder, chunks):
+    """Nạp lần lượt các khối giao dịch vào builder, trả về builder"""
+    for chunk in chunks:
+        builder.update(chunk)
+    return builder
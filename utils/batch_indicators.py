@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chỉ báo tính theo lô trên ma trận symbol x thời gian (vd: OHLCVPanel.field('close'))
+- Mỗi hàm nhận mảng (S, T) và tính cho cả S symbol trong vài lệnh NumPy/pandas,
+  thay cho một pipeline `ta` trên từng Series
+- Cùng công thức với `ta` (như IndicatorFrame): hàng có lịch sử liên tục (NaN chỉ ở đầu/cuối,
+  vd: symbol niêm yết muộn) cho kết quả như chạy `ta` trên phần có dữ liệu của hàng đó
+- NaN là nến thiếu: chỉ báo đệ quy (EMA, RSI, ATR, MACD, OBV, VWAP tích luỹ) bỏ qua nến thiếu
+  và giữ trạng thái; chỉ báo theo cửa sổ trả NaN khi cửa sổ chứa nến thiếu
+- Kết quả tại nến thiếu luôn là NaN
+- So khớp với ta: python -m utils.batch_indicators
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _matrix(values):
+    """Mảng float (S, T); mảng 1 chiều được coi là một symbol"""
+    return np.atleast_2d(np.asarray(values, dtype=np.float64))
+
+
+def _ewm(values, alpha, min_periods):
+    """
+    EWM adjust=False theo trục thời gian, bỏ qua NaN (ignore_na) và giữ NaN ở nến thiếu
+    min_periods tính theo số nến có dữ liệu (như pandas)
+    """
+    smoothed = pd.DataFrame(values.T).ewm(alpha=alpha, adjust=False, ignore_na=True,
+                                          min_periods=min_periods).mean().to_numpy(copy=True).T
+    smoothed[np.isnan(values)] = np.nan
+    return smoothed
+
+
+def _previous(values):
+    """Giá trị có dữ liệu gần nhất trước mỗi nến (NaN nếu chưa có)"""
+    valid = ~np.isnan(values)
+    rows = np.where(valid, np.arange(values.shape[1]), -1)
+    np.maximum.accumulate(rows, axis=1, out=rows)
+    previous = np.full(values.shape, np.nan)
+    previous[:, 1:] = np.where(rows[:, :-1] >= 0,
+                               np.take_along_axis(values, np.maximum(rows[:, :-1], 0), axis=1), np.nan)
+    return previous
+
+
+def _rolling(values, period, reduce):
+    """Áp `reduce` lên cửa sổ `period` nến (trục cuối), NaN khi chưa đủ nến hoặc cửa sổ có nến thiếu"""
+    out = np.full(values.shape, np.nan)
+    if values.shape[1] >= period:
+        out[:, period - 1:] = reduce(sliding_window_view(values, period, axis=1))
+    return out
+
+
+def last_valid(values, valid=None):
+    """
+    Giá trị tại nến có dữ liệu cuối cùng của mỗi hàng (NaN nếu hàng rỗng)
+    valid: mask (S, T) xác định nến có dữ liệu, mặc định là ~isnan(values)
+    """
+    values = _matrix(values)
+    valid = ~np.isnan(values) if valid is None else np.atleast_2d(valid)
+    columns = values.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    return np.where(valid.any(axis=1), values[np.arange(len(values)), columns], np.nan)
+
+
+def ema(close, period):
+    """Giống ta.trend.EMAIndicator"""
+    return _ewm(_matrix(close), 2.0 / (period + 1), period)
+
+
+def sma(close, period):
+    """Giống rolling(period).mean()"""
+    return _rolling(_matrix(close), period, lambda window: window.mean(axis=-1))
+
+
+def rolling_std(close, period, ddof=1):
+    """Giống rolling(period).std(ddof)"""
+    return _rolling(_matrix(close), period, lambda window: window.std(axis=-1, ddof=ddof))
+
+
+def rolling_max(values, period):
+    return _rolling(_matrix(values), period, lambda window: window.max(axis=-1))
+
+
+def rolling_min(values, period):
+    return _rolling(_matrix(values), period, lambda window: window.min(axis=-1))
+
+
+def rsi(close, period=14):
+    """Giống ta.momentum.RSIIndicator (nến đầu tính là không tăng không giảm)"""
+    close = _matrix(close)
+    diff = close - _previous(close)
+    missing = np.isnan(close)
+    up = np.where(missing, np.nan, np.where(diff > 0, diff, 0.0))
+    down = np.where(missing, np.nan, np.where(diff < 0, -diff, 0.0))
+    ema_up = _ewm(up, 1.0 / period, period)
+    ema_down = _ewm(down, 1.0 / period, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(ema_down == 0, 100.0, 100 - 100 / (1 + ema_up / ema_down))
+
+
+def atr(high, low, close, period=14):
+    """
+    Giống ta.volatility.AverageTrueRange: 0 trong period - 1 nến đầu,
+    nến thứ period lấy trung bình true range, sau đó làm mượt Wilder
+    """
+    high, low, close = _matrix(high), _matrix(low), _matrix(close)
+    prev_close = _previous(close)
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    valid = ~np.isnan(close)
+    true_range[~valid] = np.nan
+    count = np.cumsum(valid, axis=1)
+
+    # Nến thứ period của mỗi hàng mang giá trị khởi tạo, các nến trước đó không tham gia làm mượt
+    seed = valid & (count == period)
+    smoothed = np.where(count < period, np.nan, true_range)
+    smoothed[seed] = np.cumsum(np.nan_to_num(true_range), axis=1)[seed] / period
+    out = pd.DataFrame(smoothed.T).ewm(alpha=1.0 / period, adjust=False,
+                                       ignore_na=True).mean().to_numpy(copy=True).T
+    out[valid & (count < period)] = 0.0
+    out[~valid] = np.nan
+    return out
+
+
+def bollinger(close, period=20, dev=2):
+    """Giống ta.volatility.BollingerBands (std ddof=0); trả về (upper, lower, mavg)"""
+    close = _matrix(close)
+    mavg = sma(close, period)
+    std = rolling_std(close, period, ddof=0)
+    return mavg + dev * std, mavg - dev * std, mavg
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """Giống ta.trend.MACD(close, slow, fast, signal); trả về (macd, signal, diff)"""
+    close = _matrix(close)
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = _ewm(line, 2.0 / (signal + 1), signal)
+    signal_line[np.isnan(close)] = np.nan
+    return line, signal_line, line - signal_line
+
+
+def obv(close, volume):
+    """Giống ta.volume.OnBalanceVolumeIndicator (nến đầu cộng volume)"""
+    close, volume = _matrix(close), _matrix(volume)
+    signed = np.where(close < _previous(close), -volume, volume)
+    out = np.cumsum(np.nan_to_num(signed), axis=1)
+    out[np.isnan(close)] = np.nan
+    return out
+
+
+def stochastic(high, low, close, window=14, smooth=3):
+    """Giống ta.momentum.StochasticOscillator; trả về (%K, %D)"""
+    high, low, close = _matrix(high), _matrix(low), _matrix(close)
+    lowest = rolling_min(low, window)
+    highest = rolling_max(high, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = 100 * (close - lowest) / (highest - lowest)
+    return k, sma(k, smooth)
+
+
+def vwap(high, low, close, volume, window=None):
+    """
+    VWAP theo giá điển hình (high + low + close) / 3
+    window=None: tích luỹ từ nến đầu của mỗi hàng (như chiến lược EMA + VWAP + RSI)
+    window=n: cửa sổ n nến, giống ta.volume.VolumeWeightedAveragePrice
+    """
+    high, low, close, volume = _matrix(high), _matrix(low), _matrix(close), _matrix(volume)
+    typical = (high + low + close) / 3
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if window is None:
+            out = (np.cumsum(np.nan_to_num(typical * volume), axis=1)
+                   / np.cumsum(np.nan_to_num(volume), axis=1))
+            out[np.isnan(typical)] = np.nan
+            return out
+        total_pv = _rolling(typical * volume, window, lambda w: w.sum(axis=-1))
+        return total_pv / _rolling(volume, window, lambda w: w.sum(axis=-1))
+
+
+def validate_against_ta(frames):
+    """
+    Tính các chỉ báo theo lô trên các DataFrame (độ dài khác nhau, căn theo nến cuối)
+    rồi so từng hàng với `ta`/IndicatorFrame trên DataFrame gốc
+    Trả về {tên: sai số tương đối lớn nhất}
+    """
+    import ta
+
+    from utils.indicator_store import IndicatorFrame
+
+    length = max(len(df) for df in frames)
+    fields = {}
+    for name in ('high', 'low', 'close', 'volume'):
+        fields[name] = np.full((len(frames), length), np.nan)
+        for row, df in enumerate(frames):
+            fields[name][row, length - len(df):] = df[name].to_numpy()
+    high, low, close, volume = (fields[name] for name in ('high', 'low', 'close', 'volume'))
+
+    cases = {
+        'ema_21': (ema(close, 21), lambda ind, df: ind.ema(21)),
+        'sma_50': (sma(close, 50), lambda ind, df: ind.sma(50)),
+        'close_std_20': (rolling_std(close, 20), lambda ind, df: ind.rolling_std(20)),
+        'high_max_20': (rolling_max(high, 20), lambda ind, df: ind.rolling_max(20)),
+        'low_min_20': (rolling_min(low, 20), lambda ind, df: ind.rolling_min(20)),
+        'rsi_14': (rsi(close, 14), lambda ind, df: ind.rsi(14)),
+        'atr_14': (atr(high, low, close, 14), lambda ind, df: ind.atr(14)),
+        'bollinger': (bollinger(close, 20, 2), lambda ind, df: ind.bollinger(20, 2)[['upper', 'lower', 'mavg']]),
+        'macd': (macd(close), lambda ind, df: ind.macd()[['macd', 'signal', 'diff']]),
+        'obv': (obv(close, volume), lambda ind, df: ind.obv()),
+        'stoch': (stochastic(high, low, close, 14, 3)[0], lambda ind, df: ind.stoch(14, 3)),
+        'vwap': (vwap(high, low, close, volume),
+                 lambda ind, df: ((df['high'] + df['low'] + df['close']) / 3 * df['volume']).cumsum()
+                 / df['volume'].cumsum()),
+        'vwap_14': (vwap(high, low, close, volume, 14),
+                    lambda ind, df: ta.volume.VolumeWeightedAveragePrice(
+                        df['high'], df['low'], df['close'], df['volume'], 14).volume_weighted_average_price()),
+    }
+    errors = {}
+    for name, (got, expected) in cases.items():
+        got = np.stack(got, axis=-1) if isinstance(got, tuple) else got[:, :, None]
+        worst = 0.0
+        for row, df in enumerate(frames):
+            want = expected(IndicatorFrame(df), df).to_numpy().reshape(len(df), -1)
+            have = got[row, length - len(df):]
+            if not np.isnan(got[row, :length - len(df)]).all() or (np.isnan(want) != np.isnan(have)).any():
+                worst = np.inf
+                continue
+            both = ~np.isnan(want)
+            if both.any():
+                worst = max(worst, float((np.abs(have[both] - want[both]) / np.maximum(1.0, np.abs(want[both]))).max()))
+        errors[name] = worst
+    return errors
+
+
+def main():
+    from utils.streaming_indicators import random_ohlcv
+
+    parser = argparse.ArgumentParser(description='So chỉ báo theo lô với thư viện ta')
+    parser.add_argument('--symbols', type=int, default=50)
+    parser.add_argument('--bars', type=int, default=1000)
+    parser.add_argument('--price', type=float, default=60000.0, help='giá khởi điểm của chuỗi ngẫu nhiên')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    # Độ dài lịch sử khác nhau để kiểm tra phần NaN đầu hàng
+    frames = [random_ohlcv(int(rng.integers(args.bars // 2, args.bars + 1)), args.price * rng.uniform(0.01, 1), rng)
+              for _ in range(args.symbols)]
+    ok = True
+    for name, error in validate_against_ta(frames).items():
+        passed = error < 1e-9
+        ok &= passed
+        print(f"{'✅' if passed else '❌'} {name}: sai số tương đối lớn nhất {error:.2e}")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ngắt mạch (circuit breaker) theo từng endpoint của sàn
+- Lỗi tạm thời liên tiếp (mất kết nối, timeout, 5xx) vượt ngưỡng: ngắt mạch, từ chối ngay mọi request
+- Hết reset_timeout: cho đúng một request thử (half-open), thành công thì đóng mạch lại
+- Tránh dồn request vào endpoint đang lỗi và để chu kỳ phân tích không bị treo theo
+"""
+
+import threading
+import time
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Endpoint đang bị ngắt mạch, request không được gửi"""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"endpoint {name} đang ngắt mạch, thử lại sau {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        """
+        Args:
+            name: tên endpoint
+            failure_threshold: số lỗi tạm thời liên tiếp để ngắt mạch
+            reset_timeout: thời gian (giây) ngắt mạch trước khi cho request thử
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def retry_in(self):
+        """Số giây còn lại tới khi được gửi request thử (0 nếu mạch đang đóng)"""
+        with self._lock:
+            if self.state == CLOSED:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self):
+        """Có được gửi request lúc này không"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == CLOSED or (self.state == HALF_OPEN and not self._probing):
+                self._probing = self.state == HALF_OPEN
+                return True
+            self.rejected += 1
+            return False
+
+    def check(self):
+        """Như allow() nhưng raise CircuitOpenError khi bị từ chối"""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+
+    def record_success(self):
+        """Endpoint phản hồi (kể cả lỗi 4xx/429): đóng mạch"""
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """Lỗi tạm thời: ngắt mạch khi đủ ngưỡng hoặc request thử thất bại"""
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.trips += 1
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self):
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures, 'trips': self.trips,
+                    'rejected': self.rejected}
+
+
+class CircuitBreakers:
+    """Bộ ngắt mạch theo tên endpoint, tạo khi dùng lần đầu"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name, self.failure_threshold, self.reset_timeout)
+                self._breakers[name] = breaker
+            return breaker
+
+    def open_circuits(self):
+        """Tên các endpoint đang ngắt mạch"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return [breaker.name for breaker in breakers if breaker.state != CLOSED]
+
+    def stats(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.stats() for breaker in breakers}
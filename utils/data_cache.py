@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache dữ liệu nến theo thời điểm đóng nến
+- Khoá: (symbol, interval, loại, open time của nến đã đóng gần nhất)
+- Mục còn dùng được tới lần đóng nến kế tiếp, sau đó coi như hết hạn
+- Giới hạn bộ nhớ theo byte, đẩy ra mục ít dùng nhất (LRU)
+- Đếm hit/miss/eviction để biết cache tiết kiệm được bao nhiêu lần tải
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from utils.intervals import last_closed_open_time, now_ms
+
+DEFAULT_CACHE_MAX_MB = int(os.getenv("KLINE_CACHE_MAX_MB", "64"))
+
+
+def _sizeof(value):
+    """Số byte dữ liệu của một mục cache"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    return int(getattr(value, 'nbytes', 0))
+
+
+class CandleCache:
+    def __init__(self, max_bytes=DEFAULT_CACHE_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # (symbol, interval, kind, closed) -> (value, nbytes)
+        self._latest = {}               # (symbol, interval, kind) -> closed đang lưu
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def _key(self, symbol, interval, kind, now):
+        closed = last_closed_open_time(interval, now_ms() if now is None else now)
+        return (symbol.upper(), interval, kind, closed)
+
+    def _remove(self, key):
+        _, nbytes = self._entries.pop(key)
+        self._bytes -= nbytes
+        self._latest.pop(key[:3], None)
+
+    def get(self, symbol, interval, kind='window', now=None):
+        """Giá trị đã cache nếu chưa có nến mới đóng, ngược lại None"""
+        key = self._key(symbol, interval, kind, now)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                if key[:3] in self._latest:
+                    self.expired += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, symbol, interval, kind='window'):
+        """Giá trị mới nhất kể cả đã hết hạn (để tái sử dụng vùng nhớ), không tính thống kê"""
+        with self._lock:
+            closed = self._latest.get((symbol.upper(), interval, kind))
+            if closed is None:
+                return None
+            return self._entries[(symbol.upper(), interval, kind, closed)][0]
+
+    def put(self, symbol, interval, value, kind='window', now=None):
+        """Lưu giá trị cho nến đã đóng hiện tại, thay thế bản cũ của cùng cặp"""
+        key = self._key(symbol, interval, kind, now)
+        nbytes = _sizeof(value)
+        with self._lock:
+            old_closed = self._latest.get(key[:3])
+            if old_closed is not None:
+                self._remove(key[:3] + (old_closed,))
+            self._entries[key] = (value, nbytes)
+            self._latest[key[:3]] = key[3]
+            self._bytes += nbytes
+
+            # Đẩy ra các mục ít dùng nhất khi vượt giới hạn (luôn giữ mục vừa ghi)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._latest.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Thống kê cho dashboard/log"""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / requests if requests else 0.0,
+            }
@@ -2,35 +2,332 @@
 # -*- coding: utf-8 -*-
 """
 Data fetcher utility for Binance API
+- Nến đã đóng được lưu vào KlineStore, mỗi lần gọi chỉ tải phần còn thiếu
+- DataFrame trả về chỉ gồm timestamp (int64 ms) và OHLCV (float64)
+- Cửa sổ nến được cache tới lần đóng nến kế tiếp (CandleCache dùng chung)
+- Nến bị thiếu giữa dữ liệu đã lưu được phát hiện và tải bù đúng khoảng thiếu
+- Mọi request có timeout; request /klines chậm quá p95 được gửi thêm bản dự phòng
+- Tải lỗi: trả ngay cửa sổ cũ (attrs['stale'], attrs['age_ms']) và làm mới nền,
+  endpoint lỗi liên tục bị ngắt mạch thay vì bị gọi dồn
+- Ring buffer trong cache không bị ghi đè: mỗi lần tải dựng buffer mới rồi thay vào cache,
+  nên thread làm mới nền và chu kỳ phân tích không đọc phải buffer đang ghi dở
 """
 
+import threading
+
 from binance import Client
+import numpy as np
 import pandas as pd
 
-client = Client()
+from utils.agg_trades import fetch_agg_trades, read_agg_trade_file
+from utils.async_fetcher import AsyncKlineFetcher
+from utils.circuit_breaker import CircuitBreakers
+from utils.data_cache import CandleCache
+from utils.gap_detector import backfill_gaps, find_gaps
+from utils.intervals import candle_open_time, interval_to_ms, now_ms
+from utils.kline_store import OHLCV_COLUMNS, KlineStore, columns_to_df, decode_klines
+from utils.latency import LatencyRecorder
+from utils.ohlcv_buffer import OHLCVRingBuffer
+from utils.range_downloader import RangeDownloader
+from utils.rate_limiter import RateLimitedClient, WeightRateLimiter
+from utils.refresher import BackgroundRefresher
+
+# Số lần thử lại trong chu kỳ phân tích (phần còn lại do refresher chạy nền)
+FOREGROUND_RETRIES = 1
+
+# Timeout (giây) của mọi request REST tới sàn: (kết nối, đọc)
+REQUEST_TIMEOUT = (3.05, 10)
+
+# Mọi request tới sàn (bot, tải lịch sử, backtest) dùng chung một ngân sách weight
+rate_limiter = WeightRateLimiter()
+breakers = CircuitBreakers()
+latency = LatencyRecorder()
+client = RateLimitedClient(Client(requests_params={'timeout': REQUEST_TIMEOUT}), rate_limiter,
+                           breakers=breakers, latency=latency, timeout=sum(REQUEST_TIMEOUT))
+store = KlineStore()
+downloader = RangeDownloader(client)
+async_fetcher = AsyncKlineFetcher(timeout=sum(REQUEST_TIMEOUT), limiter=rate_limiter,
+                                  max_retries=FOREGROUND_RETRIES, breakers=breakers, latency=latency)
+cache = CandleCache()
+refresher = BackgroundRefresher()
+
+# Số nến tối đa mỗi request /klines
+MAX_KLINES_PER_REQUEST = 1000
+
+# Lỗ hổng đã thử vá nhưng sàn không có dữ liệu (sàn bảo trì): không tải lại trong tiến trình này
+_unfillable = set()
+
+# Thời điểm mở nến sớm nhất sàn có của từng cặp (trước đó symbol chưa niêm yết): không hỏi lại khoảng đầu trống
+_listed_from = {}
+
+# Thời điểm (ms) tải thành công gần nhất của từng cặp (tính tuổi dữ liệu cũ)
+_fetched_at = {}
+
+# Tuần tự hoá việc thay buffer trong cache (chu kỳ phân tích và refresher nền)
+_publish_lock = threading.Lock()
+
+
+def _fetch_since(symbol, interval, start_ms, max_retries=None):
+    """Tải tất cả nến từ start_ms đến hiện tại (gồm cả nến đang chạy)"""
+    klines = []
+    while True:
+        batch = client.call('get_klines', symbol=symbol, interval=interval, startTime=start_ms,
+                            limit=MAX_KLINES_PER_REQUEST, max_retries=max_retries)
+        klines += batch
+        if len(batch) < MAX_KLINES_PER_REQUEST:
+            return klines
+        start_ms = batch[-1][0] + interval_to_ms(interval)
+
+
+def _sync_start(symbol, interval, limit):
+    """Mốc startTime cần tải để kho đủ `limit` nến gần nhất"""
+    step = interval_to_ms(interval)
+    last_close = store.last_close_time(symbol, interval)
+    window_start = now_ms() - limit * step
+    if last_close is None or last_close < window_start:
+        # Chưa có dữ liệu hoặc dữ liệu đã quá cũ: chỉ tải đúng cửa sổ cần dùng
+        return window_start
+    return last_close + 1
+
+
+def sync_klines(symbol, interval, limit=100, max_retries=None):
+    """
+    Đồng bộ kho với sàn: chỉ tải các nến sau close_time cuối cùng đã lưu
+    Trả về lô kline thô vừa tải (nến cuối có thể chưa đóng)
+    """
+    klines = _fetch_since(symbol, interval, _sync_start(symbol, interval, limit), max_retries)
+    store.append(symbol, interval, klines)
+    return klines
+
+
+def _store_gaps(symbol, interval, start_ms=None, end_ms=None):
+    timestamps = store.mmap_columns(symbol, interval, start=start_ms, end=end_ms,
+                                    columns=['timestamp'])['timestamp']
+    return [tuple(gap) for gap in find_gaps(timestamps, interval).tolist()]
+
+
+def fill_gaps(symbol, interval, start_ms=None, end_ms=None):
+    """
+    Vá các nến bị thiếu giữa dữ liệu đã lưu trong khoảng [start_ms, end_ms) bằng các request nhỏ
+    Trả về số nến được thêm
+    """
+    gaps = [gap for gap in _store_gaps(symbol, interval, start_ms, end_ms)
+            if (symbol, interval) + gap not in _unfillable]
+    if not gaps:
+        return 0
+    added = backfill_gaps(store, downloader, symbol, interval, gaps)
+
+    # Phần còn thiếu sau khi vá là do sàn không có dữ liệu
+    remaining = [gap for gap in _store_gaps(symbol, interval, start_ms, end_ms)
+                 if (symbol, interval) + gap not in _unfillable]
+    if remaining:
+        _unfillable.update((symbol, interval) + gap for gap in remaining)
+        print(f"⚠️ {symbol} ({interval}): {len(remaining)} khoảng nến sàn không có dữ liệu")
+    return added
+
+
+def _window_df(symbol, interval, limit, klines):
+    """Ghép `limit` nến đã đóng từ kho với nến đang chạy vừa tải"""
+    fill_gaps(symbol, interval, now_ms() - limit * interval_to_ms(interval))
+    df = store.read(symbol, interval, limit=limit, columns=OHLCV_COLUMNS)
+
+    # Giữ nến đang chạy như trước đây (chưa được ghi vào kho)
+    if klines:
+        latest = columns_to_df(decode_klines(klines[-1:], OHLCV_COLUMNS))
+        if df.empty or latest['timestamp'].iloc[0] > df['timestamp'].iloc[-1]:
+            df = pd.concat([df, latest], ignore_index=True).tail(limit).reset_index(drop=True)
+    return df
+
+
+def _cache_window(symbol, interval, limit, df):
+    """
+    Ghép cửa sổ vừa tải vào bản sao ring buffer của cặp rồi thay vào cache
+    Buffer đã nằm trong cache không bị ghi nữa: người đang đọc nó (thread khác) luôn thấy trạng thái trọn vẹn
+    """
+    with _publish_lock:
+        buffer = cache.peek(symbol, interval)
+        if (buffer is None or buffer.capacity < limit
+                or (buffer.last_timestamp is not None and df['timestamp'].iloc[0] > buffer.last_timestamp)):
+            # Chưa có, quá nhỏ, hoặc cửa sổ mới không nối tiếp dữ liệu cũ (tránh lỗ hổng giữa các nến)
+            buffer = OHLCVRingBuffer(capacity=limit)
+        else:
+            buffer = buffer.copy()
+        buffer.extend(df)
+        cache.put(symbol, interval, buffer)
+    return buffer
+
+
+def _cached_window(symbol, interval, limit):
+    """DataFrame từ cache nếu chưa có nến mới đóng và cửa sổ đủ dài"""
+    buffer = cache.get(symbol, interval)
+    if buffer is None or buffer.capacity < limit:
+        return None
+    return buffer.to_df(limit)
+
+
+def _refresh_window(symbol, interval, limit, max_retries=None):
+    """Tải lại cửa sổ `limit` nến từ sàn và ghi vào cache"""
+    klines = sync_klines(symbol, interval, limit, max_retries)
+    df = _window_df(symbol, interval, limit, klines)
+    _fetched_at[(symbol, interval)] = now_ms()
+    return _cache_window(symbol, interval, limit, df)
+
+
+def _stale_window(symbol, interval, limit, error):
+    """
+    Tải thất bại: giao việc tải lại cho refresher và trả ngay cửa sổ cũ còn trong cache
+    DataFrame có attrs['stale'] = True và attrs['age_ms'] (thời gian từ lần tải thành công), None nếu chưa từng tải được
+    """
+    refresher.submit((symbol, interval), lambda: _refresh_window(symbol, interval, limit))
+    buffer = cache.peek(symbol, interval)
+    if buffer is None or len(buffer) == 0:
+        print(f"❌ Lỗi lấy dữ liệu {symbol}: {error}")
+        return None
+    df = buffer.to_df(limit)
+    df.attrs['stale'] = True
+    df.attrs['age_ms'] = now_ms() - _fetched_at.get((symbol, interval), buffer.last_timestamp)
+    print(f"⚠️ {symbol} ({interval}): dùng dữ liệu cũ {df.attrs['age_ms'] / 1000:.0f}s, đang tải lại nền ({error})")
+    return df
+
 
 def get_klines_df(symbol, interval, limit=100):
-    """Lấy dữ liệu OHLCV từ Binance API"""
+    """
+    Lấy dữ liệu OHLCV (nến đã đóng từ kho + nến đang chạy từ sàn)
+    DataFrame là bản sao của cửa sổ trong cache: giữ qua các lần làm mới không bị đổi
+    Sàn lỗi: trả cửa sổ cũ gắn attrs['stale'] trong lúc refresher tải lại nền
+    """
+    try:
+        df = _cached_window(symbol, interval, limit)
+        if df is not None:
+            return df
+        return _refresh_window(symbol, interval, limit, FOREGROUND_RETRIES).to_df(limit)
+    except Exception as e:
+        return _stale_window(symbol, interval, limit, e)
+
+
+def get_klines_batch(pairs):
+    """
+    Lấy dữ liệu cho nhiều cặp cùng lúc qua AsyncKlineFetcher (chỉ tải các cặp không có trong cache)
+    pairs: {(symbol, interval): limit}
+    Trả về {(symbol, interval): DataFrame (có thể là cửa sổ cũ, xem get_klines_df) hoặc None}
+    """
+    frames = {}
+    for (symbol, interval), limit in pairs.items():
+        df = _cached_window(symbol, interval, limit)
+        if df is not None:
+            frames[(symbol, interval)] = df
+
+    requests = {
+        (symbol, interval): {'start_ms': _sync_start(symbol, interval, limit)}
+        for (symbol, interval), limit in pairs.items() if (symbol, interval) not in frames
+    }
+    fetched = async_fetcher.fetch_all(requests) if requests else {}
+
+    for (symbol, interval) in requests:
+        limit = pairs[(symbol, interval)]
+        klines = fetched.get((symbol, interval))
+        if klines is None:
+            frames[(symbol, interval)] = _stale_window(symbol, interval, limit, "tải song song thất bại")
+            continue
+        try:
+            store.append(symbol, interval, klines)
+            df = _window_df(symbol, interval, limit, klines)
+            _fetched_at[(symbol, interval)] = now_ms()
+            frames[(symbol, interval)] = _cache_window(symbol, interval, limit, df).to_df(limit)
+        except Exception as e:
+            frames[(symbol, interval)] = _stale_window(symbol, interval, limit, e)
+    return frames
+
+
+def _cached_range(symbol, interval, start_ms, end_ms):
+    """Cắt khoảng [start_ms, end_ms) từ lịch sử đã cache nếu lịch sử đó bao trọn khoảng cần"""
+    df = cache.get(symbol, interval, kind='range')
+    # end_ms=None nghĩa là tới nến đã đóng gần nhất
+    needed_end = candle_open_time(now_ms(), interval) if end_ms is None else end_ms
+    if df is None or df.attrs['start_ms'] > start_ms or df.attrs['end_ms'] < needed_end:
+        return None
+    timestamps = df['timestamp'].to_numpy()
+    start_row = int(np.searchsorted(timestamps, start_ms, side='left'))
+    stop_row = len(timestamps) if end_ms is None else int(np.searchsorted(timestamps, end_ms, side='left'))
+    return df.iloc[start_row:stop_row].reset_index(drop=True)
+
+
+def get_klines_range(symbol, interval, start_ms, end_ms=None):
+    """Lấy nến đã đóng trong khoảng [start_ms, end_ms) từ kho, tải bù phần còn thiếu"""
     try:
-        klines = client.get_historical_klines(symbol, interval, limit=limit)
-        df = pd.DataFrame(klines, columns=[
-            'timestamp', 'open', 'high', 'low', 'close', 'volume',
-            'close_time', 'quote_asset_volume', 'number_of_trades',
-            'taker_buy_base', 'taker_buy_quote', 'ignore'
-        ])
-        
-        # Convert to numeric
-        numeric_columns = ['close', 'high', 'low', 'volume', 'open']
-        for col in numeric_columns:
-            df[col] = pd.to_numeric(df[col])
-            
-        return df
+        df = _cached_range(symbol, interval, start_ms, end_ms)
+        if df is not None:
+            return df
+        backfill_history([symbol], interval, start_ms, end_ms)
+        fill_gaps(symbol, interval, start_ms, end_ms)
+        df = store.read_range(symbol, interval, start_ms, end_ms, columns=OHLCV_COLUMNS)
+        df.attrs['start_ms'] = start_ms
+        df.attrs['end_ms'] = now_ms() if end_ms is None else end_ms
+        cache.put(symbol, interval, df, kind='range')
+        return df.reset_index(drop=True)
     except Exception as e:
         print(f"❌ Lỗi lấy dữ liệu {symbol}: {e}")
         return None
-    
+
+
+def backfill_history(symbols, interval, start_ms, end_ms=None):
+    """Tải song song phần lịch sử còn thiếu của nhiều symbol vào kho"""
+    end_ms = now_ms() if end_ms is None else end_ms
+
+    # Gom các symbol theo khoảng cần tải để dùng chung một lượt tải song song
+    missing = {}
+    for symbol in symbols:
+        symbol_start = max(start_ms, _listed_from.get((symbol, interval), start_ms))
+        first_open = store.first_open_time(symbol, interval)
+        last_close = store.last_close_time(symbol, interval)
+        if first_open is None:
+            if symbol_start < end_ms:
+                missing.setdefault((symbol_start, end_ms), []).append(symbol)
+            continue
+        if first_open > symbol_start:
+            missing.setdefault((symbol_start, first_open), []).append(symbol)
+        if last_close + 1 < end_ms:
+            missing.setdefault((last_close + 1, end_ms), []).append(symbol)
+
+    for (range_start, range_end), range_symbols in missing.items():
+        data = downloader.download_many(range_symbols, interval, range_start, range_end)
+        for symbol, klines in data.items():
+            first_open = store.first_open_time(symbol, interval)
+            if first_open is None or range_end <= first_open:
+                # Khoảng đầu: phần trước nến đầu tiên sàn trả về là lúc symbol chưa niêm yết
+                listed = int(klines['timestamp'][0]) if len(klines) else range_end
+                if listed > range_start:
+                    _listed_from[(symbol, interval)] = listed
+            last_close = store.last_close_time(symbol, interval)
+            if last_close is not None and range_start > last_close:
+                store.append(symbol, interval, klines)
+            else:
+                store.merge(symbol, interval, klines)
+
+
+def get_trade_bars(symbol, builder, start_ms=None, end_ms=None, files=None):
+    """
+    Dựng thanh theo hoạt động giao dịch (utils.bar_builder) từ aggTrades
+    files: các file aggTrades đã ghi theo thứ tự thời gian (ưu tiên), nếu không có thì tải qua REST
+    Trả về DataFrame OHLCV các thanh đã đóng, dùng được như get_klines_df cho chiến lược
+    """
+    try:
+        if files:
+            for path in files:
+                for chunk in read_agg_trade_file(path):
+                    builder.update(chunk)
+        else:
+            end_ms = now_ms() if end_ms is None else end_ms
+            for chunk in fetch_agg_trades(client, symbol, start_ms, end_ms):
+                builder.update(chunk)
+        return builder.closed_df()
+    except Exception as e:
+        print(f"❌ Lỗi dựng thanh giao dịch {symbol}: {e}")
+        return None
+
+
 def get_multi_timeframe_data(symbol, main_interval, higher_interval, main_limit=200, higher_limit=100):
     """Lấy dữ liệu cho 2 khung thời gian"""
     df_main = get_klines_df(symbol, main_interval, main_limit)
     df_higher = get_klines_df(symbol, higher_interval, higher_limit)
-    return df_main, df_higher
\ No newline at end of file
+    return df_main, df_higher
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Đường cong độ sâu sổ lệnh (order book) cho mô hình trượt giá trong backtest
+- Mỗi snapshot sổ lệnh được rút gọn thành khối lượng cộng dồn mỗi phía tại một lưới độ lệch giá cố định (bps
+  so với giá giữa): một bản ghi kích thước cố định ~150 byte thay vì hàng trăm mức giá
+- Lưu ghi thêm vào file nhị phân theo tháng (data/depth/<SYMBOL>/<YYYYMM>.bin), đọc lại qua memory-map
+- Giá khớp trung bình của một lệnh thị trường: tìm nhị phân snapshot theo thời gian rồi tìm nhị phân trên
+  đường cong (O(log n), dùng được cho từng lệnh trong backtest nhiều năm)
+- Ghi snapshot từ REST (/depth) định kỳ: python -m utils.depth_book --symbols BTCUSDT --every 60
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from utils.intervals import now_ms
+
+# Lưới độ lệch giá (bps) tại đó lưu khối lượng cộng dồn
+DEPTH_BPS_GRID = (1, 2, 3, 5, 7.5, 10, 15, 20, 30, 50, 75, 100, 150, 200, 300, 500)
+# Số mức giá mỗi phía lấy từ REST (limit <= 100 tốn 5 weight)
+DEPTH_LIMIT = 100
+# Snapshot cũ hơn mức này so với thời điểm lệnh thì không dùng
+DEFAULT_MAX_AGE_MS = 15 * 60 * 1000
+
+DEFAULT_DEPTH_DIR = os.getenv("DEPTH_STORE_DIR", os.path.join("data", "depth"))
+
+
+def depth_record_dtype(grid=DEPTH_BPS_GRID):
+    """Một snapshot: thời điểm, giá giữa, nửa spread (bps) và khối lượng cộng dồn mỗi phía theo lưới"""
+    return np.dtype([
+        ('timestamp', '<i8'),
+        ('mid', '<f8'),
+        ('half_spread', '<f4'),
+        ('bid_qty', '<f4', (len(grid),)),
+        ('ask_qty', '<f4', (len(grid),)),
+    ])
+
+
+def depth_curve(levels, mid, grid=DEPTH_BPS_GRID):
+    """
+    Khối lượng cộng dồn của một phía sổ lệnh trong phạm vi từng mức của lưới bps
+    levels: [[giá, khối lượng], ...] từ mức tốt nhất ra xa
+    Ngoài phạm vi các mức đã lấy, khối lượng giữ nguyên (ước lượng thận trọng)
+    """
+    levels = np.asarray(levels, dtype=np.float64).reshape(-1, 2)
+    offsets = np.abs(levels[:, 0] / mid - 1.0) * 1e4
+    cumulative = np.concatenate(([0.0], np.cumsum(levels[:, 1])))
+    # Sai số làm tròn: mức giá nằm đúng trên một mốc lưới vẫn được tính vào mốc đó
+    bounds = np.asarray(grid, dtype=np.float64) + 1e-6
+    return cumulative[np.searchsorted(offsets, bounds, side='right')]
+
+
+def snapshot_record(order_book, timestamp, grid=DEPTH_BPS_GRID):
+    """Rút gọn phản hồi /depth ({'bids': ..., 'asks': ...}) thành một bản ghi depth_record_dtype"""
+    bids = np.asarray(order_book['bids'], dtype=np.float64).reshape(-1, 2)
+    asks = np.asarray(order_book['asks'], dtype=np.float64).reshape(-1, 2)
+    if len(bids) == 0 or len(asks) == 0:
+        raise ValueError("sổ lệnh rỗng")
+    mid = (bids[0, 0] + asks[0, 0]) / 2
+    record = np.zeros(1, dtype=depth_record_dtype(grid))
+    record['timestamp'] = timestamp
+    record['mid'] = mid
+    record['half_spread'] = (asks[0, 0] - bids[0, 0]) / 2 / mid * 1e4
+    record['bid_qty'] = depth_curve(bids, mid, grid)
+    record['ask_qty'] = depth_curve(asks, mid, grid)
+    return record
+
+
+class DepthCurves:
+    """Đường cong độ sâu đã nạp cho một symbol, tính giá khớp của lệnh thị trường theo khối lượng"""
+
+    def __init__(self, records, grid=DEPTH_BPS_GRID, max_age_ms=DEFAULT_MAX_AGE_MS):
+        self.timestamps = np.asarray(records['timestamp'])
+        self.mid = np.asarray(records['mid'])
+        self.max_age_ms = max_age_ms
+
+        # Điểm đầu đường cong: (nửa spread, 0); các mức lưới nằm trong spread dồn về nửa spread
+        half_spread = np.asarray(records['half_spread'], dtype=np.float64)[:, None]
+        grid = np.asarray(grid, dtype=np.float64)[None, :]
+        self.offsets = np.concatenate([half_spread, np.maximum(grid, half_spread)], axis=1)
+        self.curves = {}
+        for side, field in (('BUY', 'ask_qty'), ('SELL', 'bid_qty')):
+            qty = np.asarray(records[field], dtype=np.float64)
+            qty = np.concatenate([np.zeros((len(qty), 1)), np.maximum.accumulate(qty, axis=1)], axis=1)
+            # cost[k]: tổng (độ lệch bps x khối lượng) khi khớp hết qty[k] (nội suy tuyến tính giữa các mức)
+            steps = np.diff(qty, axis=1) * (self.offsets[:, :-1] + self.offsets[:, 1:]) / 2
+            cost = np.concatenate([np.zeros((len(qty), 1)), np.cumsum(steps, axis=1)], axis=1)
+            self.curves[side] = (qty, cost)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def snapshot_index(self, timestamp):
+        """Vị trí snapshot gần nhất không sau `timestamp` (None nếu không có hoặc quá cũ)"""
+        i = int(np.searchsorted(self.timestamps, timestamp, side='right')) - 1
+        if i < 0 or timestamp - self.timestamps[i] > self.max_age_ms:
+            return None
+        return i
+
+    def impact_bps(self, side, quantity, timestamp):
+        """
+        Độ lệch trung bình (bps so với giá giữa) khi khớp `quantity` bằng lệnh thị trường
+        Vượt quá độ sâu đã ghi: phần dư khớp ở mức xa nhất có khối lượng. None nếu không có snapshot phù hợp
+        """
+        i = self.snapshot_index(timestamp)
+        if i is None:
+            return None
+        qty, cost = self.curves[side]
+        qty, cost, offsets = qty[i], cost[i], self.offsets[i]
+        if quantity <= 0:
+            return float(offsets[0])
+        k = int(np.searchsorted(qty, quantity, side='left'))
+        if k == len(qty):
+            edge = int(np.searchsorted(qty, qty[-1], side='left'))
+            return float((cost[-1] + (quantity - qty[-1]) * offsets[edge]) / quantity)
+        fraction = (quantity - qty[k - 1]) / (qty[k] - qty[k - 1])
+        marginal = offsets[k - 1] + fraction * (offsets[k] - offsets[k - 1])
+        return float((cost[k - 1] + (quantity - qty[k - 1]) * (offsets[k - 1] + marginal) / 2) / quantity)
+
+    def fill_price(self, side, quantity, timestamp, price=None):
+        """
+        Giá khớp trung bình của lệnh thị trường `side` khối lượng `quantity` tại `timestamp`
+        price: giá tham chiếu áp độ lệch lên (mặc định giá giữa của snapshot)
+        """
+        impact = self.impact_bps(side, quantity, timestamp)
+        if impact is None:
+            return None
+        reference = self.mid[self.snapshot_index(timestamp)] if price is None else price
+        sign = 1.0 if side == 'BUY' else -1.0
+        return float(reference * (1.0 + sign * impact / 1e4))
+
+
+class DepthStore:
+    def __init__(self, root=DEFAULT_DEPTH_DIR, grid=DEPTH_BPS_GRID):
+        self.root = root
+        self.grid = tuple(grid)
+        self.dtype = depth_record_dtype(self.grid)
+        self._lock = threading.Lock()
+
+    def _symbol_dir(self, symbol):
+        return os.path.join(self.root, symbol.upper())
+
+    def _month_path(self, symbol, month):
+        return os.path.join(self._symbol_dir(symbol), f"{month}.bin")
+
+    @staticmethod
+    def _month(timestamp):
+        return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).strftime('%Y%m')
+
+    def _check_grid(self, symbol, create=False):
+        """Các file của một symbol phải cùng lưới bps (ghi trong meta.json)"""
+        path = os.path.join(self._symbol_dir(symbol), "meta.json")
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                grid = tuple(json.load(f)['bps_grid'])
+            if grid != self.grid:
+                raise ValueError(f"Lưới bps của {symbol} trên đĩa ({grid}) khác lưới đang dùng ({self.grid})")
+            return True
+        if create:
+            os.makedirs(self._symbol_dir(symbol), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'bps_grid': list(self.grid)}, f)
+        return create
+
+    def symbols(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.exists(os.path.join(self.root, name, "meta.json")))
+
+    def append(self, symbol, records):
+        """Ghi thêm các snapshot (tăng dần theo thời gian) vào file của tháng tương ứng"""
+        records = np.asarray(records, dtype=self.dtype)
+        if len(records) == 0:
+            return
+        with self._lock:
+            self._check_grid(symbol, create=True)
+            months = np.array([self._month(ts) for ts in records['timestamp']])
+            for month in dict.fromkeys(months):
+                with open(self._month_path(symbol, month), 'ab') as f:
+                    f.write(records[months == month].tobytes())
+
+    def read(self, symbol, start=None, end=None):
+        """Các snapshot trong [start, end) (ms) dạng structured array"""
+        if not self._check_grid(symbol):
+            return np.zeros(0, dtype=self.dtype)
+        first = None if start is None else self._month(start)
+        last = None if end is None else self._month(end)
+        parts = []
+        for name in sorted(os.listdir(self._symbol_dir(symbol))):
+            month = name[:-4]
+            if not name.endswith('.bin') or (first and month < first) or (last and month > last):
+                continue
+            path = self._month_path(symbol, month)
+            rows = os.path.getsize(path) // self.dtype.itemsize   # Bỏ bản ghi cuối nếu đang ghi dở
+            if rows == 0:
+                continue
+            records = np.memmap(path, dtype=self.dtype, mode='r', shape=(rows,))
+            timestamps = records['timestamp']
+            lo = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+            hi = rows if end is None else int(np.searchsorted(timestamps, end, side='left'))
+            parts.append(records[lo:hi])
+        if not parts:
+            return np.zeros(0, dtype=self.dtype)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def load(self, symbol, start=None, end=None, max_age_ms=DEFAULT_MAX_AGE_MS):
+        """DepthCurves cho backtest trong [start, end) (None nếu chưa ghi snapshot nào)"""
+        records = self.read(symbol, start, end)
+        if len(records) == 0:
+            return None
+        return DepthCurves(records, self.grid, max_age_ms)
+
+
+def record_depth(client, store, symbols, limit=DEPTH_LIMIT):
+    """Lấy một snapshot /depth cho mỗi symbol và ghi vào kho, trả về số snapshot đã ghi"""
+    recorded = 0
+    for symbol in symbols:
+        try:
+            book = client.get_order_book(symbol=symbol, limit=limit)
+            store.append(symbol, snapshot_record(book, now_ms(), store.grid))
+            recorded += 1
+        except Exception as e:
+            print(f"⚠️ Lỗi ghi sổ lệnh {symbol}: {e}")
+    return recorded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ghi snapshot độ sâu sổ lệnh cho mô hình trượt giá backtest")
+    parser.add_argument('--symbols', nargs='+', required=True)
+    parser.add_argument('--every', type=float, default=60.0, help="Khoảng thời gian (giây) giữa hai snapshot")
+    parser.add_argument('--limit', type=int, default=DEPTH_LIMIT, help="Số mức giá mỗi phía")
+    args = parser.parse_args()
+
+    from utils.data_fetcher import client
+
+    store = DepthStore()
+    print(f"📚 Ghi sổ lệnh {', '.join(args.symbols)} mỗi {args.every:g}s vào {store.root}")
+    try:
+        while True:
+            started = time.monotonic()
+            record_depth(client, store, args.symbols, args.limit)
+            time.sleep(max(0.0, args.every - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        print("\n🛑 Dừng ghi sổ lệnh")
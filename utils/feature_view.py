@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Đầu vào chỉ đọc của chiến lược
+- FeatureView bọc DataFrame nến dùng chung của chu kỳ: đọc cột OHLCV và chỉ báo (qua IndicatorFrame)
+  nhưng không ghi được cột, nên các chiến lược chạy song song trên cùng df không giẫm lên nhau
+- Giá trị trung gian của chiến lược nằm trong StrategyFeatures riêng của mỗi lần chạy,
+  không chèn thêm cột vào DataFrame trong cache
+- row(i) trả về dict giá trị của nến i (OHLCV + giá trị trung gian), thay cho df.iloc[i]
+"""
+
+import numpy as np
+
+from utils.indicator_store import IndicatorFrame
+
+
+class FeatureView:
+    def __init__(self, df, ind=None):
+        """
+        Args:
+            df: DataFrame nến (không bị sửa)
+            ind: IndicatorFrame của df (None thì tự tạo)
+        """
+        self._df = df
+        self.ind = ind if ind is not None else IndicatorFrame(df)
+        self._arrays = {}
+
+    def __len__(self):
+        return len(self._df)
+
+    def __contains__(self, column):
+        return column in self._df.columns
+
+    @property
+    def columns(self):
+        return list(self._df.columns)
+
+    def __getitem__(self, key):
+        """Cột theo tên (vd: 'close') hoặc chỉ báo theo spec (vd: ('ema', 'close', 21))"""
+        if isinstance(key, tuple):
+            return self.ind.get(*key)
+        return self._df[key]
+
+    def __setitem__(self, key, value):
+        raise TypeError(f"FeatureView chỉ đọc, không ghi được cột '{key}': dùng features() của chiến lược")
+
+    def array(self, column):
+        """Mảng NumPy chỉ đọc của một cột"""
+        values = self._arrays.get(column)
+        if values is None:
+            values = self._df[column].to_numpy()
+            values.flags.writeable = False
+            self._arrays[column] = values
+        return values
+
+    def features(self):
+        """Chỗ chứa giá trị trung gian cho một lần chạy chiến lược"""
+        return StrategyFeatures(self)
+
+
+class StrategyFeatures:
+    """Giá trị trung gian cục bộ của chiến lược; tên chưa gán thì đọc từ FeatureView"""
+
+    def __init__(self, view):
+        self.view = view
+        self._values = {}
+        self._arrays = {}
+
+    def __setitem__(self, name, values):
+        self._values[name] = values
+        self._arrays[name] = np.asarray(values)
+
+    def __getitem__(self, name):
+        if name in self._values:
+            return self._values[name]
+        return self.view[name]
+
+    def array(self, name):
+        """Mảng NumPy của giá trị trung gian hoặc cột của view"""
+        values = self._arrays.get(name)
+        return values if values is not None else self.view.array(name)
+
+    def row(self, position):
+        """Giá trị của nến `position` (vd: -1 là nến cuối): cột của view và giá trị trung gian"""
+        row = {column: self.view.array(column)[position] for column in self.view.columns}
+        row.update((name, values[position]) for name, values in self._arrays.items())
+        return row
+
+
+def as_view(df, ind=None):
+    """FeatureView của df (giữ nguyên nếu df đã là FeatureView)"""
+    if isinstance(df, FeatureView):
+        return df
+    return FeatureView(df, ind)
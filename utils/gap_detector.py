@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Phát hiện và vá lỗ hổng (nến bị thiếu) trong kho nến
+- Vector hoá trên timestamp int64: hai nến liền kề phải cách nhau đúng một interval
+- Chỉ tải lại đúng các khoảng bị thiếu (request nhỏ), không tải lại toàn bộ lịch sử
+- Thống kê lỗ hổng theo từng symbol/interval
+
+Chạy: python -m utils.gap_detector [--symbols BTCUSDT ...] [--intervals 5m ...] [--fix]
+"""
+
+import argparse
+
+import numpy as np
+
+from utils.intervals import interval_to_ms
+
+
+def find_gaps(timestamps, interval):
+    """
+    Các lỗ hổng trong dãy thời điểm mở nến đã sắp xếp
+    Trả về mảng int64 shape (n, 2): [start, end) của từng khoảng bị thiếu
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if len(timestamps) < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    step = interval_to_ms(interval)
+    idx = np.flatnonzero(np.diff(timestamps) > step)
+    return np.column_stack((timestamps[idx] + step, timestamps[idx + 1]))
+
+
+def gap_stats(timestamps, interval, gaps=None):
+    """Thống kê lỗ hổng của một dãy nến"""
+    step = interval_to_ms(interval)
+    gaps = find_gaps(timestamps, interval) if gaps is None else gaps
+    missing = (gaps[:, 1] - gaps[:, 0]) // step
+    rows = len(timestamps)
+    return {
+        'rows': rows,
+        'gaps': len(gaps),
+        'missing': int(missing.sum()),
+        'largest_gap': int(missing.max()) if len(missing) else 0,
+        'coverage': rows / (rows + missing.sum()) if rows else 0.0,
+    }
+
+
+def scan_store(store, symbols=None, intervals=None):
+    """
+    Quét toàn bộ kho (hoặc các symbol/interval chỉ định)
+    Trả về {(symbol, interval): (gaps, stats)}
+    """
+    report = {}
+    for symbol, interval in store.partitions():
+        if symbols and symbol not in symbols:
+            continue
+        if intervals and interval not in intervals:
+            continue
+        timestamps = store.mmap_columns(symbol, interval, columns=['timestamp'])['timestamp']
+        gaps = find_gaps(timestamps, interval)
+        report[(symbol, interval)] = (gaps, gap_stats(timestamps, interval, gaps))
+    return report
+
+
+def backfill_gaps(store, downloader, symbol, interval, gaps):
+    """
+    Tải đúng các khoảng bị thiếu rồi gộp vào kho (một lần ghi cho cả symbol)
+    Trả về số nến được thêm
+    """
+    if len(gaps) == 0:
+        return 0
+    klines = downloader.download_ranges(symbol, interval, [tuple(map(int, gap)) for gap in gaps])
+    if len(klines) == 0:
+        return 0
+    return store.merge(symbol, interval, klines)
+
+
+def print_report(report):
+    print(f"{'Symbol':<12}{'Interval':>9}{'Nến':>10}{'Lỗ hổng':>9}{'Thiếu':>9}{'Lớn nhất':>10}{'Phủ':>9}")
+    for (symbol, interval), (_, stats) in report.items():
+        print(f"{symbol:<12}{interval:>9}{stats['rows']:>10}{stats['gaps']:>9}{stats['missing']:>9}"
+              f"{stats['largest_gap']:>10}{stats['coverage'] * 100:>8.2f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Phát hiện và vá nến bị thiếu trong kho")
+    parser.add_argument('--symbols', nargs='*')
+    parser.add_argument('--intervals', nargs='*')
+    parser.add_argument('--fix', action='store_true', help="Tải bù các khoảng bị thiếu")
+    args = parser.parse_args()
+
+    from utils.data_fetcher import downloader, store
+
+    report = scan_store(store, args.symbols, args.intervals)
+    print("📊 THỐNG KÊ LỖ HỔNG DỮ LIỆU NẾN")
+    print_report(report)
+
+    if args.fix:
+        for (symbol, interval), (gaps, stats) in report.items():
+            if stats['gaps']:
+                added = backfill_gaps(store, downloader, symbol, interval, gaps)
+                print(f"✅ {symbol} ({interval}): vá {added}/{stats['missing']} nến thiếu")
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Kho chỉ báo dùng chung trong một chu kỳ phân tích
+- Mỗi chỉ báo được mô tả bằng một spec dạng tuple, vd: ('ema', 'close', 21), ('atr', 14)
+- IndicatorFrame ghi nhớ kết quả theo spec: chiến lược, adaptive system và risk manager
+  cùng hỏi một frame nên mỗi chỉ báo chỉ tính một lần mỗi chu kỳ
+- Nguồn dữ liệu là tên cột hoặc một spec lồng, vd: ('ema', ('obv',), 10) = EMA10 của OBV
+- IndicatorStore giữ một frame cho mỗi (symbol, interval), đổi frame khi nến cuối thay đổi
+- Trạng thái cần giữ qua nhiều nến (vd: chỉ mục S/R) nằm trong `persistent` của (symbol, interval)
+- Giá trị tính bằng thư viện `ta` như trước nên kết quả chiến lược không đổi
+"""
+
+import threading
+
+import pandas as pd
+import ta
+
+from utils.sr_index import SRLevelIndex
+from utils.supertrend import supertrend
+
+
+def _ema(frame, source, period):
+    return ta.trend.EMAIndicator(frame.series(source), period).ema_indicator()
+
+
+def _sma(frame, source, period):
+    # Giống ta.trend.SMAIndicator (min_periods = period)
+    return frame.series(source).rolling(period).mean()
+
+
+def _std(frame, source, period):
+    return frame.series(source).rolling(period).std()
+
+
+def _rolling_max(frame, source, period):
+    return frame.series(source).rolling(period).max()
+
+
+def _rolling_min(frame, source, period):
+    return frame.series(source).rolling(period).min()
+
+
+def _pct_change(frame, source):
+    return frame.series(source).pct_change()
+
+
+def _rsi(frame, source, period):
+    return ta.momentum.RSIIndicator(frame.series(source), period).rsi()
+
+
+def _atr(frame, period):
+    df = frame.df
+    return ta.volatility.AverageTrueRange(df['high'], df['low'], df['close'], period).average_true_range()
+
+
+def _bollinger(frame, source, period, dev):
+    bb = ta.volatility.BollingerBands(frame.series(source), period, dev)
+    return pd.DataFrame({'upper': bb.bollinger_hband(), 'lower': bb.bollinger_lband(),
+                         'mavg': bb.bollinger_mavg()})
+
+
+def _macd(frame, source, fast, slow, signal):
+    macd = ta.trend.MACD(frame.series(source), slow, fast, signal)
+    return pd.DataFrame({'macd': macd.macd(), 'signal': macd.macd_signal(), 'diff': macd.macd_diff()})
+
+
+def _obv(frame):
+    df = frame.df
+    return ta.volume.OnBalanceVolumeIndicator(df['close'], df['volume']).on_balance_volume()
+
+
+def _stoch(frame, window, smooth):
+    df = frame.df
+    return ta.momentum.StochasticOscillator(df['high'], df['low'], df['close'], window, smooth).stoch()
+
+
+def _supertrend(frame, configs):
+    # ATR lấy từ frame (dùng chung với chỉ báo khác), Supertrend mọi cấu hình tính một lần
+    df = frame.df
+    atr = {period: frame.get('atr', period).to_numpy() for period, _ in configs}
+    return supertrend(df['high'], df['low'], df['close'], configs, atr)
+
+
+def _sr_levels(frame, window, max_pivots):
+    # Chỉ mục dùng lại giữa các frame của cùng (symbol, interval): chỉ chốt thêm các nến mới
+    key = ('sr_levels', window, max_pivots)
+    index = frame.persistent.get(key)
+    if index is None:
+        index = frame.persistent[key] = SRLevelIndex(window, max_pivots)
+    return index.sync(frame.df)
+
+
+def _adi(frame):
+    df = frame.df
+    return ta.volume.AccDistIndexIndicator(df['high'], df['low'], df['close'], df['volume']).acc_dist_index()
+
+
+# Tên chỉ báo -> hàm tính(frame, *params)
+INDICATORS = {
+    'ema': _ema,
+    'sma': _sma,
+    'std': _std,
+    'max': _rolling_max,
+    'min': _rolling_min,
+    'pct_change': _pct_change,
+    'rsi': _rsi,
+    'atr': _atr,
+    'bollinger': _bollinger,
+    'macd': _macd,
+    'obv': _obv,
+    'stoch': _stoch,
+    'adi': _adi,
+    'supertrend': _supertrend,
+    'sr_levels': _sr_levels,
+}
+
+
+class IndicatorFrame:
+    """
+    Chỉ báo của một DataFrame nến, tính khi được hỏi lần đầu rồi ghi nhớ theo spec
+    An toàn khi nhiều chiến lược chạy song song trên cùng frame
+    """
+
+    def __init__(self, df, persistent=None):
+        """persistent: dict trạng thái dùng qua nhiều nến của cùng (symbol, interval), None thì chỉ dùng trong frame"""
+        self.df = df
+        self.persistent = {} if persistent is None else persistent
+        self._values = {}
+        self._lock = threading.RLock()
+        self.computed = 0
+        self.hits = 0
+
+    def series(self, source):
+        """Cột gốc (tên cột) hoặc chỉ báo (spec tuple)"""
+        if isinstance(source, tuple):
+            return self.get(*source)
+        return self.df[source]
+
+    def get(self, name, *params):
+        """Giá trị của spec (name, *params); kết quả dùng chung, không sửa tại chỗ (cần sửa thì .copy())"""
+        key = (name,) + params
+        with self._lock:
+            value = self._values.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            value = INDICATORS[name](self, *params)
+            self._values[key] = value
+            self.computed += 1
+            return value
+
+    def specs(self):
+        with self._lock:
+            return list(self._values)
+
+    # Các chỉ báo hay dùng (tham số mặc định giống `ta`)
+    def ema(self, period, source='close'):
+        return self.get('ema', source, period)
+
+    def sma(self, period, source='close'):
+        return self.get('sma', source, period)
+
+    def rolling_std(self, period, source='close'):
+        return self.get('std', source, period)
+
+    def rolling_max(self, period, source='high'):
+        return self.get('max', source, period)
+
+    def rolling_min(self, period, source='low'):
+        return self.get('min', source, period)
+
+    def returns_volatility(self, period=20):
+        """Độ lệch chuẩn lợi nhuận theo nến trên `period` nến"""
+        return self.get('std', ('pct_change', 'close'), period)
+
+    def rsi(self, period=14, source='close'):
+        return self.get('rsi', source, period)
+
+    def atr(self, period=14):
+        return self.get('atr', period)
+
+    def bollinger(self, period=20, dev=2, source='close'):
+        """DataFrame cột upper/lower/mavg"""
+        return self.get('bollinger', source, period, dev)
+
+    def macd(self, fast=12, slow=26, signal=9, source='close'):
+        """DataFrame cột macd/signal/diff"""
+        return self.get('macd', source, fast, slow, signal)
+
+    def obv(self):
+        return self.get('obv')
+
+    def stoch(self, window=14, smooth=3):
+        return self.get('stoch', window, smooth)
+
+    def adi(self):
+        return self.get('adi')
+
+    def supertrend(self, configs):
+        """(supertrend, atr, upper) mảng (n, K) cho configs = ((period, multiplier), ...)"""
+        return self.get('supertrend', tuple(tuple(config) for config in configs))
+
+    def sr_levels(self, window=8, max_pivots=20):
+        """SRLevelIndex đã đồng bộ tới nến cuối của df"""
+        return self.get('sr_levels', window, max_pivots)
+
+
+class IndicatorStore:
+    """Một IndicatorFrame cho mỗi (symbol, interval), dùng lại tới khi có nến mới"""
+
+    def __init__(self):
+        self._frames = {}
+        self._persistent = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    @staticmethod
+    def _version(df):
+        # Nến cuối có thể đang chạy (vd: khung lớn dựng từ khung chính): so cả OHLCV của nó
+        last = df.iloc[-1]
+        return (len(df),) + tuple(last[column] for column in ('timestamp', 'open', 'high', 'low', 'close', 'volume'))
+
+    def frame(self, symbol, interval, df):
+        """
+        Frame chỉ báo của df; cùng số nến và nến cuối không đổi thì trả lại frame đã có
+        (các nến trước nến cuối đã đóng nên không đổi)
+        """
+        key = (symbol, interval)
+        version = self._version(df)
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is not None and entry[0] == version:
+                self.reused += 1
+                return entry[1]
+            frame = IndicatorFrame(df, self._persistent.setdefault(key, {}))
+            self._frames[key] = (version, frame)
+            self.created += 1
+            return frame
+
+    def stats(self):
+        with self._lock:
+            frames = [frame for _, frame in self._frames.values()]
+            return {
+                'frames': len(frames),
+                'created': self.created,
+                'reused': self.reused,
+                'computed': sum(frame.computed for frame in frames),
+                'hits': sum(frame.hits for frame in frames),
+            }
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tiện ích khung thời gian nến Binance
+- Quy đổi interval ("5m", "1h", ...) sang mili-giây
+- Tính thời điểm mở/đóng của nến theo lưới thời gian của sàn
+"""
+
+import time
+
+INTERVAL_MS = {
+    '1m': 60_000,
+    '3m': 3 * 60_000,
+    '5m': 5 * 60_000,
+    '15m': 15 * 60_000,
+    '30m': 30 * 60_000,
+    '1h': 3_600_000,
+    '2h': 2 * 3_600_000,
+    '4h': 4 * 3_600_000,
+    '6h': 6 * 3_600_000,
+    '8h': 8 * 3_600_000,
+    '12h': 12 * 3_600_000,
+    '1d': 86_400_000,
+    '3d': 3 * 86_400_000,
+    '1w': 7 * 86_400_000,
+}
+
+# Nến tuần của Binance mở vào thứ Hai, còn epoch (1970-01-01) là thứ Năm
+_INTERVAL_OFFSET_MS = {
+    '1w': 4 * 86_400_000,
+}
+
+
+def now_ms():
+    """Thời gian hiện tại (ms, UTC)"""
+    return int(time.time() * 1000)
+
+
+def interval_to_ms(interval):
+    """Quy đổi interval Binance sang mili-giây"""
+    try:
+        return INTERVAL_MS[interval]
+    except KeyError:
+        raise ValueError(f"Interval không được hỗ trợ: {interval}")
+
+
+def candle_open_time(ts_ms, interval):
+    """Thời điểm mở của nến chứa ts_ms"""
+    step = interval_to_ms(interval)
+    offset = _INTERVAL_OFFSET_MS.get(interval, 0)
+    return (ts_ms - offset) // step * step + offset
+
+
+def last_closed_open_time(interval, ts_ms=None):
+    """Thời điểm mở của nến đã đóng gần nhất tại ts_ms"""
+    if ts_ms is None:
+        ts_ms = now_ms()
+    return candle_open_time(ts_ms, interval) - interval_to_ms(interval)
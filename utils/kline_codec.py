@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mã hoá nén cho các khối (chunk) nến cũ trong kho
+- Timestamp/close_time: lưu hiệu số (gần như luôn bằng đúng một interval)
+- Giá: quy về số nguyên theo số chữ số thập phân (tick) rồi lưu hiệu số
+- Khối lượng: số nguyên theo tick, số lệnh: số nguyên, đều dùng kiểu int nhỏ nhất đủ chứa
+- Mỗi cột được xáo byte (byte-shuffle) rồi nén zlib; giá trị không quy được về tick thì giữ float64
+- Giải mã cho lại đúng từng bit giá trị ban đầu; đọc được riêng từng cột của một khối
+"""
+
+import json
+import struct
+import zlib
+
+import numpy as np
+
+# Số nến mỗi khối nén: người đọc chỉ giải nén các khối nằm trong khoảng cần đọc
+CHUNK_ROWS = 8192
+# Binance trả giá/khối lượng với tối đa 8 chữ số thập phân
+MAX_DECIMALS = 8
+COMPRESS_LEVEL = 6
+
+COLUMN_CODECS = {
+    'timestamp': 'delta',
+    'close_time': 'delta',
+    'open': 'ticks_delta',
+    'high': 'ticks_delta',
+    'low': 'ticks_delta',
+    'close': 'ticks_delta',
+    'volume': 'ticks',
+    'quote_asset_volume': 'ticks',
+    'number_of_trades': 'int',
+    'taker_buy_base': 'ticks',
+    'taker_buy_quote': 'ticks',
+}
+
+_HEADER = struct.Struct('<I')
+_INT_DTYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def _smallest_int(values):
+    """Ép mảng số nguyên về kiểu int nhỏ nhất đủ chứa"""
+    if len(values) == 0:
+        return values.astype(np.int8)
+    low, high = values.min(), values.max()
+    for dtype in _INT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return values.astype(dtype)
+    return values
+
+
+def _to_ticks(values):
+    """(số chữ số thập phân, mảng int64) nếu mọi giá trị quy đúng về tick, ngược lại (None, None)"""
+    if len(values) and not np.isfinite(values).all():
+        return None, None
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10.0 ** decimals
+        scaled = np.round(values * scale)
+        if len(values) and np.abs(scaled).max() >= 2 ** 53:
+            break
+        if np.array_equal(scaled / scale, values):
+            return decimals, scaled.astype(np.int64)
+    return None, None
+
+
+def _pack(values):
+    """Xáo byte theo vị trí trong phần tử rồi nén: các byte cao gần như bằng 0 nén rất tốt"""
+    itemsize = values.dtype.itemsize
+    shuffled = np.ascontiguousarray(values).view(np.uint8).reshape(-1, itemsize).T
+    return zlib.compress(shuffled.tobytes(), COMPRESS_LEVEL)
+
+
+def _unpack(blob, dtype, count):
+    dtype = np.dtype(dtype)
+    shuffled = np.frombuffer(zlib.decompress(blob), dtype=np.uint8).reshape(dtype.itemsize, count)
+    return shuffled.T.copy().view(dtype).ravel()
+
+
+def encode_column(name, values):
+    """Mã hoá một cột, trả về (mô tả, bytes)"""
+    codec = COLUMN_CODECS.get(name, 'raw')
+    spec = {'dtype': values.dtype.str}
+    ints = None
+
+    if codec in ('ticks', 'ticks_delta'):
+        spec['decimals'], ints = _to_ticks(values)
+        if ints is None:
+            codec = 'raw'
+    elif codec in ('delta', 'int'):
+        ints = values.astype(np.int64)
+
+    if codec in ('delta', 'ticks_delta') and len(ints):
+        spec['first'] = int(ints[0])
+        ints = np.diff(ints)
+
+    spec['codec'] = codec
+    if codec == 'raw':
+        return spec, _pack(values)
+    packed = _smallest_int(ints)
+    spec['int_dtype'] = packed.dtype.str
+    return spec, _pack(packed)
+
+
+def decode_column(spec, blob, count):
+    """Giải mã một cột đã được encode_column"""
+    codec = spec['codec']
+    if codec == 'raw':
+        return _unpack(blob, spec['dtype'], count)
+
+    ints = _unpack(blob, spec['int_dtype'], count - 1 if 'first' in spec else count).astype(np.int64)
+    if 'first' in spec:
+        ints = np.concatenate(([spec['first']], spec['first'] + np.cumsum(ints)))
+    if codec in ('ticks', 'ticks_delta'):
+        return ints / (10.0 ** spec['decimals'])
+    return ints.astype(spec['dtype'])
+
+
+def encode_chunk(columns):
+    """
+    Một khối nén: [độ dài header][header JSON][các cột đã nén]
+    Header ghi vị trí từng cột để người đọc chỉ đọc các cột cần dùng
+    """
+    count = len(next(iter(columns.values())))
+    header = {'rows': count, 'columns': {}}
+    blobs = []
+    offset = 0
+    for name, values in columns.items():
+        spec, blob = encode_column(name, np.asarray(values))
+        spec.update(offset=offset, length=len(blob))
+        header['columns'][name] = spec
+        blobs.append(blob)
+        offset += len(blob)
+    header_bytes = json.dumps(header).encode('utf-8')
+    return _HEADER.pack(len(header_bytes)) + header_bytes + b''.join(blobs)
+
+
+def read_chunk(path, columns):
+    """Đọc và giải nén các cột cần dùng của một file khối"""
+    with open(path, 'rb') as f:
+        (header_size,) = _HEADER.unpack(f.read(_HEADER.size))
+        header = json.loads(f.read(header_size))
+        base = _HEADER.size + header_size
+        result = {}
+        for name in columns:
+            spec = header['columns'][name]
+            f.seek(base + spec['offset'])
+            result[name] = decode_column(spec, f.read(spec['length']), header['rows'])
+        return result
@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Kho dữ liệu nến (kline) lưu trên đĩa
+- Lưu dạng cột, mỗi (symbol, interval) là một phân vùng riêng
+- Chỉ ghi thêm các nến đã đóng sau close_time cuối cùng đã lưu
+- Đọc theo số nến gần nhất hoặc theo khoảng thời gian
+- Một tiến trình ghi (khoá file), nhiều tiến trình đọc không cần khoá qua memory-map:
+  meta.json là điểm commit, phần đã commit của file cột không bao giờ bị ghi đè
+- Nến cũ có thể được nén thành các khối (utils.kline_codec), chỉ phần gần nhất giữ dạng cột thô:
+  python -m utils.kline_store [--retention-days N] [--hot-rows N]
+- merge() (vd: vá lỗ hổng) chỉ ghi lại khối nén/phần cột thô có nến chen vào;
+  mỗi khối nhớ thế hệ file của nó, compact() gom lại thành các khối đều nhau
+"""
+
+import argparse
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khoá giữa các thread trong cùng tiến trình
+    fcntl = None
+
+from utils.intervals import now_ms
+from utils.kline_codec import CHUNK_ROWS, encode_chunk, read_chunk
+
+# Các trường số của payload kline Binance (bỏ cột 'ignore'), theo đúng thứ tự
+KLINE_FIELDS = [
+    ('timestamp', np.int64),
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+    ('volume', np.float64),
+    ('close_time', np.int64),
+    ('quote_asset_volume', np.float64),
+    ('number_of_trades', np.int64),
+    ('taker_buy_base', np.float64),
+    ('taker_buy_quote', np.float64),
+]
+KLINE_DTYPES = dict(KLINE_FIELDS)
+KLINE_COLUMNS = [name for name, _ in KLINE_FIELDS]
+# Vị trí của từng trường trong một kline thô
+KLINE_INDEX = {name: i for i, name in enumerate(KLINE_COLUMNS)}
+# Các cột mà chiến lược/backtest thực sự dùng
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+# Một dòng kline dạng structured array (dùng khi cần gộp thành một mảng duy nhất)
+KLINE_DTYPE = np.dtype(KLINE_FIELDS)
+
+DEFAULT_STORE_DIR = os.getenv("KLINE_STORE_DIR", os.path.join("data", "klines"))
+# Số nến gần nhất giữ dạng cột thô khi nén (bot đọc phần này qua memory-map, không giải nén)
+DEFAULT_HOT_ROWS = 20_000
+
+
+def decode_klines(klines, columns=None, float_dtype=np.float64):
+    """
+    Giải mã kline thô (list chuỗi/số của Binance) thẳng vào mảng NumPy có kiểu
+    - Mỗi cột được cấp phát đúng một lần với đủ số phần tử, không qua mảng object
+    - columns: chỉ giải mã các cột cần dùng (mặc định tất cả KLINE_COLUMNS)
+    - float_dtype: np.float64 hoặc np.float32 cho các cột giá/khối lượng
+    """
+    columns = KLINE_COLUMNS if columns is None else columns
+    count = len(klines)
+    result = {}
+    for name in columns:
+        dtype = KLINE_DTYPES[name]
+        if dtype is np.float64:
+            dtype = float_dtype
+        i = KLINE_INDEX[name]
+        result[name] = np.fromiter((k[i] for k in klines), dtype=dtype, count=count)
+    return result
+
+
+def klines_to_columns(klines):
+    """Chuyển danh sách kline thô của Binance thành dict cột NumPy"""
+    return decode_klines(klines)
+
+
+def columns_to_df(columns):
+    """DataFrame bọc trực tiếp các mảng cột (không sao chép dữ liệu)"""
+    return pd.DataFrame(columns, copy=False)
+
+
+def klines_to_array(klines):
+    """Chuyển danh sách kline thô thành structured array KLINE_DTYPE"""
+    columns = klines_to_columns(klines)
+    result = np.empty(len(columns['timestamp']), dtype=KLINE_DTYPE)
+    for name in KLINE_COLUMNS:
+        result[name] = columns[name]
+    return result
+
+
+def _merge_rows(existing, incoming):
+    """
+    Gộp hai dict cột đã sắp xếp theo timestamp (dữ liệu đã có được ưu tiên khi trùng)
+    Trả về (dict cột đã gộp, số nến thêm vào)
+    """
+    new = ~np.isin(incoming['timestamp'], existing['timestamp'])
+    count = int(new.sum())
+    if count == 0:
+        return existing, 0
+    merged = {
+        name: np.concatenate((existing[name], incoming[name][new])).astype(dtype)
+        for name, dtype in KLINE_FIELDS
+    }
+    order = np.argsort(merged['timestamp'], kind='stable')
+    return {name: values[order] for name, values in merged.items()}, count
+
+
+def _as_columns(klines):
+    """Chấp nhận dict cột, structured array hoặc danh sách kline thô"""
+    if isinstance(klines, dict):
+        return klines
+    if isinstance(klines, np.ndarray) and klines.dtype.names:
+        return {name: klines[name] for name in KLINE_COLUMNS}
+    return klines_to_columns(klines)
+
+
+class KlineStore:
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._maps = {}  # (symbol, interval, column) -> (generation, np.memmap)
+
+    # --- Đường dẫn & metadata ---
+
+    def _partition_dir(self, symbol, interval):
+        return os.path.join(self.root, symbol.upper(), interval)
+
+    def _column_path(self, symbol, interval, column, generation):
+        return os.path.join(self._partition_dir(symbol, interval), f"{column}.{generation}.bin")
+
+    def _chunk_path(self, symbol, interval, generation, index):
+        return os.path.join(self._partition_dir(symbol, interval), f"chunk.{generation}.{index}.bin")
+
+    @staticmethod
+    def _hot_generation(meta):
+        """Thế hệ file của phần cột thô (merge có thể chỉ ghi lại các khối nén)"""
+        return meta.get('hot_generation', meta['generation'])
+
+    def _chunk_file(self, symbol, interval, meta, index):
+        """Đường dẫn khối nén thứ `index` (khối được merge ghi lại mang thế hệ riêng)"""
+        chunk = meta['chunks'][index]
+        generation = chunk[3] if len(chunk) > 3 else meta['generation']
+        return self._chunk_path(symbol, interval, generation, index)
+
+    def _partition_files(self, symbol, interval, meta):
+        """Các file dữ liệu meta đang dùng"""
+        paths = [self._column_path(symbol, interval, name, self._hot_generation(meta)) for name in KLINE_COLUMNS]
+        paths += [self._chunk_file(symbol, interval, meta, index) for index in range(len(meta.get('chunks', [])))]
+        return paths
+
+    @staticmethod
+    def _remove_files(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Đã bị xoá, hoặc (Windows) còn tiến trình đọc đang map file
+
+    def _load_meta(self, symbol, interval):
+        path = os.path.join(self._partition_dir(symbol, interval), "meta.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save_meta(self, symbol, interval, meta):
+        """Ghi metadata nguyên tử: người đọc chỉ thấy số dòng đã ghi xong"""
+        path = os.path.join(self._partition_dir(symbol, interval), "meta.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @contextmanager
+    def _writer_lock(self, symbol, interval):
+        """Khoá ghi cho một phân vùng: giữa các thread và giữa các tiến trình"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            partition_dir = self._partition_dir(symbol, interval)
+            os.makedirs(partition_dir, exist_ok=True)
+            with open(os.path.join(partition_dir, ".lock"), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def partitions(self):
+        """Danh sách (symbol, interval) đang có trong kho"""
+        result = []
+        if not os.path.isdir(self.root):
+            return result
+        for symbol in sorted(os.listdir(self.root)):
+            symbol_dir = os.path.join(self.root, symbol)
+            if not os.path.isdir(symbol_dir):
+                continue
+            for interval in sorted(os.listdir(symbol_dir)):
+                if os.path.exists(os.path.join(symbol_dir, interval, "meta.json")):
+                    result.append((symbol, interval))
+        return result
+
+    def disk_usage(self, symbol, interval):
+        """Dung lượng (byte) phân vùng đang chiếm trên đĩa"""
+        partition_dir = self._partition_dir(symbol, interval)
+        return sum(entry.stat().st_size for entry in os.scandir(partition_dir) if entry.is_file())
+
+    def rows(self, symbol, interval):
+        """Số nến đã lưu"""
+        meta = self._load_meta(symbol, interval)
+        return meta['rows'] if meta else 0
+
+    def last_close_time(self, symbol, interval):
+        """close_time của nến cuối cùng đã lưu (None nếu chưa có dữ liệu)"""
+        meta = self._load_meta(symbol, interval)
+        return meta['last_close_time'] if meta and meta['rows'] else None
+
+    def first_open_time(self, symbol, interval):
+        """Thời điểm mở của nến đầu tiên đã lưu"""
+        meta = self._load_meta(symbol, interval)
+        return meta['first_open_time'] if meta and meta['rows'] else None
+
+    # --- Ghi ---
+
+    def append(self, symbol, interval, klines, now=None):
+        """
+        Ghi thêm các nến đã đóng và mới hơn close_time cuối cùng
+        Trả về số nến được ghi
+        """
+        columns = _as_columns(klines)
+        now = now_ms() if now is None else now
+
+        with self._writer_lock(symbol, interval):
+            meta = self._load_meta(symbol, interval)
+            last_close = meta['last_close_time'] if meta and meta['rows'] else None
+
+            mask = columns['close_time'] < now
+            if last_close is not None:
+                mask &= columns['close_time'] > last_close
+            if not mask.any():
+                return 0
+
+            order = np.argsort(columns['timestamp'][mask], kind='stable')
+            new = {name: columns[name][mask][order] for name in KLINE_COLUMNS}
+            # Bỏ nến trùng timestamp trong cùng một lô
+            keep = np.concatenate(([True], np.diff(new['timestamp']) > 0))
+            new = {name: values[keep] for name, values in new.items()}
+
+            if meta is None:
+                os.makedirs(self._partition_dir(symbol, interval), exist_ok=True)
+                meta = {'rows': 0, 'generation': 0}
+            if not meta['rows']:
+                meta['first_open_time'] = int(new['timestamp'][0])
+            # Nến mới luôn ghi vào phần cột thô, sau các khối đã nén
+            hot_rows = meta['rows'] - meta.get('cold_rows', 0)
+
+            for name, dtype in KLINE_FIELDS:
+                path = self._column_path(symbol, interval, name, self._hot_generation(meta))
+                with open(path, 'ab') as f:
+                    # Cắt phần ghi dở của lần ghi trước (nếu bị ngắt giữa chừng)
+                    f.truncate(hot_rows * np.dtype(dtype).itemsize)
+                    f.write(np.ascontiguousarray(new[name], dtype=dtype).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            meta['rows'] += len(new['timestamp'])
+            meta['last_close_time'] = int(new['close_time'][-1])
+            self._save_meta(symbol, interval, meta)
+            return len(new['timestamp'])
+
+    def merge(self, symbol, interval, klines, now=None):
+        """
+        Gộp nến đã đóng ở bất kỳ vị trí nào (vd: lịch sử cũ hơn dữ liệu đã lưu, nến vá lỗ hổng)
+        Chỉ ghi lại các khối nén/phần cột thô có nến chen vào, dữ liệu đã lưu được ưu tiên khi trùng
+        Trả về số nến được thêm
+        """
+        columns = _as_columns(klines)
+        now = now_ms() if now is None else now
+        mask = columns['close_time'] < now
+        incoming = {name: np.asarray(columns[name][mask], dtype=dtype) for name, dtype in KLINE_FIELDS}
+        # Sắp xếp, bỏ nến trùng timestamp trong cùng một lô
+        _, first_idx = np.unique(incoming['timestamp'], return_index=True)
+        incoming = {name: values[first_idx] for name, values in incoming.items()}
+        if len(first_idx) == 0:
+            return 0
+
+        with self._writer_lock(symbol, interval):
+            meta = self._load_meta(symbol, interval)
+            if not meta or not meta['rows']:
+                self._write_generation(symbol, interval, meta, incoming, 0)
+                return len(first_idx)
+            return self._splice(symbol, interval, meta, incoming)
+
+    def _splice(self, symbol, interval, meta, incoming):
+        """Chèn các nến mới vào đúng khối nén hoặc phần cột thô chứa chúng, sang thế hệ file mới"""
+        generation = meta['generation'] + 1
+        # Khối/phần cột thô không bị ghi lại vẫn trỏ tới file của thế hệ cũ
+        chunks = [chunk[:3] + [chunk[3] if len(chunk) > 3 else meta['generation']] for chunk in meta.get('chunks', [])]
+        cold_rows = meta.get('cold_rows', 0)
+        # Khối đầu tiên có nến cuối >= timestamp (nến cũ hơn mọi dữ liệu vào khối 0); sau khối cuối là phần cột thô
+        last_times = np.array([chunk[1] for chunk in chunks], dtype=np.int64)
+        targets = np.searchsorted(last_times, incoming['timestamp'], side='left')
+
+        new_meta = dict(meta, generation=generation, chunks=chunks, hot_generation=self._hot_generation(meta))
+        added = 0
+        replaced = []
+        for index in np.unique(targets).tolist():
+            rows = {name: values[targets == index] for name, values in incoming.items()}
+            if index < len(chunks):
+                path = self._chunk_file(symbol, interval, meta, index)
+                merged, count = _merge_rows(read_chunk(path, KLINE_COLUMNS), rows)
+                if count == 0:
+                    continue
+                self._write_chunk(self._chunk_path(symbol, interval, generation, index), merged)
+                timestamps = merged['timestamp']
+                chunks[index] = [int(timestamps[0]), int(timestamps[-1]), len(timestamps), generation]
+                replaced.append(path)
+            else:
+                hot = self._read_columns(symbol, interval, meta, KLINE_COLUMNS, cold_rows)
+                merged, count = _merge_rows(hot, rows)
+                if count == 0:
+                    continue
+                self._write_hot(symbol, interval, generation, merged)
+                new_meta['hot_generation'] = generation
+                replaced += [self._column_path(symbol, interval, name, self._hot_generation(meta))
+                             for name in KLINE_COLUMNS]
+            added += count
+        if added == 0:
+            return 0
+
+        new_meta['rows'] = meta['rows'] + added
+        new_meta['cold_rows'] = sum(chunk[2] for chunk in chunks)
+        new_meta['first_open_time'] = min(meta['first_open_time'], int(incoming['timestamp'][0]))
+        new_meta['last_close_time'] = max(meta['last_close_time'], int(incoming['close_time'].max()))
+        self._save_meta(symbol, interval, new_meta)
+        self._remove_files(replaced)
+        return added
+
+    def compact(self, symbol, interval, hot_rows=DEFAULT_HOT_ROWS, retention_ms=None, now=None):
+        """
+        Nén các nến cũ thành khối CHUNK_ROWS nến, giữ `hot_rows` nến gần nhất dạng cột thô
+        retention_ms: bỏ các nến mở trước now - retention_ms
+        Trả về số nến còn lại
+        """
+        now = now_ms() if now is None else now
+        with self._writer_lock(symbol, interval):
+            meta = self._load_meta(symbol, interval)
+            if meta is None:
+                return 0
+            columns = self._read_columns(symbol, interval, meta, KLINE_COLUMNS)
+            if retention_ms is not None:
+                keep = columns['timestamp'] >= now - retention_ms
+                columns = {name: values[keep] for name, values in columns.items()}
+            rows = len(columns['timestamp'])
+            cold_rows = max(0, rows - hot_rows) // CHUNK_ROWS * CHUNK_ROWS
+            self._write_generation(symbol, interval, meta, columns, cold_rows)
+            return rows
+
+    def _write_generation(self, symbol, interval, meta, columns, cold_rows):
+        """
+        Ghi toàn bộ phân vùng sang thế hệ file mới: `cold_rows` nến đầu thành các khối nén,
+        phần còn lại dạng cột thô; đổi meta rồi mới xoá thế hệ cũ (người đọc đọc lại meta)
+        """
+        generation = meta['generation'] + 1 if meta else 0
+        timestamps = columns['timestamp']
+        os.makedirs(self._partition_dir(symbol, interval), exist_ok=True)
+
+        chunks = []
+        for index, start in enumerate(range(0, cold_rows, CHUNK_ROWS)):
+            stop = min(start + CHUNK_ROWS, cold_rows)
+            chunk = {name: np.asarray(columns[name][start:stop], dtype=dtype) for name, dtype in KLINE_FIELDS}
+            self._write_chunk(self._chunk_path(symbol, interval, generation, index), chunk)
+            chunks.append([int(timestamps[start]), int(timestamps[stop - 1]), stop - start])
+
+        self._write_hot(symbol, interval, generation, {name: columns[name][cold_rows:] for name in KLINE_COLUMNS})
+
+        rows = len(timestamps)
+        self._save_meta(symbol, interval, {
+            'rows': rows,
+            'generation': generation,
+            'first_open_time': int(timestamps[0]) if rows else None,
+            'last_close_time': int(columns['close_time'][-1]) if rows else None,
+            'cold_rows': cold_rows,
+            'chunks': chunks,
+        })
+
+        if meta is not None:
+            self._remove_files(self._partition_files(symbol, interval, meta))
+
+    @staticmethod
+    def _write_chunk(path, chunk):
+        with open(path, 'wb') as f:
+            f.write(encode_chunk(chunk))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_hot(self, symbol, interval, generation, columns):
+        """Ghi phần cột thô sang file của thế hệ `generation`"""
+        for name, dtype in KLINE_FIELDS:
+            path = self._column_path(symbol, interval, name, generation)
+            with open(path, 'wb') as f:
+                f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+    # --- Đọc ---
+
+    def _column_map(self, symbol, interval, name, meta):
+        """memmap chỉ đọc của cả file cột (dùng lại tới khi file có thêm dòng đã commit)"""
+        key = (symbol.upper(), interval, name)
+        entry = self._maps.get(key)
+        hot_rows = meta['rows'] - meta.get('cold_rows', 0)
+        generation = self._hot_generation(meta)
+        if entry is None or entry[0] != generation or len(entry[1]) < hot_rows:
+            dtype = np.dtype(KLINE_DTYPES[name])
+            path = self._column_path(symbol, interval, name, generation)
+            # Bỏ phần byte ghi dở ở cuối file (chưa được commit trong meta)
+            length = os.path.getsize(path) // dtype.itemsize
+            entry = (generation, np.memmap(path, dtype=dtype, mode='r', shape=(length,)))
+            self._maps[key] = entry
+        return entry[1]
+
+    def _read_columns(self, symbol, interval, meta, columns, start_row=0, stop_row=None):
+        """
+        Các dòng [start_row, stop_row) đã commit
+        Phần cột thô trả về view zero-copy (memmap, chỉ đọc); phần nằm trong khối nén được giải nén
+        """
+        if not meta or meta['rows'] == 0:
+            return {name: np.empty(0, dtype=KLINE_DTYPES[name]) for name in columns}
+        stop_row = meta['rows'] if stop_row is None else min(stop_row, meta['rows'])
+        start_row = min(max(0, start_row), stop_row)
+        cold_rows = meta.get('cold_rows', 0)
+
+        hot_start, hot_stop = max(start_row, cold_rows) - cold_rows, max(stop_row, cold_rows) - cold_rows
+        hot = {
+            name: self._column_map(symbol, interval, name, meta)[hot_start:hot_stop]
+            if hot_stop > hot_start else np.empty(0, dtype=KLINE_DTYPES[name])
+            for name in columns
+        }
+        if start_row >= cold_rows:
+            return hot
+
+        parts = self._read_chunks(symbol, interval, meta, columns, start_row, min(stop_row, cold_rows))
+        result = {}
+        for name in columns:
+            result[name] = np.concatenate(parts[name] + [hot[name]])
+            result[name].flags.writeable = False
+        return result
+
+    def _read_chunks(self, symbol, interval, meta, columns, start_row, stop_row):
+        """Giải nén đúng các khối chứa dòng [start_row, stop_row), trả về {cột: [mảng...]}"""
+        parts = {name: [] for name in columns}
+        offset = 0
+        for index, (_, _, rows, *_) in enumerate(meta['chunks']):
+            if offset + rows > start_row and offset < stop_row:
+                path = self._chunk_file(symbol, interval, meta, index)
+                chunk = read_chunk(path, columns)
+                for name in columns:
+                    parts[name].append(chunk[name][max(start_row - offset, 0):stop_row - offset])
+            offset += rows
+        return parts
+
+    def _search_row(self, symbol, interval, meta, timestamp):
+        """Vị trí dòng đầu tiên có timestamp >= `timestamp` (giải nén tối đa một khối)"""
+        cold_rows = meta.get('cold_rows', 0)
+        offset = 0
+        for index, (first, last, rows, *_) in enumerate(meta.get('chunks', [])):
+            if timestamp <= first:
+                return offset
+            if timestamp <= last:
+                path = self._chunk_file(symbol, interval, meta, index)
+                timestamps = read_chunk(path, ['timestamp'])['timestamp']
+                return offset + int(np.searchsorted(timestamps, timestamp, side='left'))
+            offset += rows
+        timestamps = self._read_columns(symbol, interval, meta, ['timestamp'], cold_rows)['timestamp']
+        return cold_rows + int(np.searchsorted(timestamps, timestamp, side='left'))
+
+    def mmap_columns(self, symbol, interval, limit=None, start=None, end=None, columns=None):
+        """
+        Dict cột NumPy (memmap chỉ đọc, không sao chép) của nến đã lưu
+        - limit: số nến gần nhất
+        - start/end: khoảng thời gian mở nến (ms, end không bao gồm)
+        Mọi tiến trình có thể gọi đồng thời, không cần khoá: chỉ đọc phần đã commit trong meta
+        """
+        columns = KLINE_COLUMNS if columns is None else list(columns)
+        for attempt in range(3):
+            meta = self._load_meta(symbol, interval)
+            try:
+                return self._slice_columns(symbol, interval, meta, columns, limit, start, end)
+            except FileNotFoundError:
+                # merge() vừa chuyển sang thế hệ file mới: đọc lại meta
+                if attempt == 2:
+                    raise
+
+    def _slice_columns(self, symbol, interval, meta, columns, limit, start, end):
+        rows = meta['rows'] if meta else 0
+        start_row, stop_row = 0, rows
+        if rows and start is not None:
+            start_row = self._search_row(symbol, interval, meta, start)
+        if rows and end is not None:
+            stop_row = self._search_row(symbol, interval, meta, end)
+        if limit is not None:
+            start_row = max(start_row, stop_row - limit)
+        return self._read_columns(symbol, interval, meta, columns, start_row, stop_row)
+
+    def read(self, symbol, interval, limit=None, start=None, end=None, columns=None):
+        """
+        Đọc nến đã lưu thành DataFrame (bọc memmap, không sao chép)
+        - limit: số nến gần nhất
+        - start/end: khoảng thời gian mở nến (ms, end không bao gồm)
+        """
+        return columns_to_df(self.mmap_columns(symbol, interval, limit, start, end, columns))
+
+    def read_range(self, symbol, interval, start=None, end=None, columns=None):
+        """Đọc nến theo khoảng thời gian [start, end)"""
+        return self.read(symbol, interval, start=start, end=end, columns=columns)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nén và dọn dữ liệu cũ trong kho nến")
+    parser.add_argument('--symbols', nargs='*')
+    parser.add_argument('--intervals', nargs='*')
+    parser.add_argument('--hot-rows', type=int, default=DEFAULT_HOT_ROWS,
+                        help="Số nến gần nhất giữ dạng cột thô")
+    parser.add_argument('--retention-days', type=float, help="Xoá nến cũ hơn số ngày này")
+    args = parser.parse_args()
+
+    store = KlineStore()
+    retention_ms = None if args.retention_days is None else int(args.retention_days * 86_400_000)
+    total_before = total_after = 0
+    print("🗜️ NÉN KHO DỮ LIỆU NẾN")
+    for symbol, interval in store.partitions():
+        if (args.symbols and symbol not in args.symbols) or (args.intervals and interval not in args.intervals):
+            continue
+        rows_before, size_before = store.rows(symbol, interval), store.disk_usage(symbol, interval)
+        rows_after = store.compact(symbol, interval, args.hot_rows, retention_ms)
+        size_after = store.disk_usage(symbol, interval)
+        total_before += size_before
+        total_after += size_after
+        print(f"✅ {symbol} ({interval}): {rows_before} → {rows_after} nến, "
+              f"{size_before / 1048576:.2f} → {size_after / 1048576:.2f} MB")
+    print(f"📊 Tổng: {total_before / 1048576:.2f} → {total_after / 1048576:.2f} MB")
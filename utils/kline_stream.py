@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nhận dữ liệu nến realtime qua WebSocket của Binance
+- Đăng ký kline stream cho tất cả symbol/interval cấu hình
+- Giữ cửa sổ nến gần nhất của từng cặp trong bộ nhớ
+- Đánh dấu nến đã đóng khi sàn chốt nến (k.x = true) và ghi vào KlineStore
+- Nến bị lỡ khi mất kết nối (sau reconnect hoặc khi nến mới cách nến cuối hơn một interval):
+  cửa sổ bị đánh dấu chưa sẵn sàng (is_ready() = False) và được tải bù qua `backfill` trong thread
+  riêng (không chặn event loop đang nhận message/ping); tải bù xong và cửa sổ liên tục thì sẵn sàng lại,
+  trong lúc đó người dùng có thể lấy qua REST và seed() lại
+- Có thể ghi lại message thô (JSONL) để phát lại offline bằng KlineReplayServer
+"""
+
+import asyncio
+import json
+import threading
+from collections import deque
+
+from websockets.asyncio.client import connect
+
+from utils.intervals import interval_to_ms
+from utils.kline_store import OHLCV_COLUMNS, columns_to_df, decode_klines
+
+BINANCE_WS_URL = "wss://stream.binance.com:9443"
+
+
+def stream_name(symbol, interval):
+    """Tên kline stream theo quy ước Binance (vd: btcusdt@kline_5m)"""
+    return f"{symbol.lower()}@kline_{interval}"
+
+
+def kline_event_to_row(k):
+    """Chuyển payload 'k' của sự kiện kline thành một dòng theo KLINE_COLUMNS"""
+    return (int(k['t']), float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v']),
+            int(k['T']), float(k['q']), int(k['n']), float(k['V']), float(k['Q']))
+
+
+class KlineStream:
+    def __init__(self, symbols, intervals, window=200, base_url=BINANCE_WS_URL, store=None,
+                 record_path=None, on_close=None, backfill=None, max_streams_per_connection=200):
+        """
+        Args:
+            symbols, intervals: các cặp cần theo dõi
+            window: số nến giữ trong bộ nhớ cho mỗi cặp
+            base_url: WebSocket endpoint (đổi sang KlineReplayServer.url để chạy offline)
+            store: KlineStore để lưu các nến đã đóng (tuỳ chọn)
+            record_path: file JSONL ghi lại message thô (tuỳ chọn)
+            on_close: callback(symbol, interval, row) khi một nến đóng
+            backfill: hàm (symbol, interval, start_ms, end_ms) -> DataFrame OHLCV các nến đã đóng
+                trong [start_ms, end_ms), dùng để tải bù nến bị lỡ (vd: data_fetcher.get_klines_range)
+        """
+        self.pairs = [(symbol.upper(), interval) for symbol in symbols for interval in intervals]
+        self.window = window
+        self.base_url = base_url.rstrip('/')
+        self.store = store
+        self.record_path = record_path
+        self.on_close = on_close
+        self.backfill = backfill
+        self.max_streams_per_connection = max_streams_per_connection
+
+        self._windows = {pair: deque(maxlen=window) for pair in self.pairs}
+        self._last_closed = {pair: False for pair in self.pairs}
+        self._resync = set()  # Cặp vừa kết nối lại: kiểm tra nến bị lỡ ở message đầu tiên
+        self._stale = set()   # Cặp có lỗ hổng chưa tải bù xong
+        self._seeds = {}      # Số lần seed() mỗi cặp: bỏ kết quả tải bù của cửa sổ đã được nạp lại
+        self._lock = threading.Lock()
+        self._loop = None
+        self._task = None
+        self._thread = None
+        self._record_file = None
+
+    # --- Trạng thái cửa sổ ---
+
+    def seed(self, symbol, interval, df):
+        """Nạp cửa sổ ban đầu từ DataFrame REST (nến cuối có thể đang chạy)"""
+        rows = df[OHLCV_COLUMNS].itertuples(index=False, name=None)
+        with self._lock:
+            window = self._windows.setdefault((symbol.upper(), interval), deque(maxlen=self.window))
+            window.clear()
+            window.extend(rows)
+            self._last_closed[(symbol.upper(), interval)] = False
+            self._resync.discard((symbol.upper(), interval))
+            self._stale.discard((symbol.upper(), interval))
+            self._seeds[(symbol.upper(), interval)] = self._seeds.get((symbol.upper(), interval), 0) + 1
+
+    def is_ready(self, symbol, interval):
+        """Cửa sổ có dữ liệu và liên tục (không còn nến bị lỡ chưa tải bù)"""
+        pair = (symbol.upper(), interval)
+        return pair not in self._stale and len(self._windows.get(pair, ())) > 0
+
+    def get_df(self, symbol, interval):
+        """Bản sao DataFrame của cửa sổ hiện tại (None nếu chưa có dữ liệu)"""
+        with self._lock:
+            rows = list(self._windows.get((symbol.upper(), interval), ()))
+        if not rows:
+            return None
+        return columns_to_df(decode_klines(rows, OHLCV_COLUMNS))
+
+    def last_candle_closed(self, symbol, interval):
+        """Nến cuối trong cửa sổ đã được sàn chốt hay chưa"""
+        return self._last_closed.get((symbol.upper(), interval), False)
+
+    def handle_message(self, message):
+        """Xử lý một message kline (combined stream hoặc payload trực tiếp)"""
+        if isinstance(message, (str, bytes)):
+            if self._record_file is not None:
+                self._record_file.write(message if isinstance(message, str) else message.decode())
+                self._record_file.write("\n")
+            message = json.loads(message)
+        data = message.get('data', message)
+        if data.get('e') != 'kline':
+            return
+
+        k = data['k']
+        pair = (k['s'].upper(), k['i'])
+        row = kline_event_to_row(k)
+        closed = bool(k['x'])
+        # Cửa sổ chỉ giữ timestamp + OHLCV, dòng đầy đủ được ghi vào kho
+        window_row = row[:len(OHLCV_COLUMNS)]
+
+        with self._lock:
+            window = self._windows.get(pair)
+            if window is None:
+                return
+            missing_from = None
+            if window and row[0] > window[-1][0]:
+                if pair in self._resync or row[0] - window[-1][0] > interval_to_ms(pair[1]):
+                    # Nến cuối trong cửa sổ có thể chưa nhận bản chốt: tải lại từ nến đó
+                    missing_from = window[-1][0]
+                self._resync.discard(pair)
+            if missing_from is not None:
+                self._stale.add(pair)
+                seed = self._seeds.get(pair, 0)
+        if missing_from is not None:
+            self._schedule_fill(pair, missing_from, row[0], seed)
+
+        with self._lock:
+            window = self._windows.get(pair)
+            if window is None:
+                return
+            if window and window[-1][0] == row[0]:
+                window[-1] = window_row
+            elif not window or row[0] > window[-1][0]:
+                window.append(window_row)
+            else:
+                return  # Sự kiện của nến cũ hơn cửa sổ hiện tại
+            self._last_closed[pair] = closed
+
+        if closed:
+            if self.store is not None:
+                try:
+                    self.store.append(pair[0], pair[1], [row])
+                except Exception as e:
+                    print(f"⚠️ Lỗi lưu nến {pair[0]} ({pair[1]}): {e}")
+            if self.on_close is not None:
+                self.on_close(pair[0], pair[1], row)
+
+    def _schedule_fill(self, pair, start_ms, end_ms, seed):
+        """Tải bù trong thread của executor nếu đang chạy trên event loop, ngược lại (vd: phát lại) gọi trực tiếp"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            self._fill_missing(pair, start_ms, end_ms, seed)
+        else:
+            loop.run_in_executor(None, self._fill_missing, pair, start_ms, end_ms, seed)
+
+    def _fill_missing(self, pair, start_ms, end_ms, seed):
+        """
+        Tải bù các nến [start_ms, end_ms) bị lỡ và chèn vào cửa sổ (các nến mới hơn đã nhận được giữ nguyên)
+        Cửa sổ chỉ sẵn sàng lại khi đã liên tục; thiếu dữ liệu thì giữ trạng thái chờ seed() lại
+        """
+        rows = None
+        if self.backfill is not None:
+            try:
+                df = self.backfill(pair[0], pair[1], start_ms, end_ms)
+                if df is not None:
+                    rows = list(df[OHLCV_COLUMNS].itertuples(index=False, name=None))
+            except Exception as e:
+                print(f"⚠️ Lỗi tải bù nến {pair[0]} ({pair[1]}): {e}")
+
+        step = interval_to_ms(pair[1])
+        complete = rows is not None and [int(r[0]) for r in rows] == list(range(start_ms, end_ms, step))
+        with self._lock:
+            if self._seeds.get(pair, 0) != seed:
+                return  # Cửa sổ đã được seed() lại trong lúc tải bù
+            if not complete:
+                print(f"⚠️ {pair[0]} ({pair[1]}): thiếu nến sau khi mất kết nối, cần nạp lại cửa sổ")
+                return
+            window = self._windows[pair]
+            before = [r for r in window if r[0] < start_ms]
+            after = [r for r in window if r[0] >= end_ms]
+            window.clear()
+            window.extend(before + rows + after)
+            timestamps = [int(r[0]) for r in window]
+            if all(b - a == step for a, b in zip(timestamps, timestamps[1:])):
+                self._stale.discard(pair)
+
+    # --- Kết nối ---
+
+    def _stream_groups(self):
+        names = [stream_name(symbol, interval) for symbol, interval in self.pairs]
+        size = self.max_streams_per_connection
+        return [names[i:i + size] for i in range(0, len(names), size)]
+
+    async def _run_connection(self, streams):
+        pairs = [pair for pair in self.pairs if stream_name(*pair) in streams]
+        url = f"{self.base_url}/stream?streams={'/'.join(streams)}"
+        delay = 1
+        connected = False
+        while True:
+            try:
+                async with connect(url) as websocket:
+                    delay = 1
+                    if connected:
+                        # Kết nối lại: nến đóng trong lúc mất kết nối được tải bù ở message kế tiếp
+                        with self._lock:
+                            self._resync.update(pairs)
+                    connected = True
+                    async for message in websocket:
+                        self.handle_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Mất kết nối kline stream: {e} - thử lại sau {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    async def _run(self):
+        await asyncio.gather(*(self._run_connection(group) for group in self._stream_groups()))
+
+    def start(self):
+        """Chạy các kết nối WebSocket trong thread nền"""
+        if self._thread is not None:
+            return
+        if self.record_path:
+            self._record_file = open(self.record_path, 'a', encoding='utf-8')
+        self._loop = asyncio.new_event_loop()
+        self._task = self._loop.create_task(self._run())
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Dừng stream và đóng file ghi"""
+        if self._thread is None:
+            return
+
+        async def _shutdown():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(_shutdown(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._thread = self._loop = self._task = None
+        if self._record_file is not None:
+            self._record_file.close()
+            self._record_file = None
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Histogram độ trễ request theo endpoint
+- Bucket chia theo thang log (1ms tới 60s), thêm một mẫu O(log số bucket)
+- Phân vị (p50/p95/p99) đọc từ histogram, dùng làm mốc gửi request dự phòng (hedge)
+- Số đếm giảm một nửa sau mỗi `decay_every` mẫu để histogram bám theo độ trễ gần đây
+"""
+
+import bisect
+import threading
+
+# Cận trên các bucket (giây): 1ms * 1.25^k tới ~60s
+BUCKET_BOUNDS = [0.001 * 1.25 ** k for k in range(50)]
+
+
+class LatencyHistogram:
+    def __init__(self, decay_every=1000):
+        self.decay_every = decay_every
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.total = 0
+        self.samples = 0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+            self.total += 1
+            self.samples += 1
+            self.max = max(self.max, seconds)
+            if self.samples % self.decay_every == 0:
+                self.counts = [count // 2 for count in self.counts]
+                self.total = sum(self.counts)
+
+    def percentile(self, q):
+        """Cận trên của bucket chứa phân vị q (0-1), None nếu chưa có mẫu"""
+        with self._lock:
+            if self.total == 0:
+                return None
+            rank = q * self.total
+            seen = 0
+            for i, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank and count:
+                    return BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max
+            return self.max
+
+    def stats(self):
+        """Số mẫu và phân vị (ms)"""
+        result = {'count': self.samples, 'max_ms': round(self.max * 1000, 1)}
+        for name, q in (('p50_ms', 0.5), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+            value = self.percentile(q)
+            result[name] = None if value is None else round(value * 1000, 1)
+        return result
+
+
+class LatencyRecorder:
+    """Histogram theo tên endpoint, tạo khi dùng lần đầu (dùng chung giữa client đồng bộ và bất đồng bộ)"""
+
+    def __init__(self, min_samples=20, min_hedge_delay=0.05):
+        """
+        Args:
+            min_samples: số mẫu tối thiểu trước khi tính mốc hedge
+            min_hedge_delay: mốc hedge tối thiểu (giây)
+        """
+        self.min_samples = min_samples
+        self.min_hedge_delay = min_hedge_delay
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            return histogram
+
+    def observe(self, name, seconds):
+        self.get(name).observe(seconds)
+
+    def hedge_delay(self, name, q=0.95):
+        """Thời gian chờ trước khi gửi request dự phòng (p95), None nếu chưa đủ mẫu"""
+        histogram = self.get(name)
+        if histogram.total < self.min_samples:
+            return None
+        return max(self.min_hedge_delay, histogram.percentile(q))
+
+    def stats(self):
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {name: histogram.stats() for name, histogram in histograms.items()}
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ring buffer OHLCV dung lượng cố định cho mỗi (symbol, interval)
+- Mảng NumPy cấp phát một lần, thêm/cập nhật nến mới nhất là O(1)
+- Mỗi vị trí được ghi hai lần (i và i + capacity) nên N nến cuối luôn là
+  một lát cắt liên tục: column()/columns() trả về view chỉ đọc, không sao chép
+- View chỉ có hiệu lực tới lần ghi kế tiếp vào buffer (dùng ngay, không giữ lại)
+- to_df() sao chép cửa sổ: DataFrame giao cho người gọi không bị đổi khi buffer được ghi tiếp
+"""
+
+import numpy as np
+
+from utils.kline_store import OHLCV_COLUMNS, columns_to_df
+
+PRICE_COLUMNS = OHLCV_COLUMNS[1:]
+
+
+class OHLCVRingBuffer:
+    __slots__ = ('capacity', '_timestamps', '_values', '_end', '_size')
+
+    def __init__(self, capacity=500, dtype=np.float64):
+        self.capacity = capacity
+        self._timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self._values = np.zeros((len(PRICE_COLUMNS), 2 * capacity), dtype=dtype)
+        self._end = 0   # Vị trí (mod capacity) sẽ ghi nến tiếp theo
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        """Dung lượng vùng nhớ đã cấp phát (cố định)"""
+        return self._timestamps.nbytes + self._values.nbytes
+
+    @property
+    def last_timestamp(self):
+        """Thời điểm mở của nến mới nhất (None nếu rỗng)"""
+        if self._size == 0:
+            return None
+        return int(self._timestamps[self._end - 1 + self.capacity])
+
+    def copy(self):
+        """Bản sao độc lập (cùng dung lượng và dữ liệu)"""
+        clone = OHLCVRingBuffer.__new__(OHLCVRingBuffer)
+        clone.capacity = self.capacity
+        clone._timestamps = self._timestamps.copy()
+        clone._values = self._values.copy()
+        clone._end = self._end
+        clone._size = self._size
+        return clone
+
+    def clear(self):
+        """Xoá dữ liệu, giữ nguyên vùng nhớ đã cấp phát"""
+        self._end = 0
+        self._size = 0
+
+    def _write(self, pos, timestamp, values):
+        self._timestamps[pos] = self._timestamps[pos + self.capacity] = timestamp
+        self._values[:, pos] = self._values[:, pos + self.capacity] = values
+
+    def append(self, timestamp, open_, high, low, close, volume):
+        """Thêm nến mới, hoặc cập nhật nến cuối nếu trùng timestamp"""
+        values = (open_, high, low, close, volume)
+        last = self.last_timestamp
+        if last is not None and timestamp == last:
+            self._write((self._end - 1) % self.capacity, timestamp, values)
+            return
+        if last is not None and timestamp < last:
+            return  # Nến cũ hơn dữ liệu hiện có
+        self._write(self._end, timestamp, values)
+        self._end = (self._end + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def extend(self, columns):
+        """
+        Nạp nhiều nến (dict cột hoặc DataFrame theo OHLCV_COLUMNS)
+        Chỉ ghi các nến từ timestamp cuối trở đi, nến trùng timestamp được cập nhật
+        """
+        timestamps = np.asarray(columns['timestamp'], dtype=np.int64)
+        last = self.last_timestamp
+        start = 0 if last is None else int(np.searchsorted(timestamps, last, side='left'))
+        if start >= len(timestamps):
+            return
+        if last is not None and timestamps[start] == last:
+            values = [np.asarray(columns[name])[start] for name in PRICE_COLUMNS]
+            self._write((self._end - 1) % self.capacity, last, values)
+            start += 1
+
+        # Chỉ cần ghi `capacity` nến cuối của lô
+        start = max(start, len(timestamps) - self.capacity)
+        count = len(timestamps) - start
+        if count <= 0:
+            return
+        new_values = np.vstack([np.asarray(columns[name])[start:] for name in PRICE_COLUMNS])
+        positions = (self._end + np.arange(count)) % self.capacity
+        for offset in (0, self.capacity):
+            self._timestamps[positions + offset] = timestamps[start:]
+            self._values[:, positions + offset] = new_values
+        self._end = (self._end + count) % self.capacity
+        self._size = min(self._size + count, self.capacity)
+
+    def _window(self, array, limit):
+        limit = self._size if limit is None else min(limit, self._size)
+        stop = self._end + self.capacity
+        view = array[..., stop - limit:stop]
+        view.flags.writeable = False
+        return view
+
+    def column(self, name, limit=None):
+        """View chỉ đọc, liên tục của `limit` giá trị cuối một cột"""
+        if name == 'timestamp':
+            return self._window(self._timestamps, limit)
+        return self._window(self._values[PRICE_COLUMNS.index(name)], limit)
+
+    def columns(self, limit=None):
+        """Dict view của `limit` nến cuối theo OHLCV_COLUMNS"""
+        return {name: self.column(name, limit) for name in OHLCV_COLUMNS}
+
+    def to_df(self, limit=None):
+        """DataFrame bản sao của `limit` nến cuối (không đổi khi buffer được ghi tiếp)"""
+        return columns_to_df({name: values.copy() for name, values in self.columns(limit).items()})
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bảng OHLCV nhiều symbol căn theo cùng một lưới nến
+- Mảng 3 chiều symbol x thời gian x trường (open, high, low, close, volume) + mask nến có dữ liệu
+- Lưới thời gian chung theo interval, nến thiếu là NaN và mask = False
+- Thêm nến mới O(số symbol), cửa sổ trả về là view liên tục (ghi đôi như OHLCVRingBuffer)
+- Các phép tính chéo (lợi suất, biến động, tương quan) chạy một lần NumPy cho cả danh sách symbol
+"""
+
+import numpy as np
+
+from utils.intervals import candle_open_time, interval_to_ms
+from utils.ohlcv_buffer import PRICE_COLUMNS
+
+
+class OHLCVPanel:
+    def __init__(self, symbols, interval, capacity=200):
+        """
+        Args:
+            symbols: danh sách symbol (thứ tự hàng của bảng)
+            interval: khung nến của lưới thời gian
+            capacity: số nến giữ lại
+        """
+        self.symbols = [symbol.upper() for symbol in symbols]
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.interval = interval
+        self.step = interval_to_ms(interval)
+        self.capacity = capacity
+
+        self._timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self._values = np.full((len(self.symbols), 2 * capacity, len(PRICE_COLUMNS)), np.nan)
+        self._mask = np.zeros((len(self.symbols), 2 * capacity), dtype=bool)
+        self._end = 0   # Vị trí ghi kế tiếp trong [0, capacity)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def last_timestamp(self):
+        """Thời điểm mở của nến mới nhất trên lưới (None nếu rỗng)"""
+        if self._size == 0:
+            return None
+        return int(self._timestamps[self._end - 1 + self.capacity])
+
+    def clear(self):
+        self._values.fill(np.nan)
+        self._mask.fill(False)
+        self._end = self._size = 0
+
+    def _advance(self, timestamp):
+        """Mở rộng lưới tới nến `timestamp`, các nến mới chưa có dữ liệu"""
+        last = self.last_timestamp
+        if last is not None and timestamp <= last:
+            return
+        if last is None or timestamp - last >= self.capacity * self.step:
+            self.clear()
+            last = timestamp - self.step
+        count = (timestamp - last) // self.step
+        positions = (self._end + np.arange(count)) % self.capacity
+        for offset in (0, self.capacity):
+            self._timestamps[positions + offset] = last + self.step * np.arange(1, count + 1)
+            self._values[:, positions + offset] = np.nan
+            self._mask[:, positions + offset] = False
+        self._end = (self._end + count) % self.capacity
+        self._size = min(self._size + count, self.capacity)
+
+    def _extend_back(self, timestamp):
+        """Mở rộng lưới về quá khứ tới nến `timestamp` khi cửa sổ còn chỗ trống"""
+        first = self.last_timestamp - (self._size - 1) * self.step
+        count = min((first - timestamp) // self.step, self.capacity - self._size)
+        if count <= 0:
+            return
+        positions = (self._end - self._size - 1 - np.arange(count)) % self.capacity
+        for offset in (0, self.capacity):
+            self._timestamps[positions + offset] = first - self.step * np.arange(1, count + 1)
+            self._values[:, positions + offset] = np.nan
+            self._mask[:, positions + offset] = False
+        self._size += count
+
+    def _positions(self, timestamps):
+        """Vị trí ghi (trong [0, capacity)) của các nến, -1 nếu đã ra khỏi cửa sổ"""
+        back = (self.last_timestamp - timestamps) // self.step
+        return np.where(back < self._size, (self._end - 1 - back) % self.capacity, -1)
+
+    def update(self, symbol, timestamp, open_, high, low, close, volume):
+        """Ghi một nến của một symbol (nến mới hơn lưới sẽ mở rộng lưới)"""
+        self.extend(symbol, {
+            'timestamp': [timestamp], 'open': [open_], 'high': [high],
+            'low': [low], 'close': [close], 'volume': [volume],
+        })
+
+    def extend(self, symbol, columns):
+        """Ghi nhiều nến của một symbol (dict cột hoặc DataFrame theo OHLCV_COLUMNS)"""
+        row = self.index.get(symbol.upper())
+        timestamps = np.asarray(columns['timestamp'], dtype=np.int64)
+        if row is None or len(timestamps) == 0:
+            return
+        timestamps = candle_open_time(timestamps, self.interval)
+        self._advance(int(timestamps.max()))
+        self._extend_back(int(timestamps.min()))
+
+        positions = self._positions(timestamps)
+        keep = positions >= 0
+        positions = positions[keep]
+        values = np.column_stack([np.asarray(columns[name], dtype=np.float64)[keep] for name in PRICE_COLUMNS])
+        for offset in (0, self.capacity):
+            self._values[row, positions + offset] = values
+            self._mask[row, positions + offset] = True
+
+    # --- Đọc ---
+
+    def _window(self, array, limit, axis):
+        limit = self._size if limit is None else min(limit, self._size)
+        stop = self._end + self.capacity
+        view = array[(slice(None),) * axis + (slice(stop - limit, stop),)]
+        view.flags.writeable = False
+        return view
+
+    def timestamps(self, limit=None):
+        return self._window(self._timestamps, limit, 0)
+
+    def values(self, limit=None):
+        """Mảng (symbol, thời gian, trường) của `limit` nến cuối"""
+        return self._window(self._values, limit, 1)
+
+    def mask(self, limit=None):
+        """Mảng bool (symbol, thời gian): True nếu symbol có nến tại thời điểm đó"""
+        return self._window(self._mask, limit, 1)
+
+    def field(self, name, limit=None):
+        """Mảng (symbol, thời gian) của một trường (open/high/low/close/volume)"""
+        return self.values(limit)[:, :, PRICE_COLUMNS.index(name)]
+
+    # --- Tính toán chéo ---
+
+    def returns(self, limit=None):
+        """Log return (symbol, thời gian - 1), NaN nếu thiếu một trong hai nến"""
+        close = self.field('close', limit)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.diff(np.log(close), axis=1)
+
+    def volatility(self, limit=None):
+        """Độ lệch chuẩn log return của từng symbol (bỏ qua nến thiếu)"""
+        returns = self.returns(limit)
+        valid = ~np.isnan(returns)
+        count = valid.sum(axis=1)
+        filled = np.where(valid, returns, 0.0)
+        mean = filled.sum(axis=1) / np.maximum(count, 1)
+        variance = (np.where(valid, returns - mean[:, None], 0.0) ** 2).sum(axis=1) / np.maximum(count - 1, 1)
+        return np.where(count > 1, np.sqrt(variance), np.nan)
+
+    def correlation(self, limit=None, min_periods=20):
+        """
+        Ma trận tương quan log return giữa các symbol (symbol x symbol)
+        Mỗi cặp chỉ dùng các nến cả hai cùng có dữ liệu, NaN nếu ít hơn `min_periods` nến chung
+        """
+        returns = self.returns(limit)
+        valid = (~np.isnan(returns)).astype(np.float64)
+        x = np.where(valid > 0, returns, 0.0)
+
+        count = valid @ valid.T
+        sum_x = x @ valid.T          # [i, j]: tổng return của i trên các nến chung với j
+        sum_xx = (x * x) @ valid.T
+        sum_xy = x @ x.T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = count * sum_xy - sum_x * sum_x.T
+            var = (count * sum_xx - sum_x ** 2) * (count * sum_xx.T - sum_x.T ** 2)
+            corr = cov / np.sqrt(var)
+        corr[count < min_periods] = np.nan
+        return np.clip(corr, -1.0, 1.0)
+
+    def correlated_pairs(self, threshold=0.7, limit=None, min_periods=20):
+        """{symbol: [các symbol có tương quan >= threshold]} (None nếu chưa đủ dữ liệu)"""
+        corr = self.correlation(limit, min_periods)
+        np.fill_diagonal(corr, np.nan)
+        if np.isnan(corr).all():
+            return None
+        with np.errstate(invalid='ignore'):
+            linked = corr >= threshold
+        return {
+            symbol: [self.symbols[j] for j in np.flatnonzero(linked[i])]
+            for i, symbol in enumerate(self.symbols)
+        }
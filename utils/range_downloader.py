@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tải lịch sử nến theo khoảng thời gian (song song, có phân trang)
+- Chia khoảng [start, end) thành các trang đúng kích thước sàn cho phép
+- Tải các trang đồng thời, giới hạn weight do client (RateLimitedClient) đảm nhận
+- Ghép, loại trùng và sắp xếp kết quả thành một mảng duy nhất
+
+Kiểm tra chia trang, loại trùng và download_ranges với client giả: python -m utils.range_downloader
+"""
+
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.intervals import interval_to_ms
+from utils.kline_store import KLINE_DTYPE, klines_to_array
+
+
+class RangeDownloader:
+    def __init__(self, client, max_workers=8, page_size=1000):
+        """
+        Args:
+            client: đối tượng có get_klines(symbol, interval, startTime, endTime, limit),
+                    nên là RateLimitedClient để dùng chung ngân sách weight
+            max_workers: số request chạy đồng thời
+            page_size: số nến mỗi trang (tối đa 1000 với Binance)
+        """
+        self.client = client
+        self.max_workers = max_workers
+        self.page_size = page_size
+
+    def pages(self, interval, start_ms, end_ms):
+        """Chia [start_ms, end_ms) thành các trang (start, end) bao gồm hai đầu"""
+        step = interval_to_ms(interval)
+        first = -(-start_ms // step) * step  # làm tròn lên mốc mở nến
+        span = self.page_size * step
+        return [(t, min(t + span, end_ms) - 1) for t in range(first, end_ms, span)]
+
+    def _fetch_page(self, symbol, interval, page):
+        page_start, page_end = page
+        return self.client.get_klines(symbol=symbol, interval=interval, startTime=page_start,
+                                      endTime=page_end, limit=self.page_size)
+
+    @staticmethod
+    def _stitch(batches):
+        """Ghép các trang, loại nến trùng và sắp xếp theo thời gian mở"""
+        arrays = [klines_to_array(batch) for batch in batches if batch]
+        if not arrays:
+            return np.empty(0, dtype=KLINE_DTYPE)
+        merged = np.concatenate(arrays)
+        _, first_idx = np.unique(merged['timestamp'], return_index=True)
+        return merged[first_idx]
+
+    def download(self, symbol, interval, start_ms, end_ms):
+        """Tải toàn bộ nến trong [start_ms, end_ms) thành một structured array"""
+        return self.download_many([symbol], interval, start_ms, end_ms)[symbol]
+
+    def download_many(self, symbols, interval, start_ms, end_ms):
+        """Tải nhiều symbol dùng chung pool và ngân sách weight"""
+        pages = self.pages(interval, start_ms, end_ms)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                symbol: [executor.submit(self._fetch_page, symbol, interval, page) for page in pages]
+                for symbol in symbols
+            }
+            return {
+                symbol: self._stitch([future.result() for future in symbol_futures])
+                for symbol, symbol_futures in futures.items()
+            }
+
+    def download_ranges(self, symbol, interval, ranges):
+        """Tải nhiều khoảng [start, end) nhỏ của một symbol (vd: các lỗ hổng) trong một lượt song song"""
+        pages = [page for start_ms, end_ms in ranges for page in self.pages(interval, start_ms, end_ms)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._fetch_page, symbol, interval, page) for page in pages]
+            return self._stitch([future.result() for future in futures])
+
+
+class _StubKlineClient:
+    """
+    Client giả trả /klines theo quy ước Binance (startTime/endTime bao gồm hai đầu, tối đa `limit` nến)
+    overlap: số nến trả thêm sau endTime, mô phỏng các trang chồng lên nhau
+    """
+
+    def __init__(self, interval, overlap=0):
+        self.step = interval_to_ms(interval)
+        self.overlap = overlap
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def get_klines(self, symbol, interval, startTime, endTime, limit):
+        with self._lock:
+            self.requests.append((symbol, startTime, endTime))
+        first = -(-startTime // self.step) * self.step
+        stop = min(endTime + self.overlap * self.step, first + (limit + self.overlap - 1) * self.step)
+        return [[t, '1.0', '1.0', '1.0', '1.0', '1.0', t + self.step - 1, '1.0', 1, '1.0', '1.0', '0']
+                for t in range(first, stop + 1, self.step)]
+
+
+def validate_downloader():
+    """Chạy RangeDownloader trên client giả, trả về {tên kiểm tra: đạt hay không}"""
+    interval = '5m'
+    step = interval_to_ms(interval)
+    start = 1_700_000_000_000 // step * step
+    results = {}
+
+    # Mốc đầu lệch được làm tròn lên, các trang nối liền nhau, mỗi trang tối đa page_size nến
+    downloader = RangeDownloader(_StubKlineClient(interval), page_size=1000)
+    end = start + 2500 * step
+    pages = downloader.pages(interval, start - step // 2, end)
+    results['chia trang'] = (
+        pages[0][0] == start and pages[-1][1] == end - 1 and len(pages) == 3
+        and all(b[0] == a[1] + 1 for a, b in zip(pages, pages[1:]))
+        and all((page_end - page_start + 1) // step <= 1000 for page_start, page_end in pages)
+    )
+
+    # Trang chồng nhau: nến trùng bị loại, đủ đúng số nến của khoảng
+    client = _StubKlineClient(interval, overlap=3)
+    data = RangeDownloader(client, max_workers=4, page_size=1000).download('STUBUSDT', interval, start, end)
+    expected = np.arange(start, end + 3 * step, step)  # trang cuối trả thêm 3 nến sau end_ms
+    results['loại trùng'] = len(client.requests) == 3 and np.array_equal(data['timestamp'], expected)
+
+    # Nhiều khoảng chồng nhau và rời nhau của một symbol
+    client = _StubKlineClient(interval)
+    ranges = [(start, start + 100 * step), (start + 90 * step, start + 150 * step),
+              (start + 3000 * step, start + 3010 * step)]
+    data = RangeDownloader(client, page_size=1000).download_ranges('STUBUSDT', interval, ranges)
+    expected = np.concatenate((np.arange(start, start + 150 * step, step),
+                               np.arange(start + 3000 * step, start + 3010 * step, step)))
+    results['download_ranges'] = len(data) == 160 and np.array_equal(data['timestamp'], expected)
+
+    # Nhiều symbol dùng chung pool: mỗi symbol đủ nến của riêng nó
+    client = _StubKlineClient(interval)
+    data = RangeDownloader(client, page_size=400).download_many(['AUSDT', 'BUSDT'], interval, start, end)
+    results['download_many'] = (len(client.requests) == 2 * 7
+                                and all(len(values) == 2500 for values in data.values()))
+    return results
+
+
+def main():
+    argparse.ArgumentParser(description='Kiểm tra RangeDownloader với client giả').parse_args()
+    ok = True
+    for name, passed in validate_downloader().items():
+        ok &= passed
+        print(f"{'✅' if passed else '❌'} {name}")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
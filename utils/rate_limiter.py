@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Giới hạn request weight và thử lại cho Binance client
+- Token bucket theo weight (mặc định 1200 weight/phút), dùng chung giữa các thread
+- Đọc header x-mbx-used-weight-1m để tự giảm tốc khi IP còn bị dùng ở nơi khác
+- Gặp 429/418: tạm dừng toàn bộ theo Retry-After, thử lại với backoff mũ có jitter
+- Đếm request, retry, số lần bị giới hạn và thời gian chờ để theo dõi
+- Ngắt mạch theo endpoint khi lỗi tạm thời lặp lại (utils.circuit_breaker)
+- Ghi histogram độ trễ theo endpoint; request /klines chậm quá p95 được gửi thêm một bản dự phòng
+  (hedge), lấy phản hồi về trước, tổng thời gian mỗi lần gửi không vượt quá `timeout`
+- Mỗi lời gọi là đúng một request: các hàm tự phân trang của python-binance bị từ chối,
+  tải theo trang qua get_klines (utils.range_downloader) để mỗi trang được tính weight
+
+Kiểm tra thử lại/tạm dừng với client giả trả 429/418: python -m utils.rate_limiter
+"""
+
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from utils.circuit_breaker import CircuitBreakers
+from utils.latency import LatencyRecorder
+
+USED_WEIGHT_HEADER = 'x-mbx-used-weight-1m'
+RATE_LIMIT_STATUSES = (418, 429)
+
+
+def backoff_delay(attempt, base_delay=0.5, max_delay=60.0):
+    """Backoff mũ với full jitter: ngẫu nhiên trong [0, min(max_delay, base * 2^attempt)]"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def retry_after_seconds(headers):
+    """Giá trị Retry-After (giây) trong header, None nếu không có"""
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class WeightRateLimiter:
+    def __init__(self, weight_per_minute=1200, safety_margin=0.9):
+        """
+        Args:
+            weight_per_minute: giới hạn weight mỗi phút của sàn cho một IP
+            safety_margin: chỉ dùng tối đa tỷ lệ này của giới hạn
+        """
+        self.weight_per_minute = weight_per_minute
+        self.capacity = weight_per_minute * safety_margin
+        self.rate = self.capacity / 60.0  # weight hồi lại mỗi giây
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+        self.rate_limited = 0
+        self.banned = 0
+        self.used_weight = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, weight):
+        """
+        Giữ chỗ `weight` và trả về số giây cần chờ trước khi gửi request
+        Dùng được cho cả code đồng bộ (time.sleep) và asyncio (asyncio.sleep)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= weight
+            wait = max(0.0, -self._tokens / self.rate, self._paused_until - now)
+            self.requests += 1
+            if wait > 0:
+                self.throttled += 1
+                self.throttled_seconds += wait
+            return wait
+
+    def acquire(self, weight):
+        """Chờ (chặn thread) tới khi được phép gửi request có weight cho trước"""
+        wait = self.reserve(weight)
+        if wait > 0:
+            time.sleep(wait)
+
+    def observe(self, headers):
+        """Đồng bộ theo weight sàn báo đã dùng trong phút hiện tại"""
+        try:
+            used = int(headers.get(USED_WEIGHT_HEADER))
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self.used_weight = used
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, self.capacity - used)
+
+    def pause(self, seconds, status=429):
+        """Tạm dừng mọi request (sau khi nhận 429/418)"""
+        with self._lock:
+            if status == 418:
+                self.banned += 1
+            else:
+                self.rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = min(self._tokens, 0.0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'throttled_seconds': round(self.throttled_seconds, 3),
+                'rate_limited': self.rate_limited,
+                'banned': self.banned,
+                'used_weight': self.used_weight,
+                'weight_per_minute': self.weight_per_minute,
+            }
+
+
+class RateLimitedClient:
+    """
+    Bọc python-binance Client: mọi lời gọi đi qua WeightRateLimiter và được thử lại khi lỗi tạm thời
+    Các phương thức không khai báo weight dùng default_weight
+    """
+
+    # Weight của các endpoint hay dùng (theo tài liệu Binance Spot API)
+    WEIGHTS = {
+        'get_klines': 2,
+        'get_order_book': 5,
+        'get_aggregate_trades': 2,
+        'get_ticker': 2,
+        'get_server_time': 1,
+        'ping': 1,
+    }
+
+    # Endpoint REST của từng phương thức (bộ ngắt mạch dùng chung với AsyncKlineFetcher)
+    ENDPOINTS = {
+        'get_klines': 'klines',
+        'get_order_book': 'depth',
+        'get_aggregate_trades': 'aggTrades',
+        'get_ticker': 'ticker/24hr',
+        'get_server_time': 'time',
+    }
+
+    # Phương thức tự phân trang (nhiều request mỗi lần gọi): chỉ bị tính weight một lần nên không được gọi qua đây
+    PAGED_METHODS = ('get_historical_klines', 'get_historical_klines_generator', 'aggregate_trade_iter')
+
+    def __init__(self, client, limiter=None, max_retries=5, base_delay=0.5, max_delay=60.0,
+                 default_weight=1, breakers=None, latency=None, hedge_methods=('get_klines',),
+                 timeout=10.0):
+        """
+        Args:
+            hedge_methods: phương thức chỉ đọc được gửi request dự phòng khi chậm quá p95
+            timeout: thời gian tối đa (giây) chờ một lần gửi có hedge
+            (timeout socket của request đặt qua Client(requests_params={'timeout': ...}))
+        """
+        self.client = client
+        self.limiter = limiter or WeightRateLimiter()
+        self.breakers = breakers or CircuitBreakers()
+        self.latency = latency or LatencyRecorder()
+        self.hedge_methods = set(hedge_methods)
+        self.timeout = timeout
+        self.hedged = 0
+        self._executor = None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.default_weight = default_weight
+        self.retries = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _timed(self, name, func, args, kwargs):
+        started = time.monotonic()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.latency.observe(name, time.monotonic() - started)
+
+    def _send(self, method, name, func, args, kwargs, weight):
+        """Một lần gửi request; phương thức hedge được gửi thêm bản thứ hai khi quá p95"""
+        delay = self.latency.hedge_delay(name) if method in self.hedge_methods else None
+        if delay is None:
+            return self._timed(name, func, args, kwargs)
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='hedge')
+        deadline = time.monotonic() + self.timeout
+        futures = {self._executor.submit(self._timed, name, func, args, kwargs)}
+        done, futures = wait(futures, timeout=min(delay, self.timeout))
+        if not done:
+            self.limiter.acquire(weight)
+            self._count('hedged')
+            futures.add(self._executor.submit(self._timed, name, func, args, kwargs))
+
+        error = None
+        while done or futures:
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+            if not futures:
+                break
+            done, futures = wait(futures, timeout=max(0.0, deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                raise requests.Timeout(f"{method} không phản hồi sau {self.timeout:g}s")
+        raise error
+
+    def _observe_response(self):
+        # python-binance giữ response cuối cùng trên client (có thể là của thread khác,
+        # nhưng vẫn là số weight sàn báo gần nhất)
+        response = getattr(self.client, 'response', None)
+        if response is not None:
+            self.limiter.observe(response.headers)
+
+    def call(self, method, *args, weight=None, max_retries=None, **kwargs):
+        """
+        Gọi client.<method> trong giới hạn weight, thử lại khi bị giới hạn hoặc lỗi mạng/5xx
+        max_retries: ghi đè số lần thử lại (vd: 0-1 lần trong chu kỳ phân tích)
+        Endpoint đang ngắt mạch: raise CircuitOpenError ngay, không gửi request
+        """
+        if method in self.PAGED_METHODS:
+            raise ValueError(f"{method} tự phân trang, không tính đủ weight: "
+                             f"dùng get_klines theo trang (RangeDownloader)")
+        func = getattr(self.client, method)
+        weight = self.WEIGHTS.get(method, self.default_weight) if weight is None else weight
+        max_retries = self.max_retries if max_retries is None else max_retries
+        name = self.ENDPOINTS.get(method, method)
+        breaker = self.breakers.get(name)
+        attempt = 0
+        while True:
+            breaker.check()
+            self.limiter.acquire(weight)
+            try:
+                result = self._send(method, name, func, args, kwargs, weight)
+                breaker.record_success()
+                self._observe_response()
+                return result
+            except Exception as e:
+                status = getattr(e, 'status_code', None)
+                response = getattr(e, 'response', None)
+                headers = getattr(response, 'headers', None) or {}
+                if headers:
+                    self.limiter.observe(headers)
+
+                if status in RATE_LIMIT_STATUSES:
+                    breaker.record_success()
+                    delay = retry_after_seconds(headers)
+                    if delay is None:
+                        delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                    self.limiter.pause(delay, status)
+                elif not (isinstance(e, (requests.ConnectionError, requests.Timeout))
+                          or (status is not None and status >= 500)):
+                    breaker.record_success()
+                    self._count('errors')
+                    raise
+                else:
+                    breaker.record_failure()
+                    delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+
+                if attempt >= max_retries:
+                    self._count('errors')
+                    raise
+                attempt += 1
+                self._count('retries')
+                print(f"⚠️ {method} lỗi ({status or type(e).__name__}), thử lại lần {attempt} sau {delay:.1f}s")
+                if status not in RATE_LIMIT_STATUSES:
+                    time.sleep(delay)  # Với 429/418 limiter.acquire đã chờ hết thời gian tạm dừng
+
+    def get_klines(self, **params):
+        return self.call('get_klines', **params)
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+        return wrapper
+
+    def stats(self):
+        """Thống kê limiter + số lần thử lại/lỗi"""
+        result = self.limiter.stats()
+        result.update({'retries': self.retries, 'errors': self.errors, 'hedged': self.hedged,
+                       'open_circuits': self.breakers.open_circuits(), 'latency': self.latency.stats()})
+        return result
+
+
+class _StubResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class _StubAPIError(Exception):
+    """Lỗi giống BinanceAPIException: có status_code và response.headers"""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = _StubResponse(headers or {})
+
+
+class _StubClient:
+    """Client giả: lần lượt raise các lỗi trong `errors` rồi trả kết quả, response cuối có header weight"""
+
+    def __init__(self, errors=(), used_weight=None):
+        self.errors = list(errors)
+        self.calls = 0
+        self.response = None
+        self.used_weight = used_weight
+
+    def get_klines(self, **params):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        headers = {} if self.used_weight is None else {USED_WEIGHT_HEADER: str(self.used_weight)}
+        self.response = _StubResponse(headers)
+        return [[params.get('startTime', 0)]]
+
+
+def validate_retries():
+    """Chạy RateLimitedClient trên client giả, trả về {tên kiểm tra: đạt hay không}"""
+    results = {}
+
+    # 429 kèm Retry-After hai lần rồi thành công: thử lại đúng 2 lần, chờ hết thời gian tạm dừng
+    stub = _StubClient([_StubAPIError(429, {'Retry-After': '0.2'})] * 2, used_weight=700)
+    client = RateLimitedClient(stub, max_retries=3, hedge_methods=())
+    started = time.monotonic()
+    result = client.get_klines(symbol='STUBUSDT', startTime=1)
+    elapsed = time.monotonic() - started
+    results['429 + Retry-After'] = (result == [[1]] and stub.calls == 3 and client.retries == 2
+                                    and client.errors == 0 and client.limiter.rate_limited == 2
+                                    and elapsed >= 0.4 and client.limiter.used_weight == 700)
+
+    # 418 (IP bị chặn) được tính riêng và cũng tạm dừng theo Retry-After
+    stub = _StubClient([_StubAPIError(418, {'Retry-After': '0.1'})])
+    client = RateLimitedClient(stub, hedge_methods=())
+    started = time.monotonic()
+    client.get_klines(symbol='STUBUSDT')
+    results['418 tạm dừng'] = (client.limiter.banned == 1 and client.retries == 1
+                               and time.monotonic() - started >= 0.1)
+
+    # Lỗi không thử lại được (vd: 400 tham số sai) được raise ngay, không gửi lại
+    stub = _StubClient([_StubAPIError(400)])
+    client = RateLimitedClient(stub, hedge_methods=())
+    try:
+        client.get_klines(symbol='STUBUSDT')
+        raised = False
+    except _StubAPIError:
+        raised = True
+    results['400 raise ngay'] = raised and stub.calls == 1 and client.retries == 0 and client.errors == 1
+
+    # Hết số lần thử: raise lỗi 429 cuối cùng sau max_retries + 1 lần gửi
+    stub = _StubClient([_StubAPIError(429, {'Retry-After': '0.01'})] * 5)
+    client = RateLimitedClient(stub, max_retries=2, hedge_methods=())
+    try:
+        client.get_klines(symbol='STUBUSDT')
+        raised = False
+    except _StubAPIError:
+        raised = True
+    results['hết lượt thử'] = raised and stub.calls == 3 and client.retries == 2 and client.errors == 1
+    return results
+
+
+def main():
+    argparse.ArgumentParser(description='Kiểm tra thử lại 429/418 của RateLimitedClient với client giả').parse_args()
+    ok = True
+    for name, passed in validate_retries().items():
+        ok &= passed
+        print(f"{'✅' if passed else '❌'} {name}")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
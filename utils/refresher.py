@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Làm mới dữ liệu chạy nền (stale-while-revalidate)
+- Chu kỳ phân tích dùng ngay dữ liệu cũ, việc tải lại được giao cho thread nền
+- Mỗi key chỉ có một lần làm mới đang chạy, gửi trùng sẽ bị bỏ qua
+- Thử lại với backoff; endpoint đang ngắt mạch thì chờ tới lúc được gửi request thử
+- Làm mới thành công thì báo cho các listener (vd: scheduler chạy lại cặp đó)
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.circuit_breaker import CircuitOpenError
+from utils.rate_limiter import backoff_delay
+
+
+class BackgroundRefresher:
+    def __init__(self, max_workers=4, max_attempts=8, base_delay=1.0, max_delay=30.0):
+        """
+        Args:
+            max_workers: số thread làm mới chạy song song
+            max_attempts: số lần thử tối đa cho một key
+            base_delay, max_delay: tham số backoff (giây) giữa các lần thử
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='refresh')
+        self._pending = set()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.refreshed = 0
+        self.failed = 0
+
+    def add_listener(self, callback):
+        """callback(key) được gọi sau mỗi lần làm mới thành công"""
+        self._listeners.append(callback)
+
+    def is_pending(self, key):
+        with self._lock:
+            return key in self._pending
+
+    def submit(self, key, func):
+        """Chạy func() nền tới khi thành công; trả về False nếu key đang được làm mới"""
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+        self._executor.submit(self._run, key, func)
+        return True
+
+    def _run(self, key, func):
+        try:
+            for attempt in range(self.max_attempts):
+                try:
+                    func()
+                except Exception as e:
+                    if attempt == self.max_attempts - 1:
+                        print(f"❌ Làm mới {key} thất bại sau {self.max_attempts} lần: {e}")
+                        break
+                    if isinstance(e, CircuitOpenError):
+                        time.sleep(e.retry_in)
+                    else:
+                        time.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
+                else:
+                    with self._lock:
+                        self.refreshed += 1
+                        self._pending.discard(key)
+                    for callback in self._listeners:
+                        callback(key)
+                    return
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def stats(self):
+        with self._lock:
+            return {'pending': len(self._pending), 'refreshed': self.refreshed, 'failed': self.failed}
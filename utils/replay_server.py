@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WebSocket server phát lại kline đã ghi (thay thế sàn khi chạy offline)
+- Nguồn dữ liệu: file JSONL do KlineStream/AggTradeStream ghi lại, nến trong KlineStore,
+  hoặc file aggTrades (CSV/ZIP của data.binance.vision)
+- Phát theo định dạng combined stream của Binance (/stream?streams=...)
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from websockets.asyncio.server import serve
+
+from utils.agg_trades import AGG_TRADE_COLUMNS, agg_trade_stream_name, read_agg_trade_file
+from utils.kline_stream import stream_name
+
+
+def kline_row_to_event(symbol, interval, row, closed):
+    """Dựng message combined stream từ một dòng nến (theo KLINE_COLUMNS)"""
+    (open_time, open_, high, low, close, volume, close_time,
+     quote_volume, trades, taker_base, taker_quote) = row[:11]
+    return {
+        'stream': stream_name(symbol, interval),
+        'data': {
+            'e': 'kline',
+            'E': int(close_time) if closed else int(open_time),
+            's': symbol.upper(),
+            'k': {
+                't': int(open_time), 'T': int(close_time), 's': symbol.upper(), 'i': interval,
+                'o': str(open_), 'h': str(high), 'l': str(low), 'c': str(close), 'v': str(volume),
+                'n': int(trades), 'x': bool(closed), 'q': str(quote_volume),
+                'V': str(taker_base), 'Q': str(taker_quote),
+            },
+        },
+    }
+
+
+def agg_trade_to_event(symbol, row):
+    """Dựng message combined stream aggTrade từ một dòng theo AGG_TRADE_COLUMNS"""
+    agg_id, price, quantity, first_id, last_id, timestamp, is_buyer_maker = row
+    return {
+        'stream': agg_trade_stream_name(symbol),
+        'data': {
+            'e': 'aggTrade', 'E': int(timestamp), 's': symbol.upper(), 'a': int(agg_id),
+            'p': str(price), 'q': str(quantity), 'f': int(first_id), 'l': int(last_id),
+            'T': int(timestamp), 'm': bool(is_buyer_maker), 'M': True,
+        },
+    }
+
+
+class KlineReplayServer:
+    def __init__(self, events, host='127.0.0.1', port=8765, delay=0.0):
+        """
+        Args:
+            events: danh sách message combined stream theo thứ tự phát
+            delay: thời gian chờ (giây) giữa hai message
+        """
+        self.events = events
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self._loop = None
+        self._task = None
+        self._thread = None
+        self._server = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    @classmethod
+    def from_jsonl(cls, path, **kwargs):
+        """Đọc message thô đã ghi bởi KlineStream(record_path=...)"""
+        with open(path, 'r', encoding='utf-8') as f:
+            events = [json.loads(line) for line in f if line.strip()]
+        return cls(events, **kwargs)
+
+    @classmethod
+    def from_store(cls, store, symbols, intervals, start=None, end=None, limit=None, **kwargs):
+        """
+        Dựng chuỗi sự kiện từ nến đã lưu: mỗi nến phát một bản cập nhật đang chạy
+        rồi một bản đã đóng, sắp xếp theo close_time giữa các stream
+        """
+        items = []
+        for symbol in symbols:
+            for interval in intervals:
+                df = store.read(symbol, interval, limit=limit, start=start, end=end)
+                for row in df.itertuples(index=False, name=None):
+                    items.append((row[6], symbol, interval, row))
+        items.sort(key=lambda item: item[0])
+
+        events = []
+        for _, symbol, interval, row in items:
+            events.append(kline_row_to_event(symbol, interval, row, closed=False))
+            events.append(kline_row_to_event(symbol, interval, row, closed=True))
+        return cls(events, **kwargs)
+
+    @classmethod
+    def from_agg_trades(cls, symbol, chunks, **kwargs):
+        """Dựng chuỗi sự kiện aggTrade từ các khối cột (vd: read_agg_trade_file)"""
+        events = []
+        for chunk in chunks:
+            rows = zip(*(chunk[name].tolist() for name in AGG_TRADE_COLUMNS))
+            events.extend(agg_trade_to_event(symbol, row) for row in rows)
+        return cls(events, **kwargs)
+
+    async def _handler(self, websocket):
+        query = parse_qs(urlparse(websocket.request.path).query)
+        streams = set(query['streams'][0].split('/')) if 'streams' in query else None
+        for event in self.events:
+            if streams is not None and event.get('stream') not in streams:
+                continue
+            await websocket.send(json.dumps(event))
+            if self.delay:
+                await asyncio.sleep(self.delay)
+        await websocket.wait_closed()
+
+    def start(self):
+        """Chạy server trong thread nền"""
+        ready = threading.Event()
+
+        async def _serve():
+            self._server = await serve(self._handler, self.host, self.port)
+            ready.set()
+            await self._server.serve_forever()
+
+        self._loop = asyncio.new_event_loop()
+        self._task = self._loop.create_task(_serve())
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        ready.wait(timeout=10)
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        async def _shutdown():
+            self._server.close()
+            await self._server.wait_closed()
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(_shutdown(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._thread = self._loop = self._task = self._server = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Phát lại kline qua WebSocket cho chế độ offline")
+    parser.add_argument('--jsonl', help="File message đã ghi bởi KlineStream/AggTradeStream")
+    parser.add_argument('--agg-trades', help="File aggTrades (.csv/.zip) để phát cho symbol đầu tiên")
+    parser.add_argument('--symbols', nargs='*', default=[], help="Phát từ KlineStore cho các symbol này")
+    parser.add_argument('--intervals', nargs='*', default=['5m'])
+    parser.add_argument('--limit', type=int, default=500)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.jsonl:
+        server = KlineReplayServer.from_jsonl(args.jsonl, port=args.port, delay=args.delay)
+    elif args.agg_trades:
+        server = KlineReplayServer.from_agg_trades(args.symbols[0], read_agg_trade_file(args.agg_trades),
+                                                   port=args.port, delay=args.delay)
+    else:
+        from utils.kline_store import KlineStore
+        server = KlineReplayServer.from_store(KlineStore(), args.symbols, args.intervals,
+                                              limit=args.limit, port=args.port, delay=args.delay)
+    server.start()
+    print(f"▶️ Replay server: {server.url} ({len(server.events)} message)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dựng nến khung lớn (15m/1h/4h...) từ nến khung nhỏ ngay trên máy
+- Mỗi nến nhỏ đóng cập nhật nến lớn đang mở trong O(1)
+- Nến nhỏ đang chạy được gộp tạm, không cộng dồn hai lần khi cập nhật lại
+- Hai khung luôn khớp nhau tại cùng một thời điểm (cùng nguồn dữ liệu)
+"""
+
+from utils.intervals import candle_open_time, interval_to_ms, now_ms
+from utils.kline_store import OHLCV_COLUMNS, columns_to_df
+from utils.ohlcv_buffer import OHLCVRingBuffer
+
+
+def _combine(agg, candle):
+    """Gộp một nến nhỏ (o, h, l, c, v) vào phần đã gộp của nến lớn"""
+    if agg is None:
+        return candle
+    return (agg[0], max(agg[1], candle[1]), min(agg[2], candle[2]), candle[3], agg[4] + candle[4])
+
+
+class OHLCVResampler:
+    def __init__(self, base_interval, target_interval, capacity=100):
+        """
+        Args:
+            base_interval: khung nguồn (vd: "5m")
+            target_interval: khung cần dựng (bội số của khung nguồn, vd: "15m", "1h")
+            capacity: số nến lớn giữ lại
+        """
+        self.base_interval = base_interval
+        self.target_interval = target_interval
+        self.base_ms = interval_to_ms(base_interval)
+        self.target_ms = interval_to_ms(target_interval)
+        if self.target_ms <= self.base_ms or self.target_ms % self.base_ms:
+            raise ValueError(f"{target_interval} không phải bội số của {base_interval}")
+
+        self.bars = OHLCVRingBuffer(capacity)
+        self._bucket = None            # Thời điểm mở của nến lớn hiện tại
+        self._agg = None               # Phần đã gộp từ các nến nhỏ đã đóng của nến lớn hiện tại
+        self._last_closed_base = None  # Timestamp nến nhỏ đã đóng cuối cùng đã gộp
+
+    @property
+    def base_candles_needed(self):
+        """Số nến nhỏ cần để dựng đủ `capacity` nến lớn"""
+        return self.bars.capacity * (self.target_ms // self.base_ms)
+
+    @property
+    def last_closed_base(self):
+        """Timestamp nến nhỏ đã đóng cuối cùng đã gộp (None nếu chưa có)"""
+        return self._last_closed_base
+
+    def add(self, timestamp, open_, high, low, close, volume, closed=True):
+        """Gộp một nến nhỏ (đã đóng hoặc đang chạy) vào nến lớn tương ứng"""
+        if self._last_closed_base is not None and timestamp <= self._last_closed_base:
+            return
+        bucket = candle_open_time(timestamp, self.target_interval)
+        if bucket != self._bucket:
+            self._bucket = bucket
+            self._agg = None
+
+        combined = _combine(self._agg, (open_, high, low, close, volume))
+        self.bars.append(bucket, *combined)
+        if closed:
+            self._agg = combined
+            self._last_closed_base = timestamp
+
+    def update(self, df, now=None):
+        """
+        Gộp các nến nhỏ mới trong DataFrame OHLCV (nến chưa tới close_time được coi là đang chạy)
+        Chỉ xử lý các nến sau nến đã đóng cuối cùng, nên gọi lại với cùng cửa sổ là O(số nến mới)
+        """
+        now = now_ms() if now is None else now
+        timestamps = df['timestamp'].to_numpy()
+        start = 0
+        if self._last_closed_base is not None:
+            start = int(timestamps.searchsorted(self._last_closed_base, side='right'))
+        if start >= len(timestamps):
+            return
+        values = [df[name].to_numpy()[start:] for name in OHLCV_COLUMNS]
+        for row in zip(*values):
+            self.add(*row, closed=row[0] + self.base_ms <= now)
+
+    def is_last_bar_closed(self):
+        """Nến lớn cuối đã đủ các nến nhỏ đã đóng hay chưa"""
+        if self._bucket is None or self._last_closed_base is None:
+            return False
+        return self._last_closed_base + self.base_ms >= self._bucket + self.target_ms
+
+    def to_df(self, limit=None):
+        """Cửa sổ nến lớn, nến cuối có thể đang chạy (giống dữ liệu REST của sàn)"""
+        return self.bars.to_df(limit)
+
+    def closed_df(self, limit=None):
+        """Chỉ các nến lớn đã đóng"""
+        drop = 0 if self.is_last_bar_closed() else 1
+        available = max(0, len(self.bars) - drop)
+        limit = available if limit is None else min(limit, available)
+        return columns_to_df({name: self.bars.column(name, limit + drop)[:limit].copy() for name in OHLCV_COLUMNS})
@@ -2,6 +2,8 @@
 from datetime import datetime, timedelta
 import pandas as pd
 
+from utils.indicator_store import IndicatorFrame
+
 class RiskManager:
     def __init__(self):
         # --- Quản lý tài sản ---
@@ -25,6 +27,8 @@ class RiskManager:
         self.current_day = datetime.now().date()
 
         # --- Quản lý tương quan cặp tiền ---
+        # Giá trị mặc định, được thay bằng tương quan thực tế khi có OHLCVPanel (update_correlations)
+        self.correlation_threshold = 0.7
         self.correlated_pairs = {
             'BTCUSDT': ['ETHUSDT', 'ADAUSDT', 'SOLUSDT'],
             'ETHUSDT': ['SOLUSDT', 'BNBUSDT'],
@@ -68,15 +72,16 @@ class RiskManager:
 
         return True
 
-    def get_position_size(self, entry, sl, df):
+    def get_position_size(self, entry, sl, df, ind=None):
         """
         Tính khối lượng giao dịch tối ưu (Lớp 2: Position Sizing)
+        ind: IndicatorFrame dùng chung của chu kỳ (None thì tự tính)
         """
         # 1. Tính rủi ro động theo tài sản và chuỗi thắng/thua
         risk_amount = self._get_dynamic_risk_amount()
 
         # 2. Điều chỉnh theo biến động thị trường (ATR)
-        volatility_adjustment = self._get_volatility_adjustment(df, entry)
+        volatility_adjustment = self._get_volatility_adjustment(df, entry, ind)
         adjusted_risk = risk_amount * volatility_adjustment
 
         # 3. Điều chỉnh theo win rate
@@ -111,13 +116,14 @@ class RiskManager:
         risk_percent = min(self.max_risk_percent * risk_multiplier, 2.0)  # Giảm từ 3% xuống 2%
         return (risk_percent / 100) * self.current_balance
 
-    def _get_volatility_adjustment(self, df, entry):
+    def _get_volatility_adjustment(self, df, entry, ind=None):
         """
         Điều chỉnh theo biến động thị trường
         """
         try:
-            from ta.volatility import AverageTrueRange
-            atr = AverageTrueRange(df['high'], df['low'], df['close']).average_true_range().iloc[-1]
+            if ind is None:
+                ind = IndicatorFrame(df)
+            atr = ind.atr(14).iloc[-1]
             volatility_ratio = atr / entry
             
             # Giảm khối lượng nếu biến động cao
@@ -158,6 +164,15 @@ class RiskManager:
                     return True
         return False
 
+    def update_correlations(self, panel, limit=None):
+        """
+        Cập nhật các cặp tương quan từ log return của OHLCVPanel
+        Giữ danh sách cũ nếu bảng chưa đủ dữ liệu
+        """
+        pairs = panel.correlated_pairs(self.correlation_threshold, limit)
+        if pairs is not None:
+            self.correlated_pairs = pairs
+
     def _check_market_conditions(self, signal):
         """
         Kiểm tra điều kiện thị trường
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Luật chiến lược dạng khai báo: điều kiện có tên + trọng số + ngưỡng
+- Feature('rsi') là giá trị nến đang xét, Feature('close', lag=1) là nến trước đó
+- Điều kiện ghép bằng so sánh, số học và &, |, ~ (thay cho and/or/not);
+  so sánh nối (a < b < c) viết bằng between() hoặc &
+- RuleSet tính điểm = tổng trọng số các điều kiện đúng, đạt tín hiệu khi điểm >= ngưỡng
+- Nguồn dữ liệu: FeatureView/StrategyFeatures hoặc dict mảng; mảng (T,) cho một symbol,
+  (S, T) cho nhiều symbol (vd: utils.batch_indicators)
+- latest=True chỉ tính nến cuối (giá trị vô hướng hoặc (S,)), latest=False tính mọi nến cùng lúc
+- Giá trị không theo nến (vd: xu hướng khung lớn, ngưỡng tham số) truyền qua keyword khi tính
+"""
+
+import operator
+
+import numpy as np
+
+
+def _truth(value):
+    """Giá trị đúng/sai như bool() của Python (NaN là đúng, 0 là sai)"""
+    value = np.asarray(value)
+    return value if value.dtype == bool else value != 0
+
+
+def _and(a, b):
+    return np.logical_and(_truth(a), _truth(b))
+
+
+def _or(a, b):
+    return np.logical_or(_truth(a), _truth(b))
+
+
+def _not(a):
+    return np.logical_not(_truth(a))
+
+
+def _shift(values, lag):
+    """Dời mảng `lag` nến theo trục thời gian (trục cuối), phần đầu là NaN (False với mảng bool)"""
+    if values.dtype != bool:
+        values = values.astype(np.float64, copy=False)
+    shifted = np.full(values.shape, False if values.dtype == bool else np.nan, dtype=values.dtype)
+    if lag < values.shape[-1]:
+        shifted[..., lag:] = values[..., :values.shape[-1] - lag]
+    return shifted
+
+
+class Expr:
+    """Biểu thức trên giá trị chỉ báo, được tính theo lô bởi RuleSet"""
+
+    def evaluate(self, context):
+        raise NotImplementedError
+
+    def features(self):
+        """Các (tên, lag) biểu thức cần đọc"""
+        return set()
+
+    def __bool__(self):
+        raise TypeError("Biểu thức luật không có giá trị bool: dùng &, |, ~ hoặc between() "
+                        "thay cho and/or/not và so sánh nối")
+
+    def between(self, low, high):
+        """low < giá trị < high"""
+        return (self > low) & (self < high)
+
+    def __lt__(self, other):
+        return _Op(operator.lt, self, other)
+
+    def __le__(self, other):
+        return _Op(operator.le, self, other)
+
+    def __gt__(self, other):
+        return _Op(operator.gt, self, other)
+
+    def __ge__(self, other):
+        return _Op(operator.ge, self, other)
+
+    def __and__(self, other):
+        return _Op(_and, self, other)
+
+    def __rand__(self, other):
+        return _Op(_and, other, self)
+
+    def __or__(self, other):
+        return _Op(_or, self, other)
+
+    def __ror__(self, other):
+        return _Op(_or, other, self)
+
+    def __invert__(self):
+        return _Op(_not, self)
+
+    def __add__(self, other):
+        return _Op(operator.add, self, other)
+
+    def __radd__(self, other):
+        return _Op(operator.add, other, self)
+
+    def __sub__(self, other):
+        return _Op(operator.sub, self, other)
+
+    def __rsub__(self, other):
+        return _Op(operator.sub, other, self)
+
+    def __mul__(self, other):
+        return _Op(operator.mul, self, other)
+
+    def __rmul__(self, other):
+        return _Op(operator.mul, other, self)
+
+    def __truediv__(self, other):
+        return _Op(operator.truediv, self, other)
+
+    def __rtruediv__(self, other):
+        return _Op(operator.truediv, other, self)
+
+    def __neg__(self):
+        return _Op(operator.neg, self)
+
+    def __abs__(self):
+        return _Op(abs, self)
+
+
+class Feature(Expr):
+    def __init__(self, name, lag=0):
+        """
+        Args:
+            name: tên cột/giá trị trung gian của nguồn, hoặc tên giá trị truyền qua keyword
+            lag: số nến lùi lại (1 = nến trước)
+        """
+        self.name = name
+        self.lag = lag
+
+    def evaluate(self, context):
+        return context.value(self.name, self.lag)
+
+    def features(self):
+        return {(self.name, self.lag)}
+
+    def __repr__(self):
+        return f"Feature({self.name!r}, lag={self.lag})" if self.lag else f"Feature({self.name!r})"
+
+
+class _Const(Expr):
+    def __init__(self, value):
+        self.value = value
+
+    def evaluate(self, context):
+        return self.value
+
+
+class _Op(Expr):
+    def __init__(self, func, *operands):
+        self.func = func
+        self.operands = [operand if isinstance(operand, Expr) else _Const(operand) for operand in operands]
+
+    def evaluate(self, context):
+        return self.func(*(operand.evaluate(context) for operand in self.operands))
+
+    def features(self):
+        return set().union(*(operand.features() for operand in self.operands))
+
+
+class _Context:
+    """Giá trị (tên, lag) của một lần tính, đọc từ nguồn và ghi nhớ để dùng lại giữa các điều kiện"""
+
+    def __init__(self, source, values, latest):
+        self.source = source
+        # Giá trị truyền qua keyword cũng theo phép tính NumPy (vd: chia cho 0 ra inf thay vì lỗi)
+        self.values = {name: np.asarray(value)[()] for name, value in values.items()}
+        self.latest = latest
+        self._arrays = {}
+        self._cache = {}
+
+    def _array(self, name):
+        array = self._arrays.get(name)
+        if array is None:
+            source = self.source
+            array = source.array(name) if hasattr(source, 'array') else np.asarray(source[name])
+            self._arrays[name] = array
+        return array
+
+    def value(self, name, lag):
+        if name in self.values:
+            return self.values[name]
+        key = (name, lag)
+        value = self._cache.get(key)
+        if value is None:
+            array = self._array(name)
+            if self.latest:
+                value = array[..., -1 - lag]
+            else:
+                value = array if lag == 0 else _shift(array, lag)
+            self._cache[key] = value
+        return value
+
+
+class Condition:
+    def __init__(self, name, expr, weight=1):
+        """
+        Args:
+            name: tên điều kiện (duy nhất trong RuleSet)
+            expr: biểu thức đúng/sai (Expr)
+            weight: điểm cộng khi điều kiện đúng
+        """
+        self.name = name
+        self.expr = expr
+        self.weight = weight
+
+
+class RuleSet:
+    def __init__(self, conditions, threshold):
+        """
+        Args:
+            conditions: danh sách Condition (điểm cộng theo đúng thứ tự này)
+            threshold: điểm tối thiểu để đạt tín hiệu
+        """
+        self.conditions = list(conditions)
+        self.threshold = threshold
+        names = [condition.name for condition in self.conditions]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Tên điều kiện bị trùng: {names}")
+        self.inputs = set().union(*(condition.expr.features() for condition in self.conditions))
+        # Số nến cuối cần có để tính nến mới nhất
+        self.history = 1 + max((lag for _, lag in self.inputs), default=0)
+
+    def evaluate(self, source, latest=True, **values):
+        """{tên điều kiện: đúng/sai} (vô hướng, (S,), (T,) hoặc (S, T) theo nguồn và latest)"""
+        context = _Context(source, values, latest)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return {condition.name: _truth(condition.expr.evaluate(context)) for condition in self.conditions}
+
+    def score(self, source, latest=True, **values):
+        """Tổng trọng số các điều kiện đúng"""
+        score = 0
+        for condition, passed in zip(self.conditions, self.evaluate(source, latest, **values).values()):
+            score = score + np.where(passed, condition.weight, 0)
+        return score[()]  # Mảng 0 chiều (một symbol, nến cuối) thành số
+
+    def passed(self, source, latest=True, **values):
+        """Điểm đạt ngưỡng hay không"""
+        return self.score(source, latest, **values) >= self.threshold
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lịch chạy bám theo thời điểm đóng nến
+- Tính thời điểm đóng kế tiếp của mọi interval theo lưới thời gian của sàn
+- Thức dậy sau mỗi lần đóng nến một khoảng trễ nhỏ (delay_ms)
+- Chỉ trả về các (symbol, interval) có nến mới đóng chưa được xử lý
+- Mốc thức dậy tính theo đồng hồ tuyệt đối nên thời gian chạy chu kỳ không làm lệch lịch
+- Chế độ stream: chờ sàn xác nhận nến đóng (notify_close), quá grace_ms thì chạy luôn
+- Cặp chỉ có dữ liệu cũ được hoãn (defer) tới khi làm mới xong (release) hoặc hết hạn hoãn
+"""
+
+import threading
+
+from utils.intervals import candle_open_time, interval_to_ms, last_closed_open_time, now_ms
+
+
+class CandleCloseScheduler:
+    def __init__(self, symbols, intervals, delay_ms=300, confirm_closes=False, grace_ms=5000):
+        """
+        Args:
+            symbols, intervals: các cặp cần lập lịch
+            delay_ms: thời gian chờ sau ranh giới nến trước khi chạy
+            confirm_closes: chỉ chạy khi đã nhận notify_close cho nến đó (chế độ stream)
+            grace_ms: thời gian chờ xác nhận tối đa trước khi chạy luôn
+        """
+        self.symbols = list(symbols)
+        self.intervals = list(dict.fromkeys(intervals))
+        self.delay_ms = delay_ms
+        self.confirm_closes = confirm_closes
+        self.grace_ms = grace_ms
+        self._processed = {}   # (symbol, interval) -> open time nến đóng đã xử lý
+        self._confirmed = {}   # (symbol, interval) -> open time nến đóng sàn đã xác nhận
+        self._deferred = {}    # (symbol, interval) -> thời điểm (ms) được chạy lại
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def next_close_ms(self, interval, ts_ms=None):
+        """Ranh giới đóng nến kế tiếp của interval sau ts_ms"""
+        ts_ms = now_ms() if ts_ms is None else ts_ms
+        return candle_open_time(ts_ms, interval) + interval_to_ms(interval)
+
+    def next_wake_ms(self, ts_ms=None):
+        """Thời điểm thức dậy kế tiếp (ranh giới gần nhất + delay_ms)"""
+        ts_ms = now_ms() if ts_ms is None else ts_ms
+        shifted = ts_ms - self.delay_ms
+        return min(self.next_close_ms(interval, shifted) for interval in self.intervals) + self.delay_ms
+
+    def notify_close(self, symbol, interval, open_time):
+        """Ghi nhận nến đã được sàn chốt (gọi từ callback on_close của KlineStream)"""
+        pair = (symbol.upper(), interval)
+        with self._lock:
+            if open_time > self._confirmed.get(pair, -1):
+                self._confirmed[pair] = int(open_time)
+        self._wake.set()
+
+    def defer(self, pairs, delay_ms):
+        """Hoãn các cặp chưa xử lý được (dữ liệu cũ) tối đa delay_ms"""
+        until = now_ms() + delay_ms
+        with self._lock:
+            for symbol, interval in pairs:
+                self._deferred[(symbol.upper(), interval)] = until
+
+    def release(self, symbol, interval):
+        """Bỏ hoãn một cặp (vd: refresher vừa tải lại xong) và đánh thức wait()"""
+        with self._lock:
+            self._deferred.pop((symbol.upper(), interval), None)
+        self._wake.set()
+
+    def _pending(self, ts_ms):
+        """(due, deadline): các cặp cần chạy và mốc sớm nhất một cặp đang chờ xác nhận/bị hoãn được chạy"""
+        due = {}
+        deadline = None
+        shifted = ts_ms - self.delay_ms
+        with self._lock:
+            for interval in self.intervals:
+                closed = last_closed_open_time(interval, shifted)
+                for symbol in self.symbols:
+                    pair = (symbol.upper(), interval)
+                    if self._processed.get(pair, -1) >= closed:
+                        continue
+                    until = self._deferred.get(pair)
+                    if until is not None and ts_ms < until:
+                        deadline = until if deadline is None else min(deadline, until)
+                        continue
+                    if self.confirm_closes and self._confirmed.get(pair, -1) < closed:
+                        expires = closed + interval_to_ms(interval) + self.grace_ms
+                        if ts_ms < expires:
+                            deadline = expires if deadline is None else min(deadline, expires)
+                            continue
+                    due[(symbol, interval)] = closed
+        return due, deadline
+
+    def due(self, ts_ms=None):
+        """{(symbol, interval): open time của nến vừa đóng} cần được xử lý"""
+        return self._pending(now_ms() if ts_ms is None else ts_ms)[0]
+
+    def mark_done(self, due):
+        """Đánh dấu đã xử lý các nến trả về bởi due()/wait()"""
+        with self._lock:
+            for (symbol, interval), open_time in due.items():
+                pair = (symbol.upper(), interval)
+                self._processed[pair] = max(self._processed.get(pair, -1), open_time)
+                self._deferred.pop(pair, None)
+
+    def wait(self):
+        """Ngủ tới khi có nến đóng cần xử lý, trả về due() (rỗng nếu đã stop)"""
+        while not self._stopped:
+            self._wake.clear()
+            ts_ms = now_ms()
+            due, deadline = self._pending(ts_ms)
+            if due:
+                return due
+            wake_at = self.next_wake_ms(ts_ms)
+            if deadline is not None:
+                wake_at = min(wake_at, deadline)
+            self._wake.wait(max(0, wake_at - ts_ms) / 1000)
+        return {}
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chỉ mục hỗ trợ/kháng cự (S/R) cập nhật tăng dần theo nến
+- Pivot high/low: high (low) là cực trị của cửa sổ 2*window+1 nến quanh nó, được xác nhận
+  khi đủ `window` nến phía sau (giống rolling(2*window+1, center=True) trên cả DataFrame)
+- Mỗi nến mới chỉ kiểm tra một tâm pivot, không tính lại cả chuỗi
+- Giữ `max_pivots` pivot gần nhất mỗi phía và mảng giá đã sắp xếp:
+  tìm mức trong ±pct quanh giá là truy vấn bisect
+- Nến cuối cùng của DataFrame (có thể đang chạy) chỉ tham gia tạm thời, không được chốt
+- Gom các mức gần nhau thành vùng (levels) kèm số lần chạm
+"""
+
+import bisect
+from collections import deque
+
+import numpy as np
+
+
+class _PivotSide:
+    """Các pivot gần nhất của một phía: deque theo thời gian + danh sách giá đã sắp xếp"""
+
+    def __init__(self, max_pivots):
+        self.max_pivots = max_pivots
+        self.pivots = deque()  # (timestamp, price) theo thứ tự thời gian
+        self.prices = []  # Giá của các pivot trên, tăng dần
+
+    def add(self, timestamp, price):
+        self.pivots.append((timestamp, price))
+        bisect.insort(self.prices, price)
+        if len(self.pivots) > self.max_pivots:
+            self._pop_oldest()
+
+    def _pop_oldest(self):
+        _, price = self.pivots.popleft()
+        del self.prices[bisect.bisect_left(self.prices, price)]
+
+    def evict_before(self, timestamp):
+        while self.pivots and self.pivots[0][0] < timestamp:
+            self._pop_oldest()
+
+    def between(self, low, high, extra=None, low_inclusive=False):
+        """
+        Giá pivot trong (low, high] (low_inclusive: [low, high)), tăng dần
+        extra: pivot tạm của nến đang chạy, được tính là pivot mới nhất (đẩy pivot cũ nhất ra nếu đầy)
+        """
+        prices = self.prices
+        if extra is not None:
+            prices = list(prices)
+            if len(self.pivots) >= self.max_pivots:
+                del prices[bisect.bisect_left(prices, self.pivots[0][1])]
+            bisect.insort(prices, extra)
+        if low_inclusive:
+            return prices[bisect.bisect_left(prices, low):bisect.bisect_left(prices, high)]
+        return prices[bisect.bisect_right(prices, low):bisect.bisect_right(prices, high)]
+
+
+class SRLevelIndex:
+    def __init__(self, window=8, max_pivots=20):
+        """
+        Args:
+            window: số nến mỗi bên của pivot
+            max_pivots: số pivot gần nhất giữ lại mỗi phía
+        """
+        self.window = window
+        self.max_pivots = max_pivots
+        self.reset()
+
+    def reset(self):
+        self.candles = deque(maxlen=2 * self.window + 1)  # (timestamp, high, low) đã chốt gần nhất
+        self.last_timestamp = None
+        self.resistance = _PivotSide(self.max_pivots)
+        self.support = _PivotSide(self.max_pivots)
+        self._forming = (None, None)  # Pivot tạm (high, low) của nến cuối đang tham gia cửa sổ
+        self.applied = 0
+
+    def _center(self, candles):
+        """Pivot (high, low) tại tâm cửa sổ candles (đủ 2*window+1 nến), None nếu không phải pivot"""
+        timestamp, high, low = candles[self.window]
+        pivot_high = high if high == max(c[1] for c in candles) else None
+        pivot_low = low if low == min(c[2] for c in candles) else None
+        return timestamp, pivot_high, pivot_low
+
+    def update(self, timestamp, high, low):
+        """Chốt một nến đã đóng; xác nhận pivot tại nến cách đó `window` nến"""
+        self.candles.append((timestamp, high, low))
+        self.last_timestamp = timestamp
+        self.applied += 1
+        if len(self.candles) == self.candles.maxlen:
+            center, pivot_high, pivot_low = self._center(self.candles)
+            if pivot_high is not None:
+                self.resistance.add(center, pivot_high)
+            if pivot_low is not None:
+                self.support.add(center, pivot_low)
+
+    def sync(self, df):
+        """
+        Cập nhật theo DataFrame nến: chốt các nến mới trừ nến cuối, nến cuối chỉ tính pivot tạm
+        Dữ liệu không nối tiếp (thiếu nến hoặc lùi lại) thì dựng lại từ df
+        Pivot phải có đủ `window` nến phía trước trong df (như rolling center trên df)
+        """
+        timestamps = df['timestamp'].to_numpy()
+        highs = df['high'].to_numpy()
+        lows = df['low'].to_numpy()
+        n = len(timestamps)
+        if n == 0:
+            return self
+
+        start = 0
+        if self.last_timestamp is not None:
+            start = int(np.searchsorted(timestamps, self.last_timestamp, side='right'))
+            if start == 0 or timestamps[start - 1] != self.last_timestamp:
+                self.reset()
+                start = 0
+        if start > n - 1:
+            # Nến cuối đã được chốt trước đó (df ngắn lại): dựng lại cho đúng vai trò nến đang chạy
+            self.reset()
+            start = 0
+        for i in range(start, n - 1):
+            self.update(timestamps[i], highs[i], lows[i])
+
+        if n > self.window:
+            oldest = timestamps[self.window]
+            self.resistance.evict_before(oldest)
+            self.support.evict_before(oldest)
+
+        self._forming = (None, None)
+        if len(self.candles) >= 2 * self.window and n > 2 * self.window:
+            window = list(self.candles)[-2 * self.window:] + [(timestamps[-1], highs[-1], lows[-1])]
+            _, pivot_high, pivot_low = self._center(window)
+            self._forming = (pivot_high, pivot_low)
+        return self
+
+    def resistance_levels(self, price, pct=0.03):
+        """Pivot high trong (price, price * (1 + pct)], tăng dần"""
+        return self.resistance.between(price, price * (1 + pct), self._forming[0])
+
+    def support_levels(self, price, pct=0.03):
+        """Pivot low trong [price * (1 - pct), price), tăng dần"""
+        return self.support.between(price * (1 - pct), price, self._forming[1], low_inclusive=True)
+
+    def levels(self, side='resistance', tolerance=0.002):
+        """
+        Gom pivot gần nhau (chênh lệch <= tolerance so với mức trước) thành vùng
+        Trả về [(giá trung bình, số lần chạm)] tăng dần theo giá
+        """
+        pivots = self.resistance if side == 'resistance' else self.support
+        extra = self._forming[0] if side == 'resistance' else self._forming[1]
+        prices = pivots.between(-np.inf, np.inf, extra)
+        zones = []
+        for price in prices:
+            if zones and price - zones[-1][-1] <= tolerance * zones[-1][-1]:
+                zones[-1].append(price)
+            else:
+                zones.append([price])
+        return [(sum(zone) / len(zone), len(zone)) for zone in zones]
@@ -0,0 +1,630 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chỉ báo tính tăng dần theo từng nến (O(1) mỗi nến)
+- EMA, RSI (Wilder), ATR, MACD/signal/histogram, OBV, Stochastic, Bollinger, rolling mean/std,
+  Supertrend nhiều cấu hình (bản tính cả mảng: utils.supertrend)
+- update(..., closed=True): nến đã đóng, cập nhật trạng thái
+- update(..., closed=False): nến đang chạy, chỉ tính giá trị tạm từ trạng thái đã chốt
+  (lần update sau thay thế giá trị này = tự rollback, trạng thái không bị ghi đè)
+- value / prev tương ứng .iloc[-1] / .iloc[-2] của chuỗi `ta`
+- to_dict()/from_dict(): lưu và khôi phục trạng thái (JSON), không gồm nến đang chạy
+- Kết quả khớp thư viện `ta` đang dùng trong chiến lược: python -m utils.streaming_indicators
+"""
+
+import argparse
+import math
+from collections import deque
+
+NAN = float('nan')
+
+
+class StreamingIndicator:
+    """Lớp cơ sở: lớp con cài _push (chốt nến) và _peek (tính tạm, không đổi trạng thái)"""
+
+    def __init__(self):
+        self.count = 0  # Số nến đã chốt
+        self.value = NAN
+        self.prev = NAN
+        self._committed = NAN
+
+    def update(self, *bar, closed=True):
+        """Thêm một nến; trả về giá trị chỉ báo tại nến đó"""
+        self.prev = self._committed
+        if closed:
+            self._committed = self._push(*bar)
+            self.count += 1
+            self.value = self._committed
+        else:
+            self.value = self._peek(*bar)
+        return self.value
+
+    def rollback(self):
+        """Bỏ giá trị tạm của nến đang chạy, quay về nến đã chốt cuối cùng"""
+        self.value = self._committed
+
+    def params(self):
+        return {}
+
+    def _state(self):
+        return {}
+
+    def _load_state(self, state):
+        pass
+
+    def to_dict(self):
+        """Trạng thái đã chốt (bỏ qua nến đang chạy), dùng được với json"""
+        return {
+            'type': type(self).__name__,
+            'params': self.params(),
+            'state': dict(self._state(), count=self.count, committed=self._committed),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        indicator = INDICATOR_TYPES[data['type']](**data['params'])
+        state = dict(data['state'])
+        indicator.count = state.pop('count')
+        indicator._committed = indicator.value = state.pop('committed')
+        indicator._load_state(state)
+        return indicator
+
+
+def from_dict(data):
+    """Khôi phục chỉ báo bất kỳ từ to_dict()"""
+    return StreamingIndicator.from_dict(data)
+
+
+class _EWM:
+    """ewm(alpha, adjust=False) của pandas: y0 = x0, y = (1 - alpha) * y + alpha * x"""
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.mean = NAN
+        self.count = 0
+
+    def peek(self, x):
+        if self.count == 0:
+            return x
+        return (1 - self.alpha) * self.mean + self.alpha * x
+
+    def push(self, x):
+        self.mean = self.peek(x)
+        self.count += 1
+        return self.mean
+
+
+class EMA(StreamingIndicator):
+    """ta.trend.EMAIndicator(close, period): NaN trong period - 1 nến đầu"""
+
+    def __init__(self, period):
+        super().__init__()
+        self.period = period
+        self._ewm = _EWM(2.0 / (period + 1))
+
+    def _output(self, mean, count):
+        return mean if count >= self.period else NAN
+
+    def _push(self, x):
+        return self._output(self._ewm.push(x), self._ewm.count)
+
+    def _peek(self, x):
+        return self._output(self._ewm.peek(x), self._ewm.count + 1)
+
+    def params(self):
+        return {'period': self.period}
+
+    def _state(self):
+        return {'mean': self._ewm.mean, 'n': self._ewm.count}
+
+    def _load_state(self, state):
+        self._ewm.mean, self._ewm.count = state['mean'], state['n']
+
+
+class RSI(StreamingIndicator):
+    """ta.momentum.RSIIndicator(close, period): trung bình Wilder (alpha = 1/period) của tăng/giảm"""
+
+    def __init__(self, period=14):
+        super().__init__()
+        self.period = period
+        self.prev_close = None
+        self._up = _EWM(1.0 / period)
+        self._down = _EWM(1.0 / period)
+
+    def _moves(self, close):
+        # Nến đầu tiên: diff là NaN, ta coi tăng = giảm = 0
+        diff = 0.0 if self.prev_close is None else close - self.prev_close
+        return max(diff, 0.0), max(-diff, 0.0)
+
+    def _output(self, up, down, count):
+        if count < self.period:
+            return NAN
+        if down == 0:
+            return 100.0
+        return 100 - (100 / (1 + up / down))
+
+    def _push(self, close):
+        up, down = self._moves(close)
+        self.prev_close = close
+        return self._output(self._up.push(up), self._down.push(down), self.count + 1)
+
+    def _peek(self, close):
+        up, down = self._moves(close)
+        return self._output(self._up.peek(up), self._down.peek(down), self.count + 1)
+
+    def params(self):
+        return {'period': self.period}
+
+    def _state(self):
+        return {'prev_close': self.prev_close, 'up': self._up.mean, 'down': self._down.mean}
+
+    def _load_state(self, state):
+        self.prev_close = state['prev_close']
+        self._up.mean, self._down.mean = state['up'], state['down']
+        self._up.count = self._down.count = self.count
+
+
+class ATR(StreamingIndicator):
+    """
+    ta.volatility.AverageTrueRange(high, low, close, period)
+    period nến đầu: trung bình cộng true range, sau đó làm mượt Wilder; trước đó trả 0 như `ta`
+    """
+
+    def __init__(self, period=14):
+        super().__init__()
+        self.period = period
+        self.prev_close = None
+        self.atr = 0.0
+        self.tr_sum = 0.0
+
+    def _true_range(self, high, low):
+        if self.prev_close is None:
+            return high - low
+        return max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+
+    def _next(self, tr):
+        """(atr, tr_sum) sau khi thêm true range tr"""
+        count = self.count + 1
+        if count < self.period:
+            return 0.0, self.tr_sum + tr
+        if count == self.period:
+            return (self.tr_sum + tr) / self.period, 0.0
+        return (self.atr * (self.period - 1) + tr) / float(self.period), 0.0
+
+    def _push(self, high, low, close):
+        self.atr, self.tr_sum = self._next(self._true_range(high, low))
+        self.prev_close = close
+        return self.atr
+
+    def _peek(self, high, low, close):
+        return self._next(self._true_range(high, low))[0]
+
+    def params(self):
+        return {'period': self.period}
+
+    def _state(self):
+        return {'prev_close': self.prev_close, 'atr': self.atr, 'tr_sum': self.tr_sum}
+
+    def _load_state(self, state):
+        self.prev_close, self.atr, self.tr_sum = state['prev_close'], state['atr'], state['tr_sum']
+
+
+class MACD(StreamingIndicator):
+    """ta.trend.MACD(close, slow, fast, signal): value = (macd, signal, histogram)"""
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        super().__init__()
+        self.fast, self.slow, self.signal = fast, slow, signal
+        self._fast = EMA(fast)
+        self._slow = EMA(slow)
+        self._signal = EMA(signal)  # Chỉ nhận giá trị khi macd đã có (bỏ NaN đầu chuỗi như pandas)
+        self.value = self.prev = self._committed = (NAN, NAN, NAN)
+
+    @staticmethod
+    def _output(macd, signal):
+        return macd, signal, macd - signal
+
+    def _push(self, close):
+        macd = self._fast.update(close) - self._slow.update(close)
+        signal = self._signal.update(macd) if not math.isnan(macd) else NAN
+        return self._output(macd, signal)
+
+    def _peek(self, close):
+        macd = self._fast.update(close, closed=False) - self._slow.update(close, closed=False)
+        signal = self._signal.update(macd, closed=False) if not math.isnan(macd) else NAN
+        return self._output(macd, signal)
+
+    def params(self):
+        return {'fast': self.fast, 'slow': self.slow, 'signal': self.signal}
+
+    def _state(self):
+        return {'fast': self._fast.to_dict(), 'slow': self._slow.to_dict(), 'signal': self._signal.to_dict()}
+
+    def _load_state(self, state):
+        self._fast = EMA.from_dict(state['fast'])
+        self._slow = EMA.from_dict(state['slow'])
+        self._signal = EMA.from_dict(state['signal'])
+        self._committed = self.value = tuple(self._committed)
+
+
+class OBV(StreamingIndicator):
+    """ta.volume.OnBalanceVolumeIndicator(close, volume)"""
+
+    def __init__(self):
+        super().__init__()
+        self.prev_close = None
+        self.obv = 0.0
+
+    def _next(self, close, volume):
+        if self.prev_close is not None and close < self.prev_close:
+            return self.obv - volume
+        return self.obv + volume
+
+    def _push(self, close, volume):
+        self.obv = self._next(close, volume)
+        self.prev_close = close
+        return self.obv
+
+    def _peek(self, close, volume):
+        return self._next(close, volume)
+
+    def _state(self):
+        return {'prev_close': self.prev_close, 'obv': self.obv}
+
+    def _load_state(self, state):
+        self.prev_close, self.obv = state['prev_close'], state['obv']
+
+
+class _RollingWindow:
+    """
+    Cửa sổ trượt cố định: tổng và tổng bình phương của (x - shift)
+    shift đặt lại theo trung bình cửa sổ mỗi vòng để tránh sai số khi giá lớn và cộng trừ lâu ngày
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.values = []
+        self.head = 0  # Vị trí phần tử cũ nhất khi cửa sổ đã đầy
+        self.shift = None
+        self.sum = 0.0
+        self.sumsq = 0.0
+
+    def _resync(self):
+        self.shift = sum(self.values) / len(self.values)
+        self.sum = sum(x - self.shift for x in self.values)
+        self.sumsq = sum((x - self.shift) ** 2 for x in self.values)
+
+    def _moments(self, x):
+        """(số phần tử, tổng, tổng bình phương) của cửa sổ sau khi thêm x (đã trừ shift)"""
+        shift = x if self.shift is None else self.shift
+        y = x - shift
+        if len(self.values) < self.period:
+            return len(self.values) + 1, self.sum + y, self.sumsq + y * y, shift
+        old = self.values[self.head] - shift
+        return self.period, self.sum + y - old, self.sumsq + y * y - old * old, shift
+
+    def push(self, x):
+        _, self.sum, self.sumsq, self.shift = self._moments(x)
+        if len(self.values) < self.period:
+            self.values.append(x)
+        else:
+            self.values[self.head] = x
+            self.head = (self.head + 1) % self.period
+            if self.head == 0:
+                self._resync()
+
+    def mean(self, x=None):
+        """Trung bình sau khi thêm x (x=None: cửa sổ hiện tại), NaN nếu chưa đủ period phần tử"""
+        if x is None:
+            n, total, shift = len(self.values), self.sum, self.shift
+        else:
+            n, total, _, shift = self._moments(x)
+        return total / n + shift if n >= self.period else NAN
+
+    def std(self, x=None, ddof=1):
+        if x is None:
+            n, total, sumsq = len(self.values), self.sum, self.sumsq
+        else:
+            n, total, sumsq, _ = self._moments(x)
+        if n < self.period or n <= ddof:
+            return NAN
+        return math.sqrt(max(0.0, (sumsq - total * total / n) / (n - ddof)))
+
+    def to_dict(self):
+        return {'values': self.values[self.head:] + self.values[:self.head]}
+
+    def load(self, state):
+        self.values, self.head = list(state['values']), 0
+        if self.values:
+            self._resync()
+
+
+class RollingMean(StreamingIndicator):
+    """series.rolling(period).mean() (ta.trend.SMAIndicator, volume SMA)"""
+
+    def __init__(self, period):
+        super().__init__()
+        self.period = period
+        self._window = _RollingWindow(period)
+
+    def _push(self, x):
+        self._window.push(x)
+        return self._window.mean()
+
+    def _peek(self, x):
+        return self._window.mean(x)
+
+    def params(self):
+        return {'period': self.period}
+
+    def _state(self):
+        return self._window.to_dict()
+
+    def _load_state(self, state):
+        self._window.load(state)
+
+
+class RollingStd(RollingMean):
+    """series.rolling(period).std(ddof)"""
+
+    def __init__(self, period, ddof=1):
+        super().__init__(period)
+        self.ddof = ddof
+
+    def _push(self, x):
+        self._window.push(x)
+        return self._window.std(ddof=self.ddof)
+
+    def _peek(self, x):
+        return self._window.std(x, ddof=self.ddof)
+
+    def params(self):
+        return {'period': self.period, 'ddof': self.ddof}
+
+
+class Bollinger(RollingMean):
+    """ta.volatility.BollingerBands(close, period, dev): value = (upper, lower, mavg), std ddof=0"""
+
+    def __init__(self, period=20, dev=2):
+        super().__init__(period)
+        self.dev = dev
+        self.value = self.prev = self._committed = (NAN, NAN, NAN)
+
+    def _output(self, mavg, std):
+        return mavg + self.dev * std, mavg - self.dev * std, mavg
+
+    def _push(self, close):
+        self._window.push(close)
+        return self._output(self._window.mean(), self._window.std(ddof=0))
+
+    def _peek(self, close):
+        return self._output(self._window.mean(close), self._window.std(close, ddof=0))
+
+    def params(self):
+        return {'period': self.period, 'dev': self.dev}
+
+    def _load_state(self, state):
+        super()._load_state(state)
+        self._committed = self.value = tuple(self._committed)
+
+
+class _RollingExtreme:
+    """Max (hoặc min) cửa sổ trượt bằng deque đơn điệu, O(1) khấu hao"""
+
+    def __init__(self, period, maximum=True):
+        self.period = period
+        self.sign = 1 if maximum else -1
+        self.index = -1  # Chỉ số phần tử đã chốt cuối cùng
+        self.deque = deque()  # (index, sign * value) giảm dần
+
+    def push(self, x):
+        self.index += 1
+        key = self.sign * x
+        while self.deque and self.deque[-1][1] <= key:
+            self.deque.pop()
+        self.deque.append((self.index, key))
+        while self.deque[0][0] <= self.index - self.period:
+            self.deque.popleft()
+
+    def current(self, x=None):
+        """Cực trị của cửa sổ (có thêm x nếu cho), NaN nếu chưa đủ period phần tử"""
+        if x is None:
+            if self.index + 1 < self.period:
+                return NAN
+            return self.sign * self.deque[0][1]
+        if self.index + 2 < self.period:
+            return NAN
+        # Cửa sổ mới bỏ phần tử cũ nhất (index - period + 1): lấy phần tử đầu còn nằm trong cửa sổ
+        key = self.sign * x
+        for index, value in self.deque:
+            if index > self.index - self.period + 1:
+                key = max(key, value)
+                break
+        return self.sign * key
+
+    def to_dict(self):
+        return {'index': self.index, 'deque': [list(item) for item in self.deque]}
+
+    def load(self, state):
+        self.index = state['index']
+        self.deque = deque(tuple(item) for item in state['deque'])
+
+
+class Stochastic(StreamingIndicator):
+    """ta.momentum.StochasticOscillator(high, low, close, window, smooth): value = %K (.stoch())"""
+
+    def __init__(self, window=14, smooth=3):
+        super().__init__()
+        self.window, self.smooth = window, smooth
+        self._high = _RollingExtreme(window, maximum=True)
+        self._low = _RollingExtreme(window, maximum=False)
+
+    @staticmethod
+    def _output(close, low, high):
+        if math.isnan(low) or math.isnan(high):
+            return NAN
+        if high == low:
+            return NAN if close == low else math.copysign(math.inf, close - low)
+        return 100 * (close - low) / (high - low)
+
+    def _push(self, high, low, close):
+        self._high.push(high)
+        self._low.push(low)
+        return self._output(close, self._low.current(), self._high.current())
+
+    def _peek(self, high, low, close):
+        return self._output(close, self._low.current(low), self._high.current(high))
+
+    def params(self):
+        return {'window': self.window, 'smooth': self.smooth}
+
+    def _state(self):
+        return {'high': self._high.to_dict(), 'low': self._low.to_dict()}
+
+    def _load_state(self, state):
+        self._high.load(state['high'])
+        self._low.load(state['low'])
+
+
+class Supertrend(StreamingIndicator):
+    """
+    Supertrend cho nhiều cấu hình [(period, multiplier), ...] như utils.supertrend.supertrend
+    value = tuple supertrend theo thứ tự cấu hình; ATR mỗi period dùng chung giữa các cấu hình
+    """
+
+    def __init__(self, configs):
+        super().__init__()
+        self.configs = [tuple(config) for config in configs]
+        self._atr = {period: ATR(period) for period, _ in self.configs}
+        self.upper = [False] * len(self.configs)  # Supertrend nến trước đang là dải trên
+        self.bands = None  # [(dải trên, dải dưới)] của nến đã chốt cuối cùng
+        self.atr_values = ()
+        self.value = self.prev = self._committed = (NAN,) * len(self.configs)
+
+    def _next(self, high, low, close, closed):
+        atr = {period: indicator.update(high, low, close, closed=closed) for period, indicator in self._atr.items()}
+        hl2 = (high + low) / 2
+        bands, upper, values = [], [], []
+        for i, (period, multiplier) in enumerate(self.configs):
+            band = (hl2 + multiplier * atr[period], hl2 - multiplier * atr[period])
+            if self.bands is None:
+                is_upper = False
+            else:
+                prev_upper, prev_lower = self.bands[i]
+                is_upper = close <= (prev_upper if self.upper[i] else prev_lower)
+            bands.append(band)
+            upper.append(is_upper)
+            values.append(band[0] if is_upper else band[1])
+        self.atr_values = tuple(atr[period] for period, _ in self.configs)
+        return bands, upper, tuple(values)
+
+    def _push(self, high, low, close):
+        self.bands, self.upper, values = self._next(high, low, close, True)
+        return values
+
+    def _peek(self, high, low, close):
+        return self._next(high, low, close, False)[2]
+
+    def params(self):
+        return {'configs': [list(config) for config in self.configs]}
+
+    def _state(self):
+        return {'atr': {str(period): indicator.to_dict() for period, indicator in self._atr.items()},
+                'upper': list(self.upper), 'bands': self.bands and [list(band) for band in self.bands]}
+
+    def _load_state(self, state):
+        self._atr = {int(period): ATR.from_dict(data) for period, data in state['atr'].items()}
+        self.upper = list(state['upper'])
+        self.bands = state['bands'] and [tuple(band) for band in state['bands']]
+        self._committed = self.value = tuple(self._committed)
+
+
+INDICATOR_TYPES = {cls.__name__: cls for cls in (EMA, RSI, ATR, MACD, OBV, RollingMean, RollingStd,
+                                                 Bollinger, Stochastic, Supertrend)}
+
+
+def validate_against_ta(df, forming_every=3):
+    """
+    Chạy các chỉ báo tăng dần trên df và so với `ta` (cùng tham số chiến lược đang dùng)
+    Cứ forming_every nến thì gửi thêm một nến đang chạy giả trước khi chốt để kiểm tra rollback
+    Trả về {tên: sai số tương đối lớn nhất}
+    """
+    import pandas as pd
+
+    from utils.indicator_store import IndicatorFrame
+
+    ind = IndicatorFrame(df)
+    configs = ((7, 1.8), (10, 2.0), (14, 2.2))
+    cases = {
+        'ema_21': (EMA(21), ('close',), lambda: ind.ema(21)),
+        'rsi_14': (RSI(14), ('close',), lambda: ind.rsi(14)),
+        'rsi_7': (RSI(7), ('close',), lambda: ind.rsi(7)),
+        'atr_14': (ATR(14), ('high', 'low', 'close'), lambda: ind.atr(14)),
+        'macd': (MACD(), ('close',), lambda: ind.macd()[['macd', 'signal', 'diff']]),
+        'obv': (OBV(), ('close', 'volume'), lambda: ind.obv()),
+        'stoch': (Stochastic(14, 3), ('high', 'low', 'close'), lambda: ind.stoch(14, 3)),
+        'bollinger': (Bollinger(20, 2), ('close',), lambda: ind.bollinger(20, 2)[['upper', 'lower', 'mavg']]),
+        'volume_sma_20': (RollingMean(20), ('volume',), lambda: ind.sma(20, 'volume')),
+        'close_std_20': (RollingStd(20), ('close',), lambda: ind.rolling_std(20)),
+        'supertrend': (Supertrend(configs), ('high', 'low', 'close'),
+                       lambda: pd.DataFrame(ind.supertrend(configs)[0])),
+    }
+    columns = {name: df[name].tolist() for name in ('high', 'low', 'close', 'volume')}
+    errors = {}
+    for name, (indicator, inputs, expected) in cases.items():
+        expected = expected().to_numpy().reshape(len(df), -1)
+        worst = 0.0
+        for i in range(len(df)):
+            bar = [columns[column][i] for column in inputs]
+            if forming_every and i % forming_every == 0:
+                indicator.update(*[value * 1.01 for value in bar], closed=False)
+            if i == len(df) // 2:
+                indicator = from_dict(indicator.to_dict())
+            value = indicator.update(*bar)
+            value = value if isinstance(value, tuple) else (value,)
+            for got, want in zip(value, expected[i]):
+                if math.isnan(want) or math.isnan(got):
+                    if math.isnan(want) != math.isnan(got):
+                        worst = math.inf
+                    continue
+                worst = max(worst, abs(got - want) / max(1.0, abs(want)))
+        errors[name] = worst
+    return errors
+
+
+def random_ohlcv(bars, price, rng):
+    """Chuỗi nến ngẫu nhiên (random walk) dùng để so khớp chỉ báo"""
+    import numpy as np
+    import pandas as pd
+
+    close = price * np.exp(np.cumsum(rng.normal(0, 0.005, bars)))
+    open_ = np.r_[close[0], close[:-1]]
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + rng.uniform(0, 0.003, bars)),
+        'low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.003, bars)),
+        'close': close,
+        'volume': rng.lognormal(3, 1, bars),
+    })
+
+
+def main():
+    import numpy as np
+
+    parser = argparse.ArgumentParser(description='So chỉ báo tăng dần với thư viện ta')
+    parser.add_argument('--bars', type=int, default=5000)
+    parser.add_argument('--price', type=float, default=60000.0, help='giá khởi điểm của chuỗi ngẫu nhiên')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = random_ohlcv(args.bars, args.price, np.random.default_rng(args.seed))
+    ok = True
+    for name, error in validate_against_ta(df).items():
+        passed = error < 1e-9
+        ok &= passed
+        print(f"{'✅' if passed else '❌'} {name}: sai số tương đối lớn nhất {error:.2e}")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
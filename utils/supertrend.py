@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Supertrend cho nhiều cấu hình (period, multiplier) trong một lần tính
+- Cùng công thức với chiến lược Supertrend + RSI: dải trên/dưới = hl2 ± multiplier * ATR(period),
+  nến đầu lấy dải dưới, sau đó close <= supertrend nến trước thì lấy dải trên, ngược lại dải dưới
+- Trạng thái chỉ đổi khi close vượt khỏi cả hai dải của nến trước (nằm giữa thì giữ nguyên)
+  nên tính được bằng forward-fill trên mảng (n, K), không cần vòng lặp Python theo từng nến
+- ATR mỗi period chỉ tính một lần dù nhiều cấu hình dùng chung
+- Bản cập nhật từng nến: utils.streaming_indicators.Supertrend
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def wilder_atr(high, low, close, period):
+    """
+    ATR giống ta.volatility.AverageTrueRange (0 trong period - 1 nến đầu, sau đó làm mượt Wilder)
+    Tính bằng ewm của pandas thay cho vòng lặp Python của `ta`
+    """
+    high, low, close = (np.asarray(x, dtype=np.float64) for x in (high, low, close))
+    n = len(close)
+    atr = np.zeros(n)
+    if n < period:
+        return atr
+    prev_close = np.r_[np.nan, close[:-1]]
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    smoothed = np.r_[true_range[:period].mean(), true_range[period:]]
+    atr[period - 1:] = pd.Series(smoothed).ewm(alpha=1.0 / period, adjust=False).mean().to_numpy()
+    return atr
+
+
+def supertrend(high, low, close, configs, atr=None):
+    """
+    Args:
+        configs: [(period, multiplier), ...] K cấu hình
+        atr: {period: mảng ATR} tính sẵn (vd: IndicatorFrame), period nào thiếu thì tự tính
+    Returns:
+        (supertrend, atr_values, upper): mảng (n, K); upper=True khi supertrend đang là dải trên
+    """
+    high, low, close = (np.asarray(x, dtype=np.float64) for x in (high, low, close))
+    n, k = len(close), len(configs)
+    atr = dict(atr or {})
+    for period, _ in configs:
+        if period not in atr:
+            atr[period] = wilder_atr(high, low, close, period)
+
+    atr_values = np.column_stack([np.asarray(atr[period], dtype=np.float64) for period, _ in configs])
+    multipliers = np.array([multiplier for _, multiplier in configs], dtype=np.float64)
+    hl2 = ((high + low) / 2)[:, None]
+    upper_band = hl2 + multipliers * atr_values
+    lower_band = hl2 - multipliers * atr_values
+
+    # close <= dải dưới nến trước: chắc chắn lên dải trên; close > dải trên: chắc chắn về dải dưới
+    to_upper = np.zeros((n, k), dtype=bool)
+    decided = np.ones((n, k), dtype=bool)
+    if n > 1:
+        to_upper[1:] = close[1:, None] <= lower_band[:-1]
+        decided[1:] = to_upper[1:] | (close[1:, None] > upper_band[:-1])
+
+    # Nến chưa quyết định giữ trạng thái nến trước: lấy chỉ số nến quyết định gần nhất
+    rows = np.where(decided, np.arange(n)[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    upper = np.take_along_axis(to_upper, rows, axis=0)
+    return np.where(upper, upper_band, lower_band), atr_values, upper
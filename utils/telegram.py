@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 """
 Telegram utility for sending trading signals
+- Mọi request có timeout để một kết nối treo không chặn chu kỳ phân tích
 """
 
 import requests
@@ -13,6 +14,10 @@ load_dotenv()
 TOKEN = os.getenv("TELEGRAM_TOKEN")
 CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
+# Timeout (giây): (kết nối, đọc); gửi ảnh biểu đồ cần thời gian tải lên lâu hơn
+MESSAGE_TIMEOUT = (3.05, 10)
+PHOTO_TIMEOUT = (3.05, 30)
+
 def send_telegram(message, image_path=None):
     """Gửi tin nhắn và ảnh qua Telegram"""
     if not TOKEN or not CHAT_ID:
@@ -26,7 +31,7 @@ def send_telegram(message, image_path=None):
             'chat_id': CHAT_ID, 
             'text': message,
             'parse_mode': 'Markdown'
-        })
+        }, timeout=MESSAGE_TIMEOUT)
         
         if response.status_code != 200:
             print(f"⚠️ Lỗi gửi Telegram: {response.text}")
@@ -36,7 +41,8 @@ def send_telegram(message, image_path=None):
         if image_path and os.path.exists(image_path):
             img_url = f"https://api.telegram.org/bot{TOKEN}/sendPhoto"
             with open(image_path, 'rb') as f:
-                response = requests.post(img_url, data={'chat_id': CHAT_ID}, files={'photo': f})
+                response = requests.post(img_url, data={'chat_id': CHAT_ID}, files={'photo': f},
+                                         timeout=PHOTO_TIMEOUT)
                 
             if response.status_code != 200:
                 print(f"⚠️ Lỗi gửi ảnh Telegram: {response.text}")